@@ -12,11 +12,14 @@ from pykit.utils.pattern import match as pyoverload
 
 from .entrypoints import jit, ijit, sjit, cjit, abstract, unijit
 from .compiler import (annotate, overload, overloadable)
+from .compiler.layout import layout_report
 from .typing import (overlay, parse, unify, free, UnificationError)
 from .rules import typeof, convert, promote, typejoin, is_flypy_type
 #from .types import *
 from .conversion import toobject, fromobject, toctypes, fromctypes, ctype
 from .pipeline import passes, phase, environment
+from . import gc
+from .targets import target_cpu
 from .runtime import cast
 from .runtime.interfaces.interface import implements
 from .runtime.ffi import sizeof, malloc, libc
@@ -25,7 +28,7 @@ from .runtime.lib.librt import debug
 from .runtime.special import debugprint
 from .runtime import special
 from .runtime import ffi
-from .runtime.obj.core import NULL
+from .runtime.obj.core import NULL, structarray, structarray_class
 
 # Trigger extraneous definitions
 from .runtime import formatting
@@ -36,6 +39,7 @@ from .errors import error, InferError, SpecializeError
 
 # Initialize non-core data structures
 from .lib import extended, nplib
+from .cppgen.export import export
 
 # ______________________________________________________________________
 # flypy.test()
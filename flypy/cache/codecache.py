@@ -120,7 +120,11 @@ IR Portability
 Initially, we will address only locally-shared code. This means IR needs
 to be portable across process invocations, which means that:
 
-    * Constant pointers must be rewritten in the IR
+    * Constant pointers must be rewritten in the IR. Runtime state,
+      functions compiled on demand (finalizers, trace functions, etc) and
+      constant objects are referenced through external symbols (see
+      flypy.extern_support.relocation), which are bound to their addresses
+      when a module is loaded (see flypy.extern_support.bind_symbols)
 
 This further implies that non-primitive constants (e.g. constants of
 heap-allocated objects) must be reconstructed properly. This also means that
@@ -158,6 +162,7 @@ import sys
 import sqlite3 as db
 
 import flypy
+from flypy import extern_support
 from . import keys, serializers
 
 import pykit
@@ -242,12 +247,12 @@ class CodeCache(object):
         self.serializers[stage] = serializer
         self.deserializers[stage] = deserializer
 
-    def lookup(self, py_func, argtypes, stage):
+    def lookup(self, py_func, argtypes, stage, cpu="generic"):
         """
         Look up a cached version for (py_func, argtypes) for the given
-        compilation phase.
+        compilation phase and target CPU.
         """
-        func_id = self.func_id(py_func, argtypes)
+        func_id = self.func_id(py_func, argtypes, cpu)
         if func_id is None:
             return None
 
@@ -263,6 +268,12 @@ class CodeCache(object):
             deserializer = self.deserializers[stage]
             mod, func = deserializer.deserialize_code(ir_blob, symname, stage)
             env  = deserializer.deserialize_env(env_blob, stage)
+
+            try:
+                extern_support.bind_symbols(mod)
+            except LookupError:
+                # Refers to objects of another process, e.g. constants
+                return None
             return mod, func, env
         else:
             return None
@@ -270,16 +281,17 @@ class CodeCache(object):
     def insert(self, py_func, argtypes, stage, code, env, mtime):
         """
         Cache IR (`code`) and an environment (`env`) for (py_func, argtypes)
-        for the given phase.
+        for the given phase, and the target CPU of `env`.
         """
-        func_id = self.func_id(py_func, argtypes)
+        cpu = env.get('flypy.target_cpu', 'generic')
+        func_id = self.func_id(py_func, argtypes, cpu)
 
         # -- Insert (py_func, argtypes) in Function if not present -- #
         if func_id is None:
             self.insert_func(py_func, argtypes, env, mtime)
-            func_id = self.func_id(py_func, argtypes)
+            func_id = self.func_id(py_func, argtypes, cpu)
         else:
-            assert self.lookup(py_func, argtypes, stage) is None
+            assert self.lookup(py_func, argtypes, stage, cpu) is None
 
         assert func_id is not None
         symname = code.name
@@ -309,14 +321,14 @@ class CodeCache(object):
 
         return self._version_id
 
-    def func_id(self, py_func, argtypes):
+    def func_id(self, py_func, argtypes, cpu="generic"):
         """
         Retrieve the function ID for this (py_func, argtypes) combination
-        from the db.
+        compiled for `cpu` from the db.
         """
         # TODO: check modification times of each type implementation in
         # `argtypes`
-        blob = self.blobify(py_func, argtypes)
+        blob = self.blobify(py_func, argtypes, cpu)
         self.cursor.execute("""
             SELECT id FROM Function
             WHERE (version_id = ? AND key = ?)""", (self.version_id, blob))
@@ -329,14 +341,16 @@ class CodeCache(object):
             VALUES (?, ?, ?, ?, ?)
             """, (self.version_id, env['flypy.state.func_module'],
                   env['flypy.state.func_qname'],
-                  self.blobify(py_func, argtypes), mtime))
+                  self.blobify(py_func, argtypes,
+                               env.get('flypy.target_cpu', 'generic')),
+                  mtime))
         self.conn.commit()
 
 
-    def blobify(self, py_func, argtypes):
+    def blobify(self, py_func, argtypes, cpu="generic"):
         """Create a structural representation for the python function"""
         # TODO: Cache blobs
-        return keys.make_code_blob(py_func, argtypes)
+        return keys.make_code_blob(py_func, argtypes, cpu)
 
 
 def get_version_id(cursor):
@@ -20,10 +20,10 @@ class IncompatibleConstantError(object):
 # Blobbify
 #===------------------------------------------------------------------===
 
-def make_code_blob(py_func, argtypes):
+def make_code_blob(py_func, argtypes, cpu="generic"):
     """
     Create a code "blob" for the given Python function and flypy argument
-    types.
+    types, compiled for the given target CPU (see flypy.targets).
 
     Return
     ------
@@ -34,7 +34,7 @@ def make_code_blob(py_func, argtypes):
     except IncompatibleConstantError:
         return None
 
-    result = str((code, tuple(map(qualify, argtypes))))
+    result = str((code, tuple(map(qualify, argtypes)), resolve_cpu(cpu)))
     #result = zlib.compress(result)
     return result
 
@@ -77,6 +77,11 @@ def encode_constant(const):
 # Types
 #===------------------------------------------------------------------===
 
+def resolve_cpu(cpu):
+    """Key for the target CPU: the LLVM cpu name and features"""
+    from flypy import targets
+    return targets.resolve(cpu)
+
 def qualify(ty):
     """Qualify the type"""
     name = ".".join([ty.impl.__module__, ty.impl.__name__])
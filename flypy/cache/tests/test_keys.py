@@ -28,5 +28,14 @@ class TestKeys(unittest.TestCase):
 
         self.assertNotEqual(blob1, blob2)
 
+    def test_key_cpu(self):
+        def f(x):
+            print(x)
+
+        blob1 = keys.make_code_blob(f, (int32,))
+        blob2 = keys.make_code_blob(f, (int32,), cpu="x86-64-v3")
+
+        self.assertNotEqual(blob1, blob2)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
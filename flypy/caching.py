@@ -51,6 +51,12 @@ class TypingCache(Cache):
     def insert(self, key, value):
         Cache.insert(self, key, value)
 
+    def invalidate(self, frame):
+        """Remove all typing results of the recursion frame `frame`"""
+        for key, (new_func, new_env) in list(self.cached.items()):
+            if new_env['flypy.typing.frame'] is frame:
+                del self.cached[key]
+
 #===------------------------------------------------------------------===
 # Type inference
 #===------------------------------------------------------------------===
@@ -69,11 +75,16 @@ class InferenceCache(object):
         ctxs: { func : [Context] }
             Partial typing contexts, containing type templates similar to
             principal type schemes
+
+        frames: { (FunctionWrapper, argtypes, constants) : Frame }
+            Specializations that are currently being typed, used to resolve
+            recursive calls
     """
 
     def __init__(self):
         self.typings = {}
         self.ctxs = {}
+        self.frames = {}
 
     def lookup(self, func, argtypes):
         return self.typings.get((func, tuple(argtypes)))
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+"""
+Escape analysis for heap-allocated objects.
+
+Objects of @jit classes are allocated through the garbage collector. If we
+can prove that an object does not outlive the function that allocates it,
+we can allocate it on the stack instead. An object escapes if it is:
+
+    - returned
+    - stored into another object or into memory (this includes merging
+      through phis, since they are translated to stores by reg2mem)
+    - passed to a function that may let it escape, or to an unknown or
+      opaque function
+    - used by any other operation we don't understand
+
+We mark non-escaping 'allocate_obj' operations with the 'flypy.stackalloc'
+metadata, which the allocator pass uses to allocate the object on the stack.
+Objects with a finalizer are always allocated on the heap, as are objects
+holding counted references with the "refcount" collector.
+"""
+
+from __future__ import print_function, division, absolute_import
+
+from flypy.representation import stack_allocate
+from flypy.runtime.gc import semispace
+
+from pykit import ir
+
+#===------------------------------------------------------------------===
+# Pass
+#===------------------------------------------------------------------===
+
+def run(func, env):
+    if env['flypy.state.opaque']:
+        return
+
+    context = env['flypy.typing.context']
+    envs = env['flypy.state.envs']
+    refcounted = env['flypy.gc.impl'] == 'refcount'
+    memo = {}
+
+    for op in func.ops:
+        if op.opcode == 'allocate_obj':
+            type = context[op]
+            if stack_allocate(type) or '__del__' in type.fields:
+                continue
+            if refcounted and semispace.reference_fields(type):
+                continue # Stack objects don't release their references
+            if not escapes(func, op, context, envs, memo):
+                op.add_metadata({'flypy.stackalloc': True})
+
+#===------------------------------------------------------------------===
+# Analysis
+#===------------------------------------------------------------------===
+
+def escapes(func, value, context, envs, memo):
+    """Determine whether `value` may escape from `func`"""
+    for use in func.uses[value]:
+        if use.opcode in ('getfield', 'register_finalizer'):
+            continue
+        elif use.opcode == 'setfield':
+            obj, attr, fieldvalue = use.args
+            if fieldvalue is value:
+                return True
+        elif use.opcode == 'call':
+            f, args = use.args
+            if f is value or not isinstance(f, ir.Function) or f not in envs:
+                return True
+            for i, arg in enumerate(args):
+                if arg is value and param_escapes(f, i, context[value],
+                                                  envs, memo):
+                    return True
+        else:
+            return True
+
+    return False
+
+
+def param_escapes(func, i, type, envs, memo):
+    """
+    Determine whether the parameter at position `i` of `func` may escape,
+    given an argument of type `type`.
+    """
+    key = (func, i)
+    if key not in memo:
+        memo[key] = True # Assume the worst for recursive calls
+
+        env = envs[func]
+        argtypes = env['flypy.typing.argtypes']
+        if (env['flypy.state.opaque'] or i >= len(argtypes) or
+                argtypes[i] != type):
+            # Opaque, or the argument will be coerced
+            result = True
+        else:
+            result = escapes(func, func.args[i], env['flypy.typing.context'],
+                             envs, memo)
+
+        memo[key] = result
+
+    return memo[key]
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+"""
+Verify that functions compiled with @jit(nogil=True) can run without holding
+the GIL. These are called through a ctypes prototype that releases the GIL
+(see FunctionWrapper.__call__), so they and all functions they call may not:
+
+    - use Python objects (flypy.lib.pyobject.Object)
+    - call foreign functions that need the GIL, that is functions of the
+      Python C API or loaded with ctypes.PyDLL, like flypy.runtime.lib.librt
+    - allocate objects through the garbage collector or an arena. The
+      allocation buffers are not shared safely between threads, and the
+      collector does not scan the stacks of Python threads. Objects that do
+      not escape are allocated on the stack, and are fine.
+    - propagate exceptions, or call functions that may raise. Pending
+      exceptions are recorded process-wide (see flypy.runtime.raising), so
+      the exception of one thread would be seen by the others. Exceptions
+      caught in the function that raises them, after inlining, are fine.
+
+The semispace collector registers roots on a global shadow stack, and the
+refcount collector updates reference counts without synchronization, so
+nogil functions are only supported with the Boehm collector.
+"""
+
+from __future__ import print_function, division, absolute_import
+import ctypes
+
+from flypy import errors
+from flypy.representation import stack_allocate
+from flypy.runtime import gc
+from flypy.compiler.optimizations import throwing
+
+from pykit import ir
+from pykit.analysis import callgraph
+
+def run(func, env):
+    options = env['flypy.state.options'] or {}
+    if not options.get('nogil') or env['flypy.state.opaque']:
+        return
+
+    if env['flypy.gc.impl'] != 'boehm':
+        raise errors.CompileError(
+            "Function %s cannot run without the GIL with collector %r" % (
+                func.name, env['flypy.gc.impl']))
+    if options.get('allocator', 'gc') != 'gc':
+        raise errors.CompileError(
+            "Function %s cannot run without the GIL in an arena" % (
+                func.name,))
+
+    envs = env['flypy.state.envs']
+    for f in callgraph.callgraph(func).node:
+        if f in envs and not envs[f]['flypy.state.opaque']:
+            verify(func, f, envs[f], envs)
+
+def verify(func, f, env, envs):
+    """Verify that `f`, called from nogil function `func`, doesn't need the GIL"""
+    context = env['flypy.typing.context']
+
+    def error(reason):
+        if f is func:
+            where = ""
+        else:
+            where = " (through function %s)" % (f.name,)
+        raise errors.CompileError(
+            "Function %s cannot run without the GIL: %s%s" % (
+                func.name, reason, where))
+
+    for op in f.ops:
+        type = context.get(op)
+        if is_pyobject(type):
+            error("it uses Python objects")
+        elif (op.opcode == 'allocate_obj' and not stack_allocate(type) and
+                  not (op.metadata or {}).get('flypy.stackalloc')):
+            error("it allocates an object of type %s on the heap" % (type,))
+        elif op.opcode == 'call':
+            callee = op.args[0]
+            if callee in envs and is_allocator(envs[callee]):
+                error("it allocates objects on the heap")
+            if throwing.may_raise(op, envs):
+                error("it calls %s, which may raise an exception" % (
+                                                            callee.name,))
+            for c in ir.collect_constants(op):
+                if needs_gil(c.const):
+                    error("it calls %s, which needs the GIL" % (c.const,))
+
+def verify_exceptions(func, env):
+    """
+    Verify that nogil function `func` doesn't propagate exceptions. This
+    runs after inlining, when exceptions raised by inlined functions (like
+    StopIteration at the end of loops) have been rewritten to jumps if they
+    are caught locally.
+    """
+    options = env['flypy.state.options'] or {}
+    if not options.get('nogil') or env['flypy.state.opaque']:
+        return
+
+    for op in func.ops:
+        if op.opcode == 'exc_throw':
+            raise errors.CompileError(
+                "Function %s cannot run without the GIL: it may raise an "
+                "exception" % (func.name,))
+
+def is_pyobject(type):
+    from flypy.lib.pyobject import Object
+    return getattr(type, 'impl', None) is Object
+
+def is_allocator(env):
+    """Whether the function of `env` allocates memory of the collector"""
+    from flypy.runtime import arena
+
+    fw = env['flypy.state.function_wrapper']
+    allocators = [arena.gc_alloc_object]
+    for gcmod in gc.impls.values():
+        allocators.extend([gcmod.gc_alloc, gcmod.gc_alloc_object])
+    return fw in allocators
+
+def needs_gil(value):
+    """Whether `value` is a foreign function that must be called with the GIL"""
+    return (isinstance(value, ctypes._CFuncPtr) and
+            bool(value._flags_ & ctypes._FUNCFLAG_PYTHONAPI))
@@ -8,6 +8,7 @@ from __future__ import print_function, division, absolute_import
 
 annotations = {
     'specialize_value': tuple,  # ('arg1', 'arg2', ...)
+    'static':           bool,   # Evaluate calls at compile time
     'type_constraints': tuple,  # (Constraint, ...)
     'type_signature': object,   # Type of the object
 }
@@ -29,4 +30,4 @@ def annotate(obj, **kwds):
 
 def get(obj, name):
     """Get an annotation from obj"""
-    return obj.__flypy_annotations__.get(name)
\ No newline at end of file
+    return getattr(obj, '__flypy_annotations__', {}).get(name)
\ No newline at end of file
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+"""
+Fast floating point arithmetic for code compiled with @jit(fastmath=True)
+(see flypy.optimization). Floating point operations get the 'fast' flag,
+which lets LLVM reassociate them (e.g. to vectorize reductions), replace
+divisions by multiplications with the reciprocal, and assume that operands
+and results are not NaN or infinite.
+
+llvmpy cannot set the flags of instructions, so we replace each operation by
+a call to a helper performing the operation with the flag, which we parse
+from assembly. The helpers are always inlined when optimizing, so there is
+nothing to do at optimization level 0.
+"""
+
+from __future__ import print_function, division, absolute_import
+
+import llvm
+import llvm.core as lc
+
+opcodes = ('fadd', 'fsub', 'fmul', 'fdiv', 'frem')
+
+template = """
+define linkonce_odr %(type)s @"%(name)s"(%(type)s %%a, %(type)s %%b) nounwind readnone alwaysinline {
+entry:
+  %%result = %(opcode)s fast %(type)s %%a, %%b
+  ret %(type)s %%result
+}
+"""
+
+def run(lfunc, env):
+    options = env['flypy.optimization']
+    if not options['fastmath'] or not options['opt']:
+        return
+
+    insts = [inst for block in lfunc.basic_blocks
+                      for inst in block.instructions
+                          if inst.opcode_name in opcodes]
+    if not insts:
+        return
+
+    builder = lc.Builder.new(lfunc.entry_basic_block)
+    for inst in insts:
+        helper = fastmath_helper(lfunc.module, inst.opcode_name, inst.type)
+        builder.position_before(inst)
+        result = builder.call(helper, inst.operands)
+        inst.replace_all_uses_with(result)
+        inst.erase_from_parent()
+
+def fastmath_helper(lmod, opcode, type):
+    """Get the helper performing `opcode` on values of LLVM type `type`"""
+    name = "flypy.fastmath.%s.%s" % (opcode, str(type).replace(" ", ""))
+    try:
+        return lmod.get_function_named(name)
+    except llvm.LLVMException:
+        source = template % {'name': name, 'opcode': opcode, 'type': type}
+        lmod.link_in(lc.Module.from_assembly(source))
+        return lmod.get_function_named(name)
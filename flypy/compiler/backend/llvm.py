@@ -6,9 +6,15 @@ flypy compiler backend leveraging pykit.
 
 from __future__ import print_function, division, absolute_import
 
+from . import principal
+from flypy import extern_support
+from flypy.compiler.lower import constants
+
 from pykit.codegen.llvm import llvm_codegen
 from pykit.codegen import llvm
+from llvm import version as llvm_version
 import llvm.core as lc
+import llvm.passes as lp
 
 def codegen_init(func, env):
     """
@@ -35,9 +41,109 @@ def codegen_run(func, env):
     Returns : llvm.core.Function
         Compiled and optimized llvm function.
     """
+    principal_func = env["flypy.state.principal"]
+    if principal_func is not None:
+        # Share the code of a representation-equivalent specialization
+        lfunc = env["flypy.state.llvm_func"]
+        envs = env["flypy.state.envs"]
+        principal.emit_thunk(lfunc, envs[principal_func]["flypy.state.llvm_func"])
+        return lfunc, env
+
     lfunc = llvm_codegen.translate(func, env, env["flypy.state.llvm_func"])
     return lfunc, env
 
+def relocate_constants(lfunc, env):
+    """
+    Refer to the objects of constants by their symbols instead of their
+    addresses (see flypy.compiler.lower.constants.make_constant).
+    """
+    lmod = env["codegen.llvm.module"]
+    for f in lmod.functions:
+        for block in f.basic_blocks:
+            for instr in block.instructions:
+                for i, operand in enumerate(instr.operands):
+                    value = relocate_constant(lmod, operand, env)
+                    if value is not None:
+                        instr._ptr.setOperand(i, value._ptr)
+    return lfunc, env
+
+def relocate_constant(lmod, value, env):
+    """
+    Rebuild LLVM constant `value` with the symbols of the addresses of
+    constant objects, or return None if it holds no such address.
+    """
+    if isinstance(value, lc.ConstantExpr) and value.opcode_name == 'inttoptr':
+        [address] = value.operands
+        if isinstance(address, lc.ConstantInt):
+            symbol = constants.relocations.get(address.z_ext_value)
+            if symbol is not None:
+                if env["flypy.target"] == "cpu":
+                    symbol.install()
+                decl = lmod.get_or_insert_function(
+                    lc.Type.function(lc.Type.void(), []), symbol.name)
+                return decl.bitcast(value.type)
+    elif isinstance(value, lc.ConstantStruct):
+        fields = value.operands
+        new_fields = [relocate_constant(lmod, field, env) for field in fields]
+        if any(field is not None for field in new_fields):
+            fields = [old if new is None else new
+                      for new, old in zip(new_fields, fields)]
+            if value.type.packed:
+                return lc.Constant.packed_struct(fields)
+            return lc.Constant.struct(fields)
+    return None
+
+llvm_attributes = {
+    'nounwind': lc.ATTR_NO_UNWIND,
+    'readonly': lc.ATTR_READONLY,
+    'readnone': lc.ATTR_READ_NONE,
+}
+
+def annotate_externs(func, env):
+    """
+    Add the function attributes of external symbols (see
+    flypy.extern_support) to their declarations.
+    """
+    lfunc = env["flypy.state.llvm_func"]
+    for f in lfunc.module.functions:
+        symbol = extern_support.symbols.get(f.name)
+        if f.is_declaration and symbol is not None:
+            for attr in symbol.attributes:
+                f.add_attribute(llvm_attributes[attr])
+    return lfunc, env
+
+def optimize(lfunc, env):
+    """
+    Optimize the LLVM module with the optimization options of the
+    environment (see flypy.optimization).
+    """
+    options = env["flypy.optimization"]
+    tm = env["codegen.llvm.machine"]
+
+    pm = lp.PassManager.new()
+    pm.add(tm.target_data.clone())
+    pm.add(lp.TargetLibraryInfo.new(tm.triple))
+    if llvm_version <= (3, 2):
+        pm.add(lp.TargetTransformInfo.new(tm))
+    else:
+        tm.add_analysis_passes(pm)
+
+    pmb = lp.PassManagerBuilder.new()
+    pmb.opt_level = options['opt']
+    pmb.loop_vectorize = options['vectorize']
+    if llvm_version >= (3, 3):
+        pmb.slpvectorize = options['vectorize']
+    pmb.disable_unroll_loops = not options['unroll']
+    if options['opt'] and options['inline_threshold']:
+        pmb.use_inliner_with_threshold(options['inline_threshold'])
+    elif options['fastmath']:
+        # The helpers of flypy.compiler.backend.fastmath must be inlined
+        pm.add('always-inline')
+    pmb.populate(pm)
+
+    pm.run(env["codegen.llvm.module"])
+    return lfunc, env
+
 #global_mod = lc.Module.new("global_module")
 
 def codegen_link(func, env):
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+"""
+Share machine code between specializations with equivalent low-level
+representations.
+
+Each distinct set of argument types produces a new specialization. Many of
+these specializations are identical after low-level typing, for instance
+a function that merely passes around a `Pointer[a]` for different types `a`.
+Functions compiled with `principal=True` (or with the 'flypy.principal'
+flag set) are keyed on their low-level IR, where pointers that are never
+dereferenced have their base type erased. Specializations with the same key
+reuse the code of the first one through a small forwarding thunk, which
+bitcasts the arguments and the result.
+"""
+
+from __future__ import print_function, division, absolute_import
+
+from pykit import ir
+from pykit import types as ptypes
+
+#===------------------------------------------------------------------===
+# Entry point
+#===------------------------------------------------------------------===
+
+def share_specializations(dependences, envs):
+    """
+    Assign a principal function to each function in `dependences` that has a
+    representation-equivalent specialization which was compiled before.
+    """
+    memo = {}
+    for f in dependences:
+        env = envs[f]
+        if not should_share(env):
+            continue
+
+        cache = env['flypy.principal.cache']
+        key = principal_key(f, envs, memo)
+        principal = cache.lookup(key)
+        if principal is None:
+            cache.insert(key, f)
+        elif principal is not f:
+            env['flypy.state.principal'] = principal
+
+def should_share(env):
+    """Whether the function for `env` participates in code sharing"""
+    options = env['flypy.state.options'] or {}
+    return (env['flypy.target'] == 'cpu' and
+            not env['flypy.state.opaque'] and
+            (options.get('principal') or env['flypy.principal']))
+
+#===------------------------------------------------------------------===
+# Keys
+#===------------------------------------------------------------------===
+
+def principal_key(func, envs, memo):
+    """
+    Compute a structural key for `func`. Two functions with the same key
+    compute the same thing, modulo the base types of opaque pointers.
+    """
+    if func in memo:
+        key = memo[func]
+        if key is None:
+            # Recursive call, don't share recursive functions
+            return ('recursive', id(func))
+        return key
+
+    memo[func] = None
+
+    erased = opaque_pointers(func)
+    values = {}
+    for i, arg in enumerate(func.args):
+        values[arg] = ('arg', i)
+    for i, block in enumerate(func.blocks):
+        values[block] = ('block', i)
+    for i, op in enumerate(func.ops):
+        values[op] = ('op', i)
+
+    def typeof(value):
+        if value in erased:
+            return ptypes.Pointer(ptypes.Opaque)
+        return value.type
+
+    def encode(x):
+        if isinstance(x, list):
+            return tuple(map(encode, x))
+        elif isinstance(x, (ir.Op, ir.FuncArg, ir.Block)):
+            return values[x]
+        elif isinstance(x, ir.Function):
+            return ('func', principal_key(x, envs, memo))
+        elif isinstance(x, ir.GlobalValue):
+            return ('global', x.name, x.type)
+        elif isinstance(x, ir.Const):
+            return ('const', x.type, repr(x.const))
+        elif isinstance(x, ir.Undef):
+            return ('undef', x.type)
+        return ('value', repr(x))
+
+    restype = func.type.restype
+    results = [op.args[0] for op in func.ops if op.opcode == 'ret']
+    if restype.is_pointer and all(result in erased for result in results):
+        restype = ptypes.Pointer(ptypes.Opaque)
+
+    signature = tuple(typeof(arg) for arg in func.args)
+    body = tuple((op.opcode, typeof(op), encode(op.args)) for op in func.ops)
+    key = (restype, signature, len(func.blocks), body)
+
+    memo[func] = key
+    return key
+
+#===------------------------------------------------------------------===
+# Opaque pointers
+#===------------------------------------------------------------------===
+
+def opaque_pointers(func):
+    """
+    Find pointer values that are never dereferenced or offset, but only
+    passed around. The base type of these pointers does not matter for the
+    generated code.
+    """
+    candidates = list(func.args) + list(func.ops)
+    return set(value for value in candidates
+                         if value.type.is_pointer and
+                            all(is_opaque_use(use, value)
+                                    for use in func.uses.get(value, ())))
+
+def is_opaque_use(op, value):
+    """Whether `op` uses `value` without depending on its base type"""
+    if op.opcode in ('ret', 'phi', 'ptrcast', 'bitcast'):
+        return True
+    elif op.opcode == 'call':
+        f, args = op.args
+        return f is not value
+    elif op.opcode in ('store', 'ptrstore'):
+        return op.args[0] is value and op.args[1] is not value
+    return False
+
+#===------------------------------------------------------------------===
+# Thunks
+#===------------------------------------------------------------------===
+
+def emit_thunk(lfunc, principal):
+    """
+    Emit the body of `lfunc` as a tail call to `principal`, which has a
+    representation-equivalent signature.
+    """
+    import llvm.core as lc
+
+    signature = principal.type.pointee
+    builder = lc.Builder.new(lfunc.append_basic_block('entry'))
+
+    args = []
+    for arg, argtype in zip(lfunc.args, signature.args):
+        if arg.type != argtype:
+            arg = builder.bitcast(arg, argtype)
+        args.append(arg)
+
+    result = builder.call(principal, args)
+    result.tail_call = True
+
+    restype = lfunc.type.pointee.return_type
+    if restype.kind == lc.TYPE_VOID:
+        builder.ret_void()
+    else:
+        if result.type != restype:
+            result = builder.bitcast(result, restype)
+        builder.ret(result)
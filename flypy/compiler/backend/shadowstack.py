@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+
+"""
+Register roots on the shadow stack for the semi-space collector. See
+flypy.runtime.gc.roots for the layout of frames.
+
+Objects move when the collector runs, which may happen at any call. We
+store every heap reference in a slot in the frame after it is defined, and
+reload it from the slot at uses that follow a call:
+
+    x = call(f, [])                 x = call(f, [])
+    call(g, [])             =>      slot[0] = x
+    call(h, [x])                    call(g, [])
+                                    x1 = slot[0]
+                                    call(h, [x1])
+
+Stack-allocated values are registered by the addresses of the heap
+references in their fields, since they are updated in place. These fields
+are cleared when registered, since the memory is not initialized.
+
+Heap references stored outside the heap, e.g. in the storage of a List of
+objects, can't be traced, so we reject functions holding such values (see
+semispace.untraced_references).
+
+Functions that don't make any calls don't need a frame.
+"""
+
+from __future__ import print_function, division, absolute_import
+
+from flypy.runtime.gc import semispace, roots as gcroots
+from flypy.compiler.lower.externs import symbol_address
+
+from pykit import types as ptypes
+from pykit.ir import Builder, Op, Const
+
+word = ptypes.Int64
+word_p = ptypes.Pointer(ptypes.Int64)
+
+#===------------------------------------------------------------------===
+# Pass
+#===------------------------------------------------------------------===
+
+def run(func, env):
+    if env['flypy.gc.impl'] != 'semispace' or env['flypy.state.opaque']:
+        return
+
+    context = env['flypy.typing.context']
+    calls = [op for op in func.ops if op.opcode == 'call']
+    if not calls:
+        return
+
+    roots, stack_values = find_roots(func, context)
+    if not roots and not stack_values:
+        return
+
+    b = Builder(func)
+    frame = ShadowFrame(func, b, context, roots, stack_values)
+    frame.push()
+    frame.register()
+    frame.reload()
+    frame.pop()
+    func.reset_uses()
+
+def find_roots(func, context):
+    """
+    Find the heap references held by `func` (roots), and the stack-allocated
+    values holding heap references in their fields.
+    """
+    roots, stack_values = [], []
+    for value in list(func.args) + list(func.ops):
+        if value not in context or value.type.is_void:
+            continue
+
+        type = context[value]
+        if not hasattr(type, 'impl'):
+            continue # Method, etc
+
+        semispace.check_traced(type)
+        if isinstance(value, Op) and value.opcode == 'alloca':
+            # Stack-allocated object or aggregate
+            fields = semispace.reference_fields(type)
+            if fields:
+                stack_values.append((value, fields))
+        elif semispace.is_heap_type(type):
+            roots.append(value)
+        elif semispace.is_struct_type(type) and value.type.is_pointer:
+            fields = semispace.reference_fields(type)
+            if fields:
+                stack_values.append((value, fields))
+
+    return roots, stack_values
+
+#===------------------------------------------------------------------===
+# Frames
+#===------------------------------------------------------------------===
+
+class ShadowFrame(object):
+    """
+    Frame holding the roots of `func`. Roots of entry i are stored in
+    slot i, which follow the root entries.
+    """
+
+    def __init__(self, func, builder, context, roots, stack_values):
+        self.func = func
+        self.builder = builder
+        self.context = context
+        self.roots = roots
+        self.stack_values = stack_values
+
+        # Root entries: (trace function symbol, address of slot)
+        self.entries = []
+        for root in roots:
+            self.entries.append(semispace.trace_symbol(context[root]))
+        for value, fields in stack_values:
+            for offset, fieldtype in fields:
+                self.entries.append(semispace.trace_symbol(fieldtype))
+
+        self.nroots = len(self.entries)
+        self.slot_offset = gcroots.ROOTS + 2 * self.nroots
+        self.size = self.slot_offset + len(roots)
+
+        self.base = None
+        self.inserted = set()
+
+    # -------------------------------------------------
+
+    def emit(self, op):
+        self.inserted.add(op)
+        return op
+
+    def word(self, index):
+        """Pointer to word `index` in the frame"""
+        b = self.builder
+        return self.emit(b.ptradd(self.base, Const(index, word)))
+
+    def store_word(self, index, value):
+        self.emit(self.builder.ptrstore(value, self.word(index)))
+
+    def top_of_stack(self):
+        """Pointer to the top of the shadow stack in the heap state"""
+        b = self.builder
+        state = self.emit(symbol_address(b, semispace.state_symbol, word))
+        offset = Const(semispace.FRAME * semispace.ptr_size, word)
+        address = self.emit(b.add(state, offset))
+        return self.emit(b.convert(word_p, address))
+
+    def slot(self, i):
+        return self.word(self.slot_offset + i)
+
+    def address(self, value):
+        return self.emit(self.builder.ptrcast(word, value))
+
+    # -------------------------------------------------
+
+    def push(self):
+        """Allocate the frame and push it on the shadow stack"""
+        b = self.builder
+        b.position_at_beginning(self.func.startblock)
+
+        names = ['w%d' % i for i in range(self.size)]
+        frame_type = ptypes.Struct(names, [word] * self.size)
+        frame = self.emit(b.alloca(ptypes.Pointer(frame_type)))
+        self.base = self.emit(b.ptrcast(word_p, frame))
+
+        top = self.top_of_stack()
+        self.store_word(gcroots.PREV, self.emit(b.ptrload(top)))
+        self.store_word(gcroots.NROOTS, Const(self.nroots, word))
+        for i, trace in enumerate(self.entries):
+            address = self.emit(symbol_address(b, trace, word))
+            self.store_word(gcroots.ROOTS + 2 * i, address)
+            self.store_word(gcroots.ROOTS + 2 * i + 1, Const(0, word))
+
+        for i in range(len(self.roots)):
+            address = self.address(self.slot(i))
+            self.store_word(gcroots.ROOTS + 2 * i + 1, address)
+            self.store_word(self.slot_offset + i, Const(0, word))
+
+        self.emit(b.ptrstore(self.address(frame), top))
+
+    def pop(self):
+        """Pop the frame from the shadow stack before returning"""
+        b = self.builder
+        for op in list(self.func.ops):
+            if op.opcode in ('ret', 'exc_throw'):
+                b.position_before(op)
+                prev = self.emit(b.ptrload(self.word(gcroots.PREV)))
+                self.emit(b.ptrstore(prev, self.top_of_stack()))
+
+    # -------------------------------------------------
+
+    def register(self):
+        """Store roots in their slots, and register stack-allocated values"""
+        b = self.builder
+        for i, root in enumerate(self.roots):
+            position_after_definition(b, self.func, root, self.base)
+            self.store_word(self.slot_offset + i, self.address(root))
+
+        entry = len(self.roots)
+        for value, fields in self.stack_values:
+            position_after_definition(b, self.func, value, self.base)
+            for offset, fieldtype in fields:
+                address = self.emit(b.add(self.address(value),
+                                          Const(offset, word)))
+                field = self.emit(b.convert(word_p, address))
+                self.emit(b.ptrstore(Const(0, word), field))
+                self.store_word(gcroots.ROOTS + 2 * entry + 1, address)
+                entry += 1
+
+    def reload(self):
+        """Reload roots from their slots at uses that follow a call"""
+        b = self.builder
+        self.func.reset_uses()
+
+        for i, root in enumerate(self.roots):
+            for use in list(self.func.uses[root]):
+                if use in self.inserted:
+                    continue
+
+                if use.opcode == 'phi':
+                    blocks, values = use.args
+                    values = list(values)
+                    for j, (block, value) in enumerate(zip(blocks, values)):
+                        if value is root:
+                            b.position_before(block.terminator)
+                            values[j] = self.load(i, root)
+                    use.set_args([blocks, values])
+                elif follows_call(self.func, root, use):
+                    b.position_before(use)
+                    use.set_args(substitute(use.args, root, self.load(i, root)))
+
+    def load(self, i, root):
+        b = self.builder
+        value = self.emit(b.ptrload(self.slot(i)))
+        return self.emit(b.convert(root.type, value))
+
+#===------------------------------------------------------------------===
+# Utils
+#===------------------------------------------------------------------===
+
+def position_after_definition(b, func, value, base):
+    """Position the builder after the definition of `value`"""
+    if not isinstance(value, Op):
+        # Argument, store after pushing the frame
+        b.position_after(base)
+        return
+
+    if value.opcode == 'phi':
+        phis = [op for op in value.block.ops if op.opcode == 'phi']
+        b.position_after(phis[-1])
+    else:
+        b.position_after(value)
+
+def follows_call(func, value, use):
+    """
+    Whether there may be a call between the definition of `value` and `use`
+    """
+    if not isinstance(value, Op) or value.block is not use.block:
+        return True
+
+    found = False
+    for op in value.block.ops:
+        if op is value:
+            found = True
+        elif op is use:
+            return not found
+        elif found and op.opcode == 'call':
+            return True
+
+    return True
+
+def substitute(args, old, new):
+    if isinstance(args, list):
+        return [substitute(arg, old, new) for arg in args]
+    elif args is old:
+        return new
+    return args
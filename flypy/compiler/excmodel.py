@@ -16,6 +16,9 @@ class ExcModel(interp.ExceptionModel):
 
     def exc_op_match(self, exc_type_const, exc):
         assert isinstance(exc_type_const, Const)
+        if isinstance(exc, Const):
+            # Pending exception, see throwing.insert_exception_checks
+            return False
 
         context = self.env['flypy.typing.context']
         exc_type = context[exc_type_const]
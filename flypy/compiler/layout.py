@@ -5,8 +5,10 @@ Object layout.
 """
 
 from __future__ import print_function, division, absolute_import
+import ctypes
 
 from flypy import conversion
+from flypy.typing import free
 
 from pykit import types as ptypes
 from pykit.utils import ctypes_support
@@ -48,3 +50,84 @@ def representation_type(ty):
         result_type = ptypes.Pointer(result_type)
 
     return result_type
+
+#===------------------------------------------------------------------===
+# Field placement
+#===------------------------------------------------------------------===
+
+def plan_fields(fields, options=None):
+    """
+    Place the fields of a struct, given as [(name, ctype)] in declaration
+    order. Classes can set `layout_options` to a dict with:
+
+        reorder: bool
+            Order fields by decreasing alignment, minimizing padding. Fields
+            of equal alignment keep their declaration order.
+
+        align: int
+            Pad the struct so that its size is a multiple of `align` bytes,
+            e.g. a cache line. Alignment of the struct in memory is up to
+            the allocator.
+
+    Returns the new list of (name, ctype) fields.
+    """
+    options = options or {}
+    unknown = set(options) - set(['reorder', 'align'])
+    if unknown:
+        raise ValueError("Unknown layout options: %s" % ", ".join(unknown))
+
+    fields = list(fields)
+    if options.get('reorder'):
+        fields.sort(key=lambda field: -ctypes.alignment(field[1]))
+
+    align = options.get('align')
+    if align and fields:
+        if align & (align - 1):
+            raise ValueError("Alignment must be a power of two, got %s" % align)
+        size = ctypes.sizeof(type('Struct', (ctypes.Structure,),
+                                  {'_fields_': fields}))
+        padding = -size % align
+        fields.extend(('_padding%d' % i, ctypes.c_int8)
+                          for i in range(padding))
+
+    return fields
+
+def layout_report(ty):
+    """
+    Describe the struct layout of a flypy class or type: the offset, size and
+    type of each field, and the padding between fields. Generic classes
+    need to be given a concrete type, e.g. Complex[float64, float64].
+    """
+    if hasattr(ty, 'type'):
+        ty = ty.type
+    if free(ty):
+        raise TypeError("Need a concrete type to lay out, got %s" % (ty,))
+
+    cty = conversion.ctype(ty)
+    if not conversion.stack_allocate(ty):
+        cty = cty._type_
+    resolved = ty.resolved_layout
+
+    lines = []
+    offset = 0
+    for name, fieldty in cty._fields_:
+        field = getattr(cty, name)
+        if field.offset > offset:
+            lines.append("  %4d  %4d  <padding>" % (offset, field.offset - offset))
+        if name in resolved:
+            lines.append("  %4d  %4d  %s: %s" % (field.offset, field.size,
+                                                  name, resolved[name]))
+        else:
+            lines.append("  %4d  %4d  <padding>" % (field.offset, field.size))
+        offset = field.offset + field.size
+
+    size = ctypes.sizeof(cty)
+    if size > offset:
+        lines.append("  %4d  %4d  <padding>" % (offset, size - offset))
+
+    used = sum(ctypes.sizeof(fieldty) for name, fieldty in cty._fields_
+                   if name in resolved)
+    header = ["%s: size %d, alignment %d, padding %d" % (
+                  ty, size, ctypes.alignment(cty), size - used),
+              "offset  size  field"]
+    return "\n".join(header + lines)
@@ -14,4 +14,5 @@ from .constructors import rewrite_constructors, rewrite_raise_exc_type
 from .constants import rewrite_constants
 from .objects import rewrite_obj_return
 from .allocation import allocator
+from .refcounting import insert_refcounts
 from .externs import rewrite_externs
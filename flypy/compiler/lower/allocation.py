@@ -3,6 +3,9 @@
 """
 Object allocation. Lower to GC or stack-allocation based on available
 information.
+
+Functions compiled with @jit(allocator="arena") run in an arena, see
+flypy.runtime.arena.
 """
 
 from __future__ import print_function, division, absolute_import
@@ -12,6 +15,8 @@ from flypy import is_flypy_type, errors
 from flypy.compiler.utils import Caller
 from flypy.types import Type, Pointer, void, int64
 from flypy.representation import stack_allocate
+from flypy.extern_support import relocation, type_name
+from flypy.compiler.lower.externs import symbol_address
 from flypy.runtime import gc
 
 from pykit import types as ptypes
@@ -27,8 +32,14 @@ def allocator(func, env):
     for op in func.ops:
         newop = None
         if op.opcode == 'allocate_obj':
-            stmts, newop = allocate_object(caller, b, context[op], env)
+            metadata = op.metadata or {}
+            nonescaping = metadata.get('flypy.stackalloc')
+            stmts, newop = allocate_object(caller, b, context[op], env,
+                                           nonescaping)
             newop.result = op.result
+            if (env['flypy.gc.count_allocations'] and not nonescaping and
+                    not stack_allocate(context[op])):
+                stmts = count_allocation(caller, b, func, env, op) + stmts
         elif op.opcode == 'register_finalizer':
             stmts = register_finalizer(caller, b, env, context,
                                        context[op.args[0]], gcmod, op.args[0])
@@ -40,12 +51,18 @@ def allocator(func, env):
         else:
             op.delete()
 
+    options = env['flypy.state.options'] or {}
+    allocator = options.get('allocator', 'gc')
+    if allocator != 'gc' and not env['flypy.state.opaque']:
+        run_in_arena(func, env, allocator)
+
 
-def allocate_object(caller, builder, type, env):
+def allocate_object(caller, builder, type, env, nonescaping=False):
     """
-    Allocate object of type `type`.
+    Allocate object of type `type`. Objects that do not escape (see
+    flypy.compiler.analysis.escape) are allocated on the stack.
     """
-    if stack_allocate(type):
+    if stack_allocate(type) or nonescaping:
         obj = builder.alloca(ptypes.Pointer(ptypes.Opaque))
         return [obj], obj
     else:
@@ -66,18 +83,20 @@ def heap_allocate(caller, builder, type, env):
     phase = env['flypy.state.phase']
     # TODO: implement untyped pykit builder !
 
-    # Put object on the heap: call gc.gc_alloc(nitems, type)
+    # Put object on the heap: call gc.gc_alloc_object(type). The fast path
+    # of gc_alloc_object is inlined, see flypy.runtime.gc.boehm
     gcmod = gc.gc_impl(env["flypy.gc.impl"])
+    if arena_allocate(type, env):
+        from flypy.runtime import arena
+        gcmod = arena
     context = env['flypy.typing.context']
 
-    # Build arguments for gc_alloc
-    n = Const(1, ptypes.Opaque)
+    # Build arguments for gc_alloc_object
     ty = Const(type, ptypes.Opaque)
-    context[n] = int64
     context[ty] = Type[type]
 
-    # Type the gc_alloc function
-    p = caller.call(phase, gcmod.gc_alloc, [n, ty])
+    # Type the gc_alloc_object function
+    p = caller.call(phase, gcmod.gc_alloc_object, [ty])
     obj = builder.convert(ptypes.Opaque, p)
 
     # Update type context
@@ -85,6 +104,123 @@ def heap_allocate(caller, builder, type, env):
 
     return [p, obj], obj
 
+def arena_allocate(type, env):
+    """
+    Whether objects of `type` are allocated in the current arena when one is
+    active. Objects with a finalizer are always allocated by the collector.
+    """
+    return (env['flypy.gc.arenas'] and env['flypy.gc.impl'] == 'boehm' and
+            '__del__' not in type.fields)
+
+def run_in_arena(func, env, allocator):
+    """
+    Run `func` in a new arena: enter the arena on entry, and exit it on
+    return.
+    """
+    from flypy.runtime import arena
+    from flypy.compiler.optimizations import throwing
+
+    if allocator != 'arena':
+        raise errors.CompileError("Unknown allocator: %r" % (allocator,))
+    if env['flypy.gc.impl'] != 'boehm':
+        raise errors.CompileError(
+            "Arena allocation is not supported with collector %r" % (
+                                                    env['flypy.gc.impl'],))
+    if not env['flypy.gc.arenas']:
+        raise errors.CompileError(
+            "Function %s allocates in an arena, which needs flypy.gc.arenas "
+            "to be set" % (func.name,))
+    check_arena_escapes(func, env)
+
+    context = env['flypy.typing.context']
+    phase = env['flypy.state.phase']
+    b = Builder(func)
+    caller = Caller(b, context, env)
+
+    b.position_at_beginning(func.startblock)
+    mark = caller.call(phase, arena.enter_arena, [])
+
+    for op in list(func.ops):
+        if op.opcode == 'ret' or (op.opcode == 'exc_throw' and
+                                  throwing.propagates(op, context)):
+            b.position_before(op)
+            result = caller.call(phase, arena.exit_arena, [mark])
+            context[result] = void
+
+def check_arena_escapes(func, env):
+    """
+    Objects allocated in the arena of `func`, directly or by its callees,
+    are freed when it returns. Reject functions that may hand out such
+    objects.
+    """
+    escape = arena_escape(env)
+    if escape:
+        raise errors.CompileError(
+            "Function %s cannot allocate in an arena: %s" % (func.name,
+                                                            escape))
+
+def arena_escape(env):
+    """
+    Describe how objects allocated in an arena may escape from the function
+    of `env`, or return None. Objects escape through results holding heap
+    references, and through arguments in which heap references may be
+    stored.
+    """
+    from flypy.runtime.gc.semispace import is_heap_type
+
+    restype = env['flypy.typing.restype']
+    if is_heap_type(restype) or holds_references(restype):
+        return ("it returns objects of type %s, which may be freed with the "
+                "arena" % (restype,))
+
+    for i, argtype in enumerate(env['flypy.typing.argtypes']):
+        if holds_references(argtype):
+            return ("it takes argument %d of type %s, which may store objects "
+                    "freed with the arena" % (i, argtype))
+
+    return None
+
+def holds_references(type, seen=None):
+    """
+    Whether values of `type`, or memory reachable from them, hold references
+    to heap objects. This includes the storage of Buffers and Lists, which
+    is reached through pointers.
+    """
+    from flypy.runtime.obj.pointerobject import Pointer as PointerClass
+    from flypy.runtime.gc.semispace import is_heap_type, is_struct_type
+
+    if seen is None:
+        seen = set()
+    if type in seen:
+        return False
+    seen.add(type)
+
+    if type.impl == PointerClass:
+        base = type.parameters[0]
+        return is_heap_type(base) or holds_references(base, seen)
+    elif is_heap_type(type) or is_struct_type(type):
+        return any(is_heap_type(fieldtype) or holds_references(fieldtype, seen)
+                       for fieldtype in type.resolved_layout.values())
+    return False
+
+def count_allocation(caller, builder, func, env, op):
+    """
+    Increment the allocation counter of the allocation site of `op`, see
+    flypy.gc.allocation_counts()
+    """
+    from flypy.runtime.gc import sites
+
+    context = env['flypy.typing.context']
+    lineno = (op.metadata or {}).get('lineno', -1)
+    site = (func.name, lineno, str(context[op]))
+
+    address = symbol_address(builder, sites.counter_symbol(site),
+                             ptypes.Opaque, env['flypy.target'])
+    context[address] = int64
+    result = caller.call(env['flypy.state.phase'], sites.count_allocation,
+                         [address])
+    return [address, result]
+
 def register_finalizer(caller, builder, env, context, type, gcmod, obj):
     """
     Register a finalizer for the object given as pointer `obj`.
@@ -101,10 +237,11 @@ def register_finalizer(caller, builder, env, context, type, gcmod, obj):
         lfunc, env = phase.apply_phase(phase.codegen, __del__, (type,),
                                        env['flypy.target'])
 
-        # Retrieve function address of __del__
+        # Refer to __del__ by a symbol bound to its address
         cfunc = env["codegen.llvm.ctypes"]
-        pointerval = ctypes.cast(cfunc, ctypes.c_void_p).value
-        ptr = ir.Pointer(pointerval, ptypes.Pointer(ptypes.Void))
+        symbol = relocation(".flypy.finalizer.%s" % (type_name(type),),
+                            ctypes.cast(cfunc, ctypes.c_void_p).value)
+        ptr = symbol_address(builder, symbol, ptypes.Opaque)
         context[ptr] = Pointer[void]
 
         # Cast object to void *
@@ -115,4 +252,4 @@ def register_finalizer(caller, builder, env, context, type, gcmod, obj):
         result = caller.call(curphase, gcmod.gc_add_finalizer, [obj_p, ptr])
         context[result] = void
 
-        return [obj_p, result]
+        return [ptr, obj_p, result]
@@ -6,9 +6,12 @@ Handle constants.
 
 from __future__ import print_function, division, absolute_import
 import ctypes
+import hashlib
 
 from flypy.representation import byref
 from flypy.conversion import fromobject, toctypes
+from flypy.extern_support import symbols, relocation
+from flypy.cache import keys
 
 from pykit.utils.ctypes_support import from_ctypes_value
 from pykit.ir import collect_constants, substitute_args
@@ -19,6 +22,11 @@ from pykit.ir import collect_constants, substitute_args
 
 _keep_alive = []
 
+# Symbols of the objects referenced by constants, by address. Code generation
+# refers to these symbols instead of the addresses (see
+# flypy.compiler.backend.llvm.relocate_constants)
+relocations = {}
+
 def rewrite_constants(func, env):
     """
     Rewrite constants with user-defined types to IR constants. Also rewrite
@@ -39,19 +47,70 @@ def rewrite_constants(func, env):
         new_constants = []
         for c in constants:
             ty = context[c]
-
-            # Python -> flypy (if not already)
-            flypy_obj = fromobject(c.const, ty)
-            # flypy -> ctypes
-            ctype_obj = toctypes(flypy_obj, ty, _keep_alive)
-            if byref(ty):
-                ctype_obj = ctypes.pointer(ctype_obj)
-            # ctypes -> pykit
-            new_const = from_ctypes_value(ctype_obj)
-
+            new_const = make_constant(c.const, ty)
             context[new_const] = ty
             new_constants.append(new_const)
 
-            _keep_alive.extend([ctype_obj, c.const])
+        substitute_args(op, constants, new_constants)
+
+def make_constant(value, ty):
+    """
+    Build an IR constant with the low-level representation of the Python
+    value `value` of flypy type `ty`.
+    """
+    # Python -> flypy (if not already)
+    flypy_obj = fromobject(value, ty)
+    # flypy -> ctypes
+    ctype_obj = toctypes(flypy_obj, ty, _keep_alive)
+    if byref(ty):
+        ctype_obj = ctypes.pointer(ctype_obj)
+    # ctypes -> pykit
+    new_const = from_ctypes_value(ctype_obj)
+
+    for path, address in pointers(ctype_obj):
+        relocations[address] = constant_symbol(value, ty, path, address)
+
+    _keep_alive.extend([ctype_obj, value])
+    return new_const
+
+def constant_symbol(value, ty, path, address):
+    """
+    Get the symbol for the object at `address`, referenced by the field at
+    `path` of the constant `value` of type `ty`.
+
+    Constants of immutable builtin values (e.g. strings, numbers, or tuples
+    of these) are named after their type and contents, and share the symbol
+    of an equal constant. Other objects are named after their address.
+    """
+    if keys.compatible_const(value):
+        key = repr((keys.qualify(ty), value))
+        name = ".".join((".flypy.constant", hashlib.sha1(key).hexdigest())
+                        + path)
+        if name in symbols:
+            return symbols[name]
+    else:
+        name = ".flypy.constant.%x" % (address,)
+    return relocation(name, address)
+
+def pointers(cval, path=()):
+    """
+    Yield (path, address) for each non-NULL pointer in ctypes value `cval`,
+    which is a pointer or a struct with pointer fields at `path`.
+    """
+    from flypy.support.ctypes_support import (
+        is_ctypes_struct_type, is_ctypes_pointer_type, is_ctypes_function_type,
+        ptrval)
 
-        substitute_args(op, constants, new_constants)
\ No newline at end of file
+    cty = type(cval)
+    if is_ctypes_struct_type(cty):
+        for field in cty._fields_:
+            name, fieldtype = field[:2]
+            offset = getattr(cty, name).offset
+            fieldval = fieldtype.from_buffer(cval, offset)
+            for item in pointers(fieldval, path + (name,)):
+                yield item
+    elif (is_ctypes_pointer_type(cty) or is_ctypes_function_type(cty) or
+              cty in (ctypes.c_void_p, ctypes.c_char_p)):
+        address = ptrval(cval)
+        if address:
+            yield path, address
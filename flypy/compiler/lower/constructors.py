@@ -16,7 +16,9 @@ from pykit.ir import Builder, OpBuilder, Const
 
 def rewrite_raise_exc_type(func, env):
     """
-    Rewrite 'raise Exception' to 'raise Exception()'
+    Rewrite 'raise Exception' to 'raise Exception()', and record constant
+    arguments of 'raise Exception(args)', which the exception can't hold
+    (see flypy.runtime.raising).
     """
     context = env['flypy.typing.context']
     b = Builder(func)
@@ -34,6 +36,11 @@ def rewrite_raise_exc_type(func, env):
 
                     type = ty.parameters[0]
                     context[exc_obj] = type
+            elif isinstance(exc_type, ir.Op) and exc_type.opcode == 'call':
+                f, args = exc_type.args
+                if all(isinstance(arg, Const) for arg in [f] + args):
+                    args = tuple(arg.const for arg in args)
+                    op.add_metadata({'flypy.exc.args': args})
 
 
 def rewrite_constructors(func, env):
@@ -65,6 +72,8 @@ def rewrite_constructors(func, env):
                 # Allocate object
                 obj = ir.Op(
                     'allocate_obj', ptypes.Pointer(ptypes.Void), args=[])
+                if op.metadata and 'lineno' in op.metadata:
+                    obj.add_metadata({'lineno': op.metadata['lineno']})
                 register_finalizer = ir.Op(
                     'register_finalizer', ptypes.Void, args=[obj])
                 context[register_finalizer] = void
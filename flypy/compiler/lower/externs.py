@@ -6,12 +6,14 @@ from flypy.compiler import lltype
 
 
 def rewrite_externs(func, env):
-    """Rewrite external symbol references
+    """Rewrite external symbol references, and calls of ctypes and cffi
+    functions to calls of external symbols (see flypy.extern_support)
 
     Base on flypy.compiler.lower.constants.rewrite_constants
     """
     if env['flypy.state.opaque']:
         return
+    context = env['flypy.typing.context']
     target = env['flypy.target']
     # For each operation
     for op in func.ops:
@@ -22,23 +24,12 @@ def rewrite_externs(func, env):
             new_constants = []
             for c in constants:
                 extern = c.const
+                if (c is op.args[0] and
+                        extern_support.is_foreign_function(extern)):
+                    extern = extern_support.foreign_symbol(extern, context[c])
 
                 if extern_support.is_extern_symbol(extern):
-                    # Make a declare-only function
-                    argtypes = extern.type.argtypes
-                    restype = extern.type.restype
-
-                    if target == "cpu":
-                        # Install external symbol for CPU target
-                        extern.install()
-
-                    functype = ptypes.Function(lltype(restype),
-                                               [lltype(t) for t in argtypes],
-                                               extern.type.varargs)
-                    # Note: Global value should really be part inserted into
-                    # a module.  But there are no module support at this point.
-                    replacment = ir.GlobalValue(extern.name, functype,
-                                                external=True)
+                    replacment = global_value(extern, target)
                 else:
                     # No change
                     replacment = c
@@ -47,3 +38,29 @@ def rewrite_externs(func, env):
             # Replace
             ir.substitute_args(op, constants, new_constants)
 
+
+
+def global_value(extern, target="cpu"):
+    """
+    Make a declare-only function for external symbol `extern`
+    """
+    argtypes = extern.type.argtypes
+    restype = extern.type.restype
+
+    if target == "cpu":
+        # Install external symbol for CPU target
+        extern.install()
+
+    functype = ptypes.Function(lltype(restype),
+                               [lltype(t) for t in argtypes],
+                               extern.type.varargs)
+    # Note: Global value should really be part inserted into
+    # a module.  But there are no module support at this point.
+    return ir.GlobalValue(extern.name, functype, external=True)
+
+def symbol_address(builder, extern, type, target="cpu"):
+    """
+    Emit the address of external symbol `extern`, e.g. a relocation (see
+    flypy.extern_support.relocation), as a value of pykit type `type`.
+    """
+    return builder.convert(type, global_value(extern, target))
@@ -1,20 +1,37 @@
 # -*- coding: utf-8 -*-
 
 """
-Handle a restricted form of generators and inlining.
+Handle generators.
+
+Generators consumed by a single loop are fused with the loop, by inlining
+the generator and replacing its yields with the loop body. Other generators
+are compiled to generator objects with a resumable body, see
+`rewrite_general_generators` and flypy.runtime.obj.generatorobject.
 """
 
 from __future__ import print_function, division, absolute_import
 
+import ctypes
+import hashlib
 from collections import namedtuple
 from functools import partial
 
 from flypy.errors import error
 from flypy.runtime import builtins
+from flypy.types import Type, bool_, int64
+from flypy.representation import byref
+from flypy.compiler import copying
+from flypy.compiler.utils import Caller
+from flypy.compiler.lower.externs import symbol_address
+from flypy.extern_support import relocation
+from flypy.cache import keys
 from flypy.compiler.optimizations import inlining, reg2mem
+from flypy.compiler.backend.shadowstack import (position_after_definition,
+                                                substitute)
 
-from pykit.ir import Builder, copying
-from pykit.analysis import loop_detection, callgraph
+from pykit import types as ptypes
+from pykit.ir import Builder, Function, Const
+from pykit.analysis import loop_detection, callgraph, cfa
 from pykit.utils import listify
 
 #===------------------------------------------------------------------===
@@ -119,15 +136,6 @@ def fuse_generators(func, env, consumers):
         consume_yields(func, consumer, generator_func, valuemap)
 
 
-def rewrite_general_generators(func, env):
-    """
-    Rewrite general use of generators.
-    """
-    generator_objects = find_generators(func, env)
-    for gen in generator_objects:
-        error(env, 'lower', "Generator %s could not be fused" % (gen,))
-
-
 #=== rewrites ===#
 
 def detach_loop(func, consumer):
@@ -216,4 +224,442 @@ def consume_yields(func, consumer, generator_func, valuemap):
                     op.delete()
 
     # We don't need these anymore
-    consumer.next.delete()
\ No newline at end of file
+    consumer.next.delete()
+
+#===------------------------------------------------------------------===
+# General Generators
+#===------------------------------------------------------------------===
+
+def rewrite_general_generators(func, env):
+    """
+    Rewrite generators that could not be fused to functions allocating a
+    generator object, and compile their bodies to resume functions.
+    """
+    envs = env['flypy.state.envs']
+
+    resume_funcs = []
+    worklist = list(callgraph.callgraph(func).node)
+    while worklist:
+        f = worklist.pop()
+        e = envs[f]
+        if e['flypy.state.generator'] and not e['flypy.state.opaque']:
+            resume_func, resume_env = split_generator(f, e)
+            resume_funcs.append((resume_func, resume_env))
+            worklist.extend(callgraph.callgraph(resume_func).node)
+
+    for resume_func, resume_env in resume_funcs:
+        compile_resume_function(resume_func, resume_env)
+
+def split_generator(func, env):
+    """
+    Split generator `func` into a function allocating the generator object,
+    and a resume function running the body.
+    """
+    from flypy.runtime.obj.generatorobject import GeneratorInfo
+
+    if env['flypy.gc.impl'] != 'boehm' or env['flypy.target'] != 'cpu':
+        error(env, 'lower', "Generator %s could not be fused, generator "
+                            "objects need the boehm collector" % (func.name,))
+
+    info = GeneratorInfo()
+    resume_func, resume_env = copying.copy(func, env)
+    make_resume_function(resume_func, resume_env, info)
+    make_constructor(func, env, info)
+    return resume_func, resume_env
+
+def compile_resume_function(func, env):
+    from flypy.pipeline import phase
+
+    cfunc = phase.compile_typed(func, env)
+    info = env['flypy.generators.resume']
+    info.resume = ctypes.cast(cfunc, ctypes.c_void_p).value
+
+#=== rewrites ===#
+
+def make_constructor(func, env, info):
+    """
+    Replace the body of generator `func` by the allocation of its generator
+    object. The arguments are stored in the frame by `generator_frames`.
+    """
+    from flypy.runtime.obj.generatorobject import Generator
+
+    context = env['flypy.typing.context']
+    gentype = env['flypy.typing.restype']
+
+    for block in list(func.blocks):
+        func.del_block(block)
+
+    b = Builder(func)
+    b.position_at_end(func.new_block(func.temp("entry")))
+    cls = Const(Generator, ptypes.Opaque)
+    symbol = relocation(generator_symbol_name(env), info.address)
+    address = symbol_address(b, symbol, ptypes.Opaque, env['flypy.target'])
+    gen = b.call(ptypes.Opaque, cls, [address])
+    b.ret(gen)
+
+    context[cls] = Type[gentype]
+    context[address] = int64
+    context[gen] = gentype
+
+    func.type = ptypes.Function(ptypes.Opaque, func.type.argtypes, False)
+    func.reset_uses()
+    env['flypy.state.generator'] = 0
+    env['flypy.generators.constructor'] = info
+
+def generator_symbol_name(env):
+    """
+    Name the GeneratorInfo of the generator compiled in `env` after the
+    function and the settings it is specialized for.
+    """
+    key = (tuple(map(keys.qualify, env['flypy.typing.argtypes'])),
+           env['flypy.target'], env['flypy.target_cpu'], env['flypy.gc.impl'],
+           env['flypy.policies'], sorted(env['flypy.optimization'].items()))
+    return ".flypy.generator.%s.%s.%s" % (env['flypy.state.func_module'],
+                                          env['flypy.state.func_qname'],
+                                          hashlib.sha1(repr(key)).hexdigest())
+
+def make_resume_function(func, env, info):
+    """
+    Turn a copy of a generator into its resume function. The generator
+    object is passed as an extra argument, and yields store the value and
+    the state in the generator object before returning:
+
+        yield x         =>      setfield(gen, 'value', x)
+                                setfield(gen, 'state', 1)
+                                cbranch(suspend(1), suspended, resume)
+
+                            suspended:
+                                ret True
+
+    We keep the edge to the code following the yield until the frame is
+    built, so optimizations see the flow of values across the yield.
+    """
+    from flypy.runtime.obj.generatorobject import suspend
+
+    context = env['flypy.typing.context']
+    phase = env['flypy.state.phase']
+    gentype = env['flypy.typing.restype']
+
+    b = Builder(func)
+    caller = Caller(b, context, env)
+
+    gen = func.add_arg(func.temp("generator"), ptypes.Opaque)
+    context[gen] = gentype
+    func.type = ptypes.Function(ptypes.Opaque, (ptypes.Opaque,) * len(func.args),
+                                False)
+
+    state = 0
+    for op in list(func.ops):
+        if op.opcode == 'yield':
+            state += 1
+            suspend_at(func, b, caller, phase, suspend, op, gen, state)
+        elif op.opcode == 'ret':
+            done = Const(False, ptypes.Bool)
+            context[done] = bool_
+            op.set_args([done])
+
+    func.reset_uses()
+    env['flypy.typing.restype'] = bool_
+    env['flypy.typing.argtypes'] = tuple(env['flypy.typing.argtypes']) + (
+        gentype,)
+    env['flypy.state.generator'] = 0
+    env['flypy.generators.resume'] = info
+
+def suspend_at(func, b, caller, phase, suspend, op, gen, state):
+    """Suspend the generator at yield `op`"""
+    context = caller.context
+    [value] = op.args
+
+    b.position_after(op)
+    block, resume = b.splitblock()
+    op.delete()
+
+    b.position_at_end(block)
+    if value is not None:
+        b.setfield(gen, 'value', value)
+    stateconst = Const(state, ptypes.Opaque)
+    context[stateconst] = int64
+    b.setfield(gen, 'state', stateconst)
+    suspended = caller.call(phase, suspend, [stateconst])
+
+    exit = func.new_block(func.temp("suspended"), after=block)
+    b.cbranch(suspended, exit, resume)
+    b.position_at_end(exit)
+    result = Const(True, ptypes.Bool)
+    context[result] = bool_
+    b.ret(result)
+
+#===------------------------------------------------------------------===
+# Generator Frames
+#===------------------------------------------------------------------===
+
+word = ptypes.Int64
+word_size = ctypes.sizeof(ctypes.c_void_p)
+
+def generator_frames(func, env):
+    """
+    Store the arguments of generators in the frame of their generator
+    object, and keep the state of resume functions in the frame.
+    """
+    if env['flypy.generators.constructor'] is not None:
+        store_arguments(func, env)
+    elif env['flypy.generators.resume'] is not None:
+        build_frame(func, env)
+
+def store_arguments(func, env):
+    """Store the arguments of generator `func` in the frame"""
+    context = env['flypy.typing.context']
+    offsets, size = frame_layout(argument_types(func.args, context))
+    b = Builder(func)
+
+    for op in list(func.ops):
+        if op.opcode == 'ret':
+            [gen] = op.args
+            b.position_before(op)
+            base = frame_base(b, gen)
+            for arg, offset in zip(func.args, offsets):
+                value = arg
+                if passed_byref(arg, context):
+                    value = b.ptrload(arg)
+                b.ptrstore(value, slot(b, base, offset, value.type))
+
+def build_frame(func, env):
+    """
+    Build the frame of resume function `func`. The function is entered
+    through a dispatch on the state of the generator, which jumps to the
+    start of the body or to the code following the yield it is suspended
+    at. The arguments, stack allocations and values live across yields are
+    kept in the frame:
+
+        x = call(f, [])                     x = call(f, [])
+        cbranch(suspend(1), exit, resume)   ptrstore(x, slot)
+                                    =>      jump(exit)
+    resume:                             resume:
+        call(g, [x])                        x1 = ptrload(slot)
+                                            call(g, [x1])
+    """
+    from flypy.runtime.obj.generatorobject import START, DONE
+
+    context = env['flypy.typing.context']
+    info = env['flypy.generators.resume']
+    b = Builder(func)
+
+    gen, args = func.args[-1], func.args[:-1]
+    suspensions = split_suspensions(func, env, b)
+    allocas = [op for op in func.ops if op.opcode == 'alloca']
+    live = live_across_suspensions(func, suspensions)
+    remove_suspensions(func, b, suspensions)
+
+    types = argument_types(args, context)
+    types += [alloca.type.base for alloca in allocas]
+    types += [value.type for value in live]
+    offsets, size = frame_layout(types)
+    info.frame_size = size
+
+    # Read the state and compute the slots in a new entry block
+    b.position_at_beginning(func.startblock)
+    entry, body = b.splitblock()
+    b.position_at_end(entry)
+    state = b.getfield(word, gen, 'state')
+    b.setfield(gen, 'state', Const(DONE, word))
+    base = frame_base(b, gen)
+    slots = [slot(b, base, offset, type)
+                 for offset, type in zip(offsets, types)]
+
+    func.reset_uses()
+    for arg in args:
+        p = slots.pop(0)
+        value = p if passed_byref(arg, context) else b.ptrload(p)
+        for use in list(func.uses[arg]):
+            use.set_args(substitute(use.args, arg, value))
+
+    for alloca in allocas:
+        alloca.replace_uses(slots.pop(0))
+        alloca.delete()
+
+    func.reset_uses()
+    for value in live:
+        demote(func, b, value, slots.pop(0))
+
+    # Dispatch on the state
+    dispatch = entry
+    targets = [(START, body)] + [(k, resume) for k, _, resume in suspensions]
+    for k, target in targets:
+        b.position_at_end(dispatch)
+        matches = b.eq(state, Const(k, word))
+        dispatch = func.new_block(func.temp("dispatch"), after=dispatch)
+        b.cbranch(matches, target, dispatch)
+
+    b.position_at_end(dispatch)
+    b.ret(Const(False, ptypes.Bool))
+
+    func.args = [gen]
+    func.type = ptypes.Function(func.type.restype, (gen.type,), False)
+    func.reset_uses()
+
+def split_suspensions(func, env, b):
+    """
+    Find the suspension points of `func`, and split the edges to the code
+    following them, which the dispatch jumps to. Returns a list of
+    (state, suspend call, resume block).
+    """
+    from flypy.runtime.obj.generatorobject import suspend
+
+    envs = env['flypy.state.envs']
+    suspensions = []
+    for op in list(func.ops):
+        if op.opcode != 'call':
+            continue
+        f, args = op.args
+        if (isinstance(f, Function) and f in envs and
+                envs[f]['flypy.state.function_wrapper'] == suspend):
+            [state] = args
+            _, exit, target = op.block.terminator.args
+            resume = func.new_block(func.temp("resume"), after=op.block)
+            b.position_at_end(resume)
+            b.jump(target)
+            op.block.terminator.set_args([op, exit, resume])
+            b.replace_predecessor(op.block, resume, target)
+            suspensions.append((state.const, op, resume))
+
+    func.reset_uses()
+    return suspensions
+
+def remove_suspensions(func, b, suspensions):
+    """Return from the function at the suspension points"""
+    for state, call, resume in suspensions:
+        block = call.block
+        _, exit, _ = block.terminator.args
+        block.terminator.delete()
+        call.delete()
+        b.position_at_end(block)
+        b.jump(exit)
+
+def live_across_suspensions(func, suspensions):
+    """
+    Find the values defined before a suspension point and used in another
+    block after it. These no longer dominate their uses once the dispatch
+    jumps past their definition.
+    """
+    cfg = cfa.cfg(func)
+    reachable = dict((block, reachable_blocks(cfg, block))
+                         for block in func.blocks)
+
+    live = []
+    for op in func.ops:
+        if op.type.is_void or op.opcode == 'alloca':
+            continue
+        blocks = set(use_blocks(func, op)) - set([op.block])
+        for state, call, resume in suspensions:
+            if (call.block in reachable[op.block] and
+                    reachable[resume] & blocks):
+                live.append(op)
+                break
+
+    return live
+
+def demote(func, b, value, slot):
+    """
+    Store `value` in its slot after its definition, and reload it at its
+    uses in other blocks.
+    """
+    uses = list(func.uses[value])
+    position_after_definition(b, func, value, None)
+    b.ptrstore(value, slot)
+
+    for use in uses:
+        if use.opcode == 'phi':
+            blocks, values = use.args
+            values = list(values)
+            for i, (block, v) in enumerate(zip(blocks, values)):
+                if v is value and block is not value.block:
+                    b.position_before(block.terminator)
+                    values[i] = b.ptrload(slot)
+            use.set_args([blocks, values])
+        elif use.block is not value.block:
+            b.position_before(use)
+            use.set_args(substitute(use.args, value, b.ptrload(slot)))
+
+#=== frames ===#
+
+def argument_types(args, context):
+    """Types of the slots holding `args`"""
+    return [arg.type.base if passed_byref(arg, context) else arg.type
+                for arg in args]
+
+def passed_byref(arg, context):
+    type = context.get(arg)
+    return hasattr(type, 'impl') and byref(type)
+
+def frame_base(b, gen):
+    """Address of the frame of generator object `gen`"""
+    frame = b.getfield(ptypes.Pointer(ptypes.Int8), gen, 'frame')
+    return b.ptrcast(word, frame)
+
+def slot(b, base, offset, type):
+    """Pointer to the slot at `offset` in a frame, holding a `type`"""
+    address = b.add(base, Const(offset, word))
+    return b.convert(ptypes.Pointer(type), address)
+
+def frame_layout(types):
+    """Offsets of the slots holding values of `types`, and the frame size"""
+    offsets, offset = [], 0
+    for type in types:
+        offset = align_up(offset, max(alignment(type), word_size))
+        offsets.append(offset)
+        offset += sizeof(type)
+    return offsets, align_up(offset, word_size)
+
+def sizeof(type):
+    """Size of values of pykit type `type`"""
+    if type.is_struct:
+        offset = 0
+        for ty in type.types:
+            offset = align_up(offset, alignment(ty)) + sizeof(ty)
+        return align_up(offset, alignment(type))
+    elif type.is_array:
+        return type.count * sizeof(type.base)
+    elif type.is_vector:
+        size = 1
+        while size < type.count * sizeof(type.base):
+            size *= 2
+        return size
+    elif type.is_bool:
+        return 1
+    elif type.is_int or type.is_float:
+        return type.bits // 8
+    return word_size
+
+def alignment(type):
+    if type.is_struct:
+        return max([alignment(ty) for ty in type.types] or [1])
+    elif type.is_array:
+        return alignment(type.base)
+    return sizeof(type)
+
+def align_up(offset, align):
+    return (offset + align - 1) // align * align
+
+# -- helpers -- #
+
+def reachable_blocks(cfg, block):
+    """Blocks reachable from `block`, including itself"""
+    seen = set([block])
+    stack = [block]
+    while stack:
+        for succ in cfg.successors(stack.pop()):
+            if succ not in seen:
+                seen.add(succ)
+                stack.append(succ)
+    return seen
+
+def use_blocks(func, value):
+    """Blocks using `value`, the incoming blocks for phis"""
+    for use in func.uses[value]:
+        if use.opcode == 'phi':
+            blocks, values = use.args
+            for block, v in zip(blocks, values):
+                if v is value:
+                    yield block
+        else:
+            yield use.block
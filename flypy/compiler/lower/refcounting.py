@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+
+"""
+Insert reference counting operations for the "refcount" collector (see
+flypy.runtime.gc.refcount).
+
+This runs on the typed IR out of SSA form, before allocation. Heap references
+are either owned or borrowed:
+
+    - newly allocated objects, results of calls and values loaded from
+      variables are owned, and must be given away or released exactly once
+    - values loaded from fields are owned as well, since the field may be
+      overwritten while we use the value. We incref them when loaded, and
+      refcount_elision removes this again where that is not needed.
+    - arguments are borrowed, the caller owns them for the duration of the
+      call
+
+A reference is given away by storing it to a variable or a field, by
+returning it, or by passing it to an opaque function returning void (which
+may store it in memory, e.g. Pointer.store). We give away an owned reference
+at its last use, and a new reference otherwise:
+
+    x = call(f, [])             x = call(f, [])
+    call(g, [x])        =>      call(g, [x])
+    setfield(o, 'a', x)         incref(x)
+    call(h, [x])                old = getfield(o, 'a')
+                                setfield(o, 'a', x)
+                                decref(old)
+                                call(h, [x])
+                                decref(x)
+
+Owned references that are not given away are released where they die, which
+we determine from their liveness. If they die on a control flow edge, we
+release them at the start of the successor, splitting the edge if needed.
+"""
+
+from __future__ import print_function, division, absolute_import
+
+from flypy.compiler.utils import Caller
+from flypy.compiler.optimizations.unrolling import successors, handlers
+from flypy.types import Type, Pointer, void
+from flypy.runtime.gc import refcount, semispace
+
+from pykit import types as ptypes
+from pykit.ir import Builder, Op, FuncArg, Const, Undef
+from pykit.utils import flatten
+
+#===------------------------------------------------------------------===
+# Pass
+#===------------------------------------------------------------------===
+
+def insert_refcounts(func, env):
+    if env['flypy.gc.impl'] != 'refcount' or env['flypy.state.opaque']:
+        return
+
+    context = env['flypy.typing.context']
+    envs = env['flypy.state.envs']
+    b = Builder(func)
+    rc = RefcountInserter(func, env, context, envs, b)
+    rc.null_undefined()
+    rc.release_overwritten_fields()
+    rc.insert()
+    func.reset_uses()
+
+#===------------------------------------------------------------------===
+# Classification
+#===------------------------------------------------------------------===
+
+def is_heap_type(type):
+    return (hasattr(type, 'impl') and hasattr(type.impl, 'stackallocate') and
+            hasattr(type, 'resolved_layout') and
+            semispace.is_heap_type(type))
+
+def is_var(value, context):
+    """Variables introduced by reg2mem, which hold heap references"""
+    return (isinstance(value, Op) and value.opcode == 'alloca' and
+            value in context and is_heap_type(context[value]))
+
+def is_managed(value, context):
+    """Whether `value` is a counted reference"""
+    if isinstance(value, Op):
+        if value.opcode == 'alloca' or value.type.is_void:
+            return False
+        if value.opcode == 'allocate_obj':
+            return not (value.metadata or {}).get('flypy.stackalloc')
+    elif not isinstance(value, FuncArg):
+        return False
+    return value in context and is_heap_type(context[value])
+
+def is_opaque_call(op, envs):
+    f, args = op.args
+    return f not in envs or envs[f]['flypy.state.opaque']
+
+def is_owned(value, context, envs):
+    """Whether `value` is an owned reference"""
+    if not isinstance(value, Op):
+        return False # Arguments are borrowed
+    elif value.opcode in ('allocate_obj', 'getfield'):
+        return True
+    elif value.opcode == 'call':
+        return not is_opaque_call(value, envs)
+    elif value.opcode == 'load':
+        return is_var(value.args[0], context)
+    return False
+
+def consumes(op, value, context, envs):
+    """Whether `op` takes over a reference to `value`"""
+    if op.opcode == 'store':
+        val, var = op.args
+        return val is value and is_var(var, context)
+    elif op.opcode == 'setfield':
+        obj, attr, val = op.args
+        return val is value
+    elif op.opcode in ('ret', 'exc_throw'):
+        return op.args[0] is value
+    elif op.opcode == 'call':
+        f, args = op.args
+        return (any(arg is value for arg in args) and
+                is_opaque_call(op, envs) and op.type.is_void)
+    return False
+
+def uses(op, value):
+    return any(arg is value for arg in flatten(op.args))
+
+#===------------------------------------------------------------------===
+# Control flow
+#===------------------------------------------------------------------===
+
+def all_successors(block):
+    return successors(block) + handlers(block)
+
+def liveness(func, values):
+    """
+    Compute the sets of `values` live on entry and exit of each block.
+    Returns (live_in, live_out).
+    """
+    values = set(values)
+    gen, kill = {}, {}
+    for block in func.blocks:
+        gen[block], kill[block] = set(), set()
+        if block is func.startblock:
+            kill[block].update(arg for arg in func.args if arg in values)
+        for op in block.ops:
+            for arg in flatten(op.args):
+                if arg in values and arg not in kill[block]:
+                    gen[block].add(arg)
+            if op in values:
+                kill[block].add(op)
+
+    live_in = dict((block, set()) for block in func.blocks)
+    live_out = dict((block, set()) for block in func.blocks)
+    changed = True
+    while changed:
+        changed = False
+        for block in reversed(list(func.blocks)):
+            out = set()
+            for succ in all_successors(block):
+                out |= live_in[succ]
+            in_ = gen[block] | (out - kill[block])
+            if out != live_out[block] or in_ != live_in[block]:
+                live_out[block], live_in[block] = out, in_
+                changed = True
+
+    return live_in, live_out
+
+#===------------------------------------------------------------------===
+# Insertion
+#===------------------------------------------------------------------===
+
+class RefcountInserter(object):
+
+    def __init__(self, func, env, context, envs, builder):
+        self.func = func
+        self.env = env
+        self.context = context
+        self.envs = envs
+        self.builder = builder
+        self.caller = Caller(builder, context, env)
+        self.phase = env['flypy.state.phase']
+
+        # Old values of overwritten fields, which we release directly
+        self.overwritten = set()
+
+    # -------------------------------------------------
+
+    def call(self, f, value):
+        """Emit a call to incref or decref"""
+        obj = self.builder.convert(ptypes.Opaque, value)
+        self.context[obj] = Pointer[void]
+        result = self.caller.call(self.phase, f, [obj])
+        self.context[result] = void
+
+    def incref(self, value):
+        self.call(refcount.incref, value)
+
+    def decref(self, value):
+        self.call(refcount.decref, value)
+
+    def position_at_start(self, block):
+        for op in block.ops:
+            if op.opcode != 'exc_catch':
+                self.builder.position_before(op)
+                return
+        self.builder.position_at_end(block)
+
+    # -------------------------------------------------
+
+    def null_undefined(self):
+        """
+        Store null references instead of undefined values in variables,
+        since the loaded value will be released.
+        """
+        for op in self.func.ops:
+            if op.opcode == 'store':
+                val, var = op.args
+                if isinstance(val, Undef) and is_var(var, self.context):
+                    type = self.context[var]
+                    self.builder.position_before(op)
+                    ty = Const(type, ptypes.Opaque)
+                    self.context[ty] = Type[type]
+                    null = self.caller.call(self.phase, refcount.null, [ty])
+                    op.set_args([null, var])
+
+    def release_overwritten_fields(self):
+        """Release the references in fields we overwrite"""
+        for op in list(self.func.ops):
+            if op.opcode == 'setfield':
+                obj, attr, value = op.args
+                obj_type = self.context[obj]
+                field_type = obj_type.resolved_layout[attr]
+                if not is_heap_type(field_type):
+                    continue
+
+                self.builder.position_before(op)
+                old = self.builder.getfield(ptypes.Opaque, obj, attr)
+                self.context[old] = field_type
+                self.overwritten.add(old)
+                self.builder.position_after(op)
+                self.decref(old)
+
+    # -------------------------------------------------
+
+    def insert(self):
+        func, context, envs = self.func, self.context, self.envs
+        func.reset_uses()
+
+        values = [v for v in list(func.args) + list(func.ops)
+                        if is_managed(v, context) and
+                           v not in self.overwritten]
+        live_in, live_out = liveness(func, values)
+
+        preds = dict((block, []) for block in func.blocks)
+        for block in func.blocks:
+            for succ in all_successors(block):
+                preds[succ].append(block)
+
+        loaded = []         # [value], incref the loaded field value
+        increfs = []        # [(op, value)], incref the value before op
+        decrefs = []        # [(op, value)], decref the value after op
+        edges = []          # [(block, succ, value)]
+
+        for value in values:
+            owned = is_owned(value, context, envs)
+            if isinstance(value, Op) and value.opcode == 'getfield':
+                if not func.uses[value]:
+                    continue # Unused, no need to count it
+                loaded.append(value)
+
+            for block in func.blocks:
+                defined = isinstance(value, Op) and value.block is block
+                if not defined and value not in live_in[block]:
+                    continue
+
+                ops = [op for op in block.ops if uses(op, value)]
+                dies = value not in live_out[block]
+                last = ops[-1] if ops else None
+
+                for op in ops:
+                    if consumes(op, value, context, envs):
+                        if not (owned and dies and op is last):
+                            increfs.append((op, value))
+
+                if not owned:
+                    continue
+                elif not dies:
+                    for succ in all_successors(block):
+                        if value not in live_in[succ]:
+                            edges.append((block, succ, value))
+                elif last is None:
+                    decrefs.append((value, value))
+                elif not consumes(last, value, context, envs):
+                    decrefs.append((last, value))
+
+        # -------------------------------------------------
+        # Emit
+
+        b = self.builder
+        for value in loaded:
+            b.position_after(value)
+            self.incref(value)
+
+        for op, value in increfs:
+            b.position_before(op)
+            self.incref(value)
+
+        for op, value in decrefs:
+            b.position_after(op)
+            self.decref(value)
+
+        split = {}
+        for block, succ, value in edges:
+            if len(preds[succ]) == 1:
+                self.position_at_start(succ)
+            elif succ in successors(block):
+                if (block, succ) not in split:
+                    split[block, succ] = split_edge(func, b, block, succ)
+                b.position_before(split[block, succ].terminator)
+            else:
+                # Dies on an exceptional edge to a shared handler, leave it
+                # to the collector
+                continue
+            self.decref(value)
+
+#===------------------------------------------------------------------===
+# Utils
+#===------------------------------------------------------------------===
+
+def split_edge(func, builder, block, succ):
+    """Insert an empty block on the edge from `block` to `succ`"""
+    newblock = func.new_block(func.temp(block.name), after=block)
+    builder.position_at_end(newblock)
+    builder.jump(succ)
+
+    terminator = block.terminator
+    terminator.set_args([newblock if arg is succ else arg
+                             for arg in terminator.args])
+    return newblock
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import unittest
+
+from flypy import jit
+from flypy.types import int32
+from flypy.pipeline import phase, environment
+
+#===------------------------------------------------------------------===
+# Test code
+#===------------------------------------------------------------------===
+
+@jit
+class P(object):
+    layout = [('x', int32), ('y', int32)]
+
+    @jit
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+    @jit
+    def norm1(self):
+        return self.x + self.y
+
+@jit('Box[a]')
+class Box(object):
+    layout = [('obj', 'a')]
+
+    @jit
+    def __init__(self, obj):
+        self.obj = obj
+
+def get(f, argtypes):
+    env = environment.fresh_env(f, argtypes, "cpu")
+    func, env = phase.hl_lower(f, env)
+    return func
+
+def allocas(func):
+    return [op for op in func.ops if op.opcode == 'alloca']
+
+#===------------------------------------------------------------------===
+# Tests
+#===------------------------------------------------------------------===
+
+class TestEscapeAnalysis(unittest.TestCase):
+
+    def test_nonescaping(self):
+        @jit
+        def f(x):
+            p = P(x, 2)
+            return p.norm1()
+
+        self.assertEqual(f(3), 5)
+        self.assertTrue(allocas(get(f, [int32])))
+
+    def test_nonescaping_loop(self):
+        @jit
+        def f(n):
+            total = 0
+            for i in range(n):
+                p = P(i, i)
+                total += p.norm1()
+            return total
+
+        self.assertEqual(f(4), 12)
+
+    def test_escape_return(self):
+        @jit
+        def f(x):
+            return P(x, 2)
+
+        self.assertEqual(f(3).x, 3)
+        self.assertFalse(allocas(get(f, [int32])))
+
+    def test_escape_store(self):
+        @jit
+        def f(x):
+            p = P(x, 2)
+            return Box(p)
+
+        self.assertEqual(f(3).obj.y, 2)
+        self.assertFalse(allocas(get(f, [int32])))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+"""
+Hoist bounds checks out of counted loops over a range, that index containers
+with the loop index:
+
+    for i in range(start, stop, step):
+        x = seq[i]
+        seq[i] = y
+
+becomes
+
+    r = range(start, stop, step)
+    inbounds = range_in_bounds(seq, r)
+    for i in r:
+        x = getitem_hoisted(seq, i, inbounds)
+        setitem_hoisted(seq, i, y, inbounds)
+
+The endpoints of the range are checked against len(seq) once, before the
+loop, and the loop indexes without checks if they are in bounds (see
+flypy.runtime.obj.indexing).
+
+This runs on untyped SSA IR. The container must be defined outside the loop,
+and may only be indexed with the loop index inside it. The loop may not
+call anything but operators, indexing and iteration, which don't resize
+containers.
+"""
+
+from __future__ import print_function, division, absolute_import
+import __builtin__
+
+from flypy.compiler.special import special
+from flypy.compiler.simplification import special_runtime
+from .unrolling import find_call, is_call, find_preheader, incoming_value
+
+from pykit import types as ptypes
+from pykit.ir import Builder, Op, FuncArg, OConst
+from pykit.analysis import loop_detection
+
+#===------------------------------------------------------------------===
+# Pass
+#===------------------------------------------------------------------===
+
+def run(func, env):
+    loop_forest = loop_detection.find_natural_loops(func)
+    for loop in loop_detection.flatloops(loop_forest):
+        counted_loop = match_counted_loop(func, loop)
+        if counted_loop:
+            hoist_checks(func, loop, *counted_loop)
+
+#===------------------------------------------------------------------===
+# Matching
+#===------------------------------------------------------------------===
+
+index_methods = set(['__getitem__', '__setitem__'])
+safe_methods = (set(special.values()) | set(special_runtime.values()) |
+                index_methods | set(['__len__']))
+
+def safe_functions():
+    from flypy.runtime import builtins
+    from flypy.runtime.obj import indexing
+
+    return (__builtin__.iter, __builtin__.next, __builtin__.len,
+            builtins.iter, builtins.next, builtins.len, builtins.range,
+            indexing.range_in_bounds, indexing.getitem_hoisted,
+            indexing.setitem_hoisted)
+
+def match_counted_loop(func, loop):
+    """
+    Match a loop of the form
+
+        header:
+            it = phi([preheader, tail], [iter(range(...)), it])
+            exc_setup([exit])
+            i = next(it)
+            ...
+
+    that only calls safe functions, and return (preheader, range, i). Returns
+    None if the loop doesn't match.
+    """
+    from flypy.runtime import builtins
+
+    header = loop.head
+    next_op = find_call(header, (__builtin__.next, builtins.next))
+    preheader = find_preheader(func, loop)
+    if next_op is None or preheader is None:
+        return None
+
+    [iterator] = next_op.args[1]
+    iter_op = incoming_value(iterator, preheader) or iterator
+    if not is_call(iter_op, (__builtin__.iter, builtins.iter)):
+        return None
+    [range_op] = iter_op.args[1]
+    if not is_call(range_op, (builtins.range,)):
+        return None
+
+    functions = safe_functions()
+    for block in loop.blocks:
+        for op in block.ops:
+            if not is_safe(op, functions):
+                return None
+
+    return preheader, range_op, next_op
+
+
+def is_safe(op, functions):
+    """Whether `op` can't resize containers"""
+    if op.opcode != 'call':
+        return True
+    f, args = op.args
+    if isinstance(f, Op) and f.opcode == 'getfield':
+        return f.args[1] in safe_methods
+    return is_call(op, functions)
+
+
+def indexed_containers(func, loop, index):
+    """
+    Find the containers defined outside the loop that it only indexes with
+    `index`. Returns [(container, [getfield])].
+    """
+    blocks = set(loop.blocks)
+    containers = []
+    for use in func.uses[index]:
+        if not is_index(use, index) or use.args[0].parent not in blocks:
+            continue
+        seq = use.args[0].args[0]
+        if any(seq is s for s, _ in containers):
+            continue
+        if isinstance(seq, Op) and seq.parent in blocks:
+            continue
+        if not isinstance(seq, (Op, FuncArg)):
+            continue
+
+        methods = [op for op in func.uses[seq] if op.parent in blocks]
+        if all(is_index_method(func, op, index) for op in methods):
+            containers.append((seq, methods))
+
+    return containers
+
+
+def is_index(op, index):
+    """Match call(getfield(seq, '__getitem__' | '__setitem__'), [index, ...])"""
+    if op.opcode != 'call':
+        return False
+    f, args = op.args
+    return (isinstance(f, Op) and f.opcode == 'getfield' and
+            f.args[1] in index_methods and
+            bool(args) and args[0] is index)
+
+
+def is_index_method(func, op, index):
+    """Whether `op` is an index method only used to index with `index`"""
+    if op.opcode != 'getfield' or op.args[1] not in index_methods:
+        return False
+    uses = func.uses[op]
+    return len(uses) == 1 and all(is_index(use, index) and
+                                  op.args[0] not in use.args[1]
+                                  for use in uses)
+
+#===------------------------------------------------------------------===
+# Hoisting
+#===------------------------------------------------------------------===
+
+def hoist_checks(func, loop, preheader, range_op, index):
+    from flypy.runtime.obj import indexing
+
+    b = Builder(func)
+    for seq, methods in indexed_containers(func, loop, index):
+        b.position_before(preheader.terminator)
+        inbounds = b.call(ptypes.Opaque, OConst(indexing.range_in_bounds),
+                          [seq, range_op])
+
+        for method in methods:
+            [call] = func.uses[method]
+            if method.args[1] == '__getitem__':
+                f = indexing.getitem_hoisted
+            else:
+                f = indexing.setitem_hoisted
+            call.set_args([OConst(f), [seq] + call.args[1] + [inbounds]])
+            method.delete()
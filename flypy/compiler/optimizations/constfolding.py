@@ -6,17 +6,25 @@ Constant Folding, used for sparse conditional constant propagation.
 
 from __future__ import print_function, division, absolute_import
 
-from flypy.compiler.typing import infer_call
+from flypy.compiler.lower.constants import make_constant
+
+from pykit import ir
 from pykit.optimizations import sccp
 
+scalars = (bool, int, long, float, complex)
+
 #===------------------------------------------------------------------===
 # Constant Folding
 #===------------------------------------------------------------------===
 
 class ConstantFolder(sccp.ConstantFolder):
     """
-    Fold calls to user-defined constants that are annotated with
-    `eval_if_const`.
+    Fold calls to pure functions:
+
+        - functions annotated with `eval_if_const`, which we evaluate with
+          the Python implementation if all arguments are constant
+        - functions annotated with `eval_from_types`, which compute their
+          result from the argument types only (e.g. len() of static tuples)
     """
 
     def __init__(self, context, env):
@@ -25,46 +33,51 @@ class ConstantFolder(sccp.ConstantFolder):
         self.envs = env['flypy.state.envs']
 
     def op_call(self, op, cells):
-        # Fetch the message receiver and the arguments
+        # Fetch the static receiver
         func, args = op.args
+        if not isinstance(func, ir.Function) or func not in self.envs:
+            return None
 
-        # Fetch all inputs
-        consts = [cells[arg] for arg in args]
-
-        if not all(map(sccp.isconst, consts)):
-            return None # Some runtime values, bail
+        func_env = self.envs[func]
+        options = func_env['flypy.state.options'] or {}
+        argtypes = func_env['flypy.typing.argtypes']
+        restype = func_env['flypy.typing.restype']
 
-        # Determine constant result for all receivers
-        result = None
-        first = True
-        method_types = self.context[func]
-        for method_type in method_types:
-            wrapper, obj = method_type.parameters
-            signature = self.context[func]
-
-            argtypes = [self.context[a] for a in args]
-            #typed_func, restype = infer_call(func, signature, argtypes)
-
-            # Check whether we can safely evaluate the function
-            func_env = self.envs[func]
-            options = func_env['flypy.state.options']
-            if not options.get('eval_if_const'):
+        if options.get('eval_from_types'):
+            result = options['eval_from_types'](argtypes)
+            if result is None:
                 return None
+        elif options.get('eval_if_const'):
+            # Fetch all inputs
+            consts = [cells[arg] for arg in args]
+            if not all(map(sccp.isconst, consts)):
+                return None # Some runtime values, bail
+            if not all(isinstance(sccp.unwrap(c), scalars) for c in consts):
+                return None # Only fold on Python scalars
 
             # Evaluate
-            const = func(*map(sccp.unwrap, consts))
-
-            # Check result type
-            ty = typeof(const)
-            if ty not in self.context[op]:
-                raise TypeError(
-                    "Result %s of type %s does not agree with inferred "
-                    "types %s" % (const, ty, self.context[op]))
-
-            if first:
-                first = False
-                result = const
-            elif const != result:
-                return None
-
-        return result
\ No newline at end of file
+            py_func = func_env['flypy.state.function_wrapper'].py_func
+            try:
+                result = py_func(*map(sccp.unwrap, consts))
+            except Exception:
+                return None # Raise the error at runtime
+        else:
+            return None
+
+        return self.make_constant(result, restype)
+
+    def make_constant(self, result, restype):
+        """
+        Build a typed IR constant from an evaluated result. We only fold if
+        the result is representable as a value of the return type.
+        """
+        try:
+            const = make_constant(result, restype)
+        except Exception:
+            return None
+
+        if isinstance(const.const, scalars) and const.const != result:
+            return None # Overflow or truncation
+
+        self.context[const] = restype
+        return const
@@ -32,7 +32,7 @@ def inliner(func, env):
         if op.opcode == 'call':
             # See if we are messaging a static receiver
             f, args = op.args
-            if isinstance(f, Function):
+            if isinstance(f, Function) and f is not func:
                 # See if `f` was defined with `inline=True`
                 e = envs[f]
                 options = e['flypy.state.options']
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+"""
+Resolve the indexing policies of a function (see flypy.runtime.obj.indexing)
+after inlining. Functions with 'inline=True' take the policy of the function
+they are inlined into. Functions that don't specify a policy take the
+policies of their environment, which are those of the function called from
+Python.
+"""
+
+from __future__ import print_function, division, absolute_import
+
+from flypy.runtime.obj import indexing
+
+from pykit import types as ptypes
+from pykit.ir import Const
+
+def run(func, env):
+    options = env['flypy.state.options'] or {}
+    if options.get('inline'):
+        return
+
+    envs = env['flypy.state.envs']
+    for op in list(func.ops):
+        name = policy(op, envs)
+        if name is not None:
+            value = options.get(name)
+            if value is None:
+                value = name in env['flypy.policies']
+            op.replace_uses(Const(bool(value), ptypes.Bool))
+            op.delete()
+
+def policy(op, envs):
+    """Return the name of the policy queried by `op`, or None"""
+    if op.opcode != 'call':
+        return None
+
+    f, args = op.args
+    if f in envs:
+        wrapper = envs[f]['flypy.state.function_wrapper']
+        return indexing.policies.get(wrapper)
+    return None
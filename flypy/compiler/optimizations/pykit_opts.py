@@ -14,6 +14,9 @@ def optimize(func, env):
 
     optimized = cache.lookup((func, optimize))
     if not optimized:
+        if not optimize:
+            # @jit(opt=0), see flypy.optimization
+            return func, env
         #analyzed, env = pipeline.analyze(func, env)
         optimized, env = pipeline.optimize(func, env)
 
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+"""
+Remove redundant reference counting operations inserted by
+flypy.compiler.lower.refcounting. An incref followed by a decref of the same
+reference is redundant if nothing in between may release the object:
+
+    incref(x)
+    y = getfield(x, 'a')        =>      y = getfield(x, 'a')
+    decref(x)
+
+Calls, stores and other decrefs may release objects, so we only remove pairs
+within a basic block without such operations in between.
+"""
+
+from __future__ import print_function, division, absolute_import
+
+from flypy.runtime.gc import refcount
+
+from pykit.ir import Op
+from pykit.utils import flatten
+
+#===------------------------------------------------------------------===
+# Pass
+#===------------------------------------------------------------------===
+
+def run(func, env):
+    if env['flypy.gc.impl'] != 'refcount' or env['flypy.state.opaque']:
+        return
+
+    envs = env['flypy.state.envs']
+    for block in func.blocks:
+        elide_pairs(block, envs)
+    func.reset_uses()
+
+def elide_pairs(block, envs):
+    pending = {} # { reference : incref }
+    pairs = []
+
+    for op in block.ops:
+        kind = refcount_op(op, envs)
+        if kind == 'incref':
+            pending[reference(op)] = op
+        elif kind == 'decref' and reference(op) in pending:
+            pairs.append((pending.pop(reference(op)), op))
+        elif kind == 'decref' or may_release(op):
+            pending.clear()
+
+    for incref, decref in pairs:
+        for op in (incref, decref):
+            [arg] = op.args[1]
+            op.delete()
+            if isinstance(arg, Op) and arg.opcode == 'convert':
+                if not any(uses(other, arg) for other in block.ops):
+                    arg.delete()
+
+#===------------------------------------------------------------------===
+# Utils
+#===------------------------------------------------------------------===
+
+def refcount_op(op, envs):
+    """Return 'incref' or 'decref' for calls to these, or None"""
+    if op.opcode != 'call':
+        return None
+
+    f, args = op.args
+    if f in envs:
+        wrapper = envs[f]['flypy.state.function_wrapper']
+        if wrapper is refcount.incref:
+            return 'incref'
+        elif wrapper is refcount.decref:
+            return 'decref'
+    return None
+
+def reference(op):
+    """The reference counted by an incref or decref"""
+    [arg] = op.args[1]
+    while isinstance(arg, Op) and arg.opcode == 'convert':
+        [arg] = arg.args
+    return arg
+
+def may_release(op):
+    return op.opcode in ('call', 'setfield', 'store', 'ptrstore', 'exc_throw')
+
+def uses(op, value):
+    return any(arg is value for arg in flatten(op.args))
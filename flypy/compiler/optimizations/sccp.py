@@ -8,8 +8,33 @@ constant folder.
 from __future__ import print_function, division, absolute_import
 from .constfolding import ConstantFolder
 
+from flypy import types, compiler
+
 from pykit.optimizations import sccp
+from pykit.ir import collect_constants
+
+# Scalar types for constants produced by folding low-level pykit operations
+scalar_types = [types.bool_, types.int8, types.int16, types.int32, types.int64,
+                types.float32, types.float64]
 
 def run(func, env):
-    folder = ConstantFolder(env['flypy.typing.context'], env)
-    sccp.run(func, env, folder)
\ No newline at end of file
+    context = env['flypy.typing.context']
+    folder = ConstantFolder(context, env)
+    sccp.run(func, env, folder)
+    if not env['flypy.state.opaque']:
+        type_constants(func, context)
+
+def type_constants(func, context):
+    """
+    Assign flypy types to new constants that resulted from folding low-level
+    operations, which are not in the typing context.
+    """
+    for op in func.ops:
+        if op.opcode == 'exc_catch':
+            continue
+        for c in collect_constants(op):
+            if c not in context:
+                for ty in scalar_types:
+                    if compiler.representation_type(ty) == c.type:
+                        context[c] = ty
+                        break
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+"""
+Scalar replacement of aggregates.
+
+Replace small stack-allocated objects that are only accessed through their
+fields by a variable for each field:
+
+    obj = alloca()                  x = alloca()
+    setfield(obj, 'x', a)    =>     store(a, x)
+    b = getfield(obj, 'x')          b = load(x)
+
+The variables are subsequently promoted to registers by the dataflow pass.
+This runs after inlining, which exposes the accesses in the constructor.
+Objects that are still passed to other functions are left to LLVM.
+"""
+
+from __future__ import print_function, division, absolute_import
+
+from pykit import types as ptypes
+from pykit.ir import Builder
+
+# Maximum number of fields of objects we replace
+MAX_FIELDS = 8
+
+#===------------------------------------------------------------------===
+# Pass
+#===------------------------------------------------------------------===
+
+def run(func, env):
+    if env['flypy.state.opaque']:
+        return
+
+    b = Builder(func)
+    allocas = [op for op in func.ops if op.opcode == 'alloca']
+    for alloca in allocas:
+        if is_replaceable(func, alloca):
+            replace_aggregate(func, b, alloca)
+
+    func.reset_uses()
+
+
+def is_replaceable(func, alloca):
+    """
+    Determine whether `alloca` allocates a small struct of scalars which is
+    only used to get and set fields.
+    """
+    type = alloca.type
+    if not type.is_pointer or not type.base.is_struct:
+        return False
+
+    struct = type.base
+    if len(struct.names) > MAX_FIELDS:
+        return False
+    if any(ty.is_struct or ty.is_vector for ty in struct.types):
+        return False
+
+    for use in func.uses[alloca]:
+        if use.opcode == 'getfield':
+            obj, attr = use.args
+        elif use.opcode == 'setfield':
+            obj, attr, value = use.args
+            if value is alloca:
+                return False
+        else:
+            return False
+        if attr not in struct.names:
+            return False
+
+    return True
+
+
+def replace_aggregate(func, b, alloca):
+    """Replace the fields of the struct allocated by `alloca` by variables"""
+    struct = alloca.type.base
+
+    b.position_after(alloca)
+    fields = {}
+    for name, type in zip(struct.names, struct.types):
+        fields[name] = b.alloca(ptypes.Pointer(type))
+
+    for use in list(func.uses[alloca]):
+        b.position_before(use)
+        if use.opcode == 'getfield':
+            obj, attr = use.args
+            value = b.load(fields[attr])
+            use.replace_uses(value)
+        else:
+            obj, attr, value = use.args
+            b.store(value, fields[attr])
+        use.delete()
+
+    alloca.delete()
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import unittest
+
+from flypy import jit, typeof
+from flypy.pipeline import phase, environment
+from flypy.runtime.obj import indexing
+
+from pykit.analysis import loop_detection
+
+#===------------------------------------------------------------------===
+# Helpers
+#===------------------------------------------------------------------===
+
+def get(f, args):
+    argtypes = [typeof(arg) for arg in args]
+    env = environment.fresh_env(f, argtypes, "cpu")
+    func, env = phase.frontend(f, env)
+    return func
+
+def loop_body(func):
+    [loop] = loop_detection.flatloops(loop_detection.find_natural_loops(func))
+    return [op for block in loop.blocks for op in block.ops]
+
+def calls(ops, f):
+    return [op for op in ops if op.opcode == 'call' and
+                                getattr(op.args[0], 'const', None) is f]
+
+def getfields(ops, name):
+    return [op for op in ops if op.opcode == 'getfield' and op.args[1] == name]
+
+#===------------------------------------------------------------------===
+# Tests
+#===------------------------------------------------------------------===
+
+class TestBoundsChecks(unittest.TestCase):
+
+    def test_hoisted(self):
+        @jit(boundscheck=True)
+        def f(lst, n):
+            result = 0
+            for i in range(n):
+                lst[i] = lst[i] * 2
+                result += lst[i]
+            return result
+
+        func = get(f, ([1, 2, 3], 3))
+        body = loop_body(func)
+        self.assertEqual(len(calls(func.ops, indexing.range_in_bounds)), 1)
+        self.assertEqual(calls(body, indexing.range_in_bounds), [])
+        self.assertEqual(len(calls(body, indexing.getitem_hoisted)), 2)
+        self.assertEqual(len(calls(body, indexing.setitem_hoisted)), 1)
+        self.assertEqual(getfields(body, '__getitem__'), [])
+        self.assertEqual(getfields(body, '__setitem__'), [])
+
+        self.assertEqual(f([1, 2, 3], 3), 12)
+        self.assertRaises(IndexError, f, [1, 2, 3], 4)
+
+    def test_resized(self):
+        @jit(boundscheck=True)
+        def f(lst, n):
+            result = 0
+            for i in range(n):
+                result += lst[i]
+                lst.pop()
+            return result
+
+        func = get(f, ([1, 2, 3], 3))
+        self.assertEqual(calls(func.ops, indexing.range_in_bounds), [])
+        self.assertEqual(len(getfields(loop_body(func), '__getitem__')), 1)
+
+    def test_other_index(self):
+        @jit(boundscheck=True)
+        def f(lst, n):
+            result = 0
+            for i in range(n):
+                result += lst[i] + lst[n - i]
+            return result
+
+        func = get(f, ([1, 2, 3], 2))
+        self.assertEqual(calls(func.ops, indexing.range_in_bounds), [])
+        self.assertEqual(f([1, 2, 3], 2), 8)
+
+    def test_out_of_bounds(self):
+        @jit(boundscheck=True)
+        def f(lst, start, stop, step):
+            result = 0
+            for i in range(start, stop, step):
+                lst[i] = 0
+                result += 1
+            return result
+
+        lst = [1, 2, 3]
+        self.assertEqual(f(lst, 2, -1, -1), 3)
+        self.assertEqual(f(lst, 0, 0, 1), 0)
+        self.assertRaises(IndexError, f, lst, 0, 4, 1)
+        self.assertRaises(IndexError, f, lst, -1, 2, 1)
+
+    def test_wraparound(self):
+        @jit(wraparound=True)
+        def f(lst):
+            result = 0
+            for i in range(-1, -4, -1):
+                result = result * 10 + lst[i]
+            return result
+
+        self.assertEqual(f([1, 2, 3]), 321)
+
+
+if __name__ == '__main__':
+    unittest.main()
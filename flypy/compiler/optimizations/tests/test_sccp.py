@@ -1,9 +1,23 @@
 # -*- coding: utf-8 -*-
 from __future__ import print_function, division, absolute_import
 
+import math
 import unittest
 
-from flypy import jit, ijit
+from flypy import jit, typeof
+from flypy.pipeline import phase, environment
+
+#===------------------------------------------------------------------===
+# Helpers
+#===------------------------------------------------------------------===
+
+def get(f, argtypes):
+    env = environment.fresh_env(f, argtypes, "cpu")
+    func, env = phase.opt(f, env)
+    return func
+
+def calls(func):
+    return [op for op in func.ops if op.opcode == 'call']
 
 #===------------------------------------------------------------------===
 # Tests
@@ -19,6 +33,59 @@ class TestSCCP(unittest.TestCase):
             else:
                 return x + 3
 
+        self.assertEqual(f(1), 4)
+        self.assertEqual(f(5), 7)
+
+    def test_eval_if_const(self):
+        @jit('int64 -> int64', eval_if_const=True)
+        def square(x):
+            return x * x
+
+        @jit
+        def f():
+            return square(12)
+
+        self.assertEqual(f(), 144)
+        self.assertFalse(calls(get(f, [])))
+
+    def test_fold_math(self):
+        @jit
+        def f():
+            return math.sqrt(16.0)
+
+        self.assertEqual(f(), 4.0)
+        self.assertFalse(calls(get(f, [])))
+
+    def test_fold_mod_negative(self):
+        @jit
+        def fold_int():
+            x = -7
+            return x % 2
+
+        @jit
+        def fold_float():
+            x = -7.0
+            return x % 2.0
+
+        @jit
+        def mod(x, y):
+            return x % y
+
+        self.assertEqual(fold_int(), -1)
+        self.assertEqual(fold_int(), mod(-7, 2))
+        self.assertFalse(calls(get(fold_int, [])))
+        self.assertEqual(fold_float(), -1.0)
+        self.assertEqual(fold_float(), mod(-7.0, 2.0))
+        self.assertFalse(calls(get(fold_float, [])))
+
+    def test_fold_static_len(self):
+        @jit
+        def f(t):
+            return len(t)
+
+        self.assertEqual(f((1, 2.0, 3)), 3)
+        self.assertFalse(calls(get(f, [typeof((1, 2.0, 3))])))
+
 
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import unittest
+
+from flypy import jit
+from flypy.errors import SpecializeError
+from flypy.runtime.specialize import unroll, specialize_value
+
+#===------------------------------------------------------------------===
+# Tests
+#===------------------------------------------------------------------===
+
+class TestUnrolling(unittest.TestCase):
+
+    def test_unroll_constant(self):
+        @jit
+        def f(x):
+            result = 0
+            for i in unroll((1, 2, 3)):
+                result += i * x
+            return result
+
+        self.assertEqual(f(2), 12)
+
+    def test_unroll_static_tuple(self):
+        @jit
+        def f(t):
+            result = 0.0
+            for item in unroll(t):
+                result += item
+            return result
+
+        self.assertEqual(f((1, 2.5, 3)), 6.5)
+
+    def test_unroll_specialized_value(self):
+        @jit(specialize_value=('items',))
+        def g(items, x):
+            result = x
+            for i in unroll(items):
+                result = result * i
+            return result
+
+        @jit
+        def f(x):
+            return g((2, 3), x) + g((4,), x)
+
+        self.assertEqual(f(1), 10)
+
+    def test_specialize_value_decorator(self):
+        def f(a, b):
+            return a
+
+        self.assertRaises(SpecializeError, specialize_value('c'), f)
+        self.assertIs(specialize_value('a')(f), f)
+
+
+if __name__ == '__main__':
+    unittest.main()
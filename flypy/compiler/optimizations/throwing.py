@@ -1,33 +1,299 @@
 # -*- coding: utf-8 -*-
 
 """
-Rewrite exceptions that are thrown and caught locally to jumps.
+Rewrite exceptions that are thrown and caught locally to jumps, and
+propagate other exceptions to the caller. See flypy.runtime.raising for the
+exception model.
+
+After calls to functions that may raise, we check for a pending exception,
+and dispatch it to the handlers of the calling block:
+
+    x = call(f, [])                 x = call(f, [])
+    call(g, [x])                    pending = exception_pending()
+                            =>      cbranch(pending, dispatch, continue)
+
+                                dispatch:
+                                    matches = exception_matches(mask)
+                                    cbranch(matches, catch, propagate)
+
+                                catch:
+                                    clear_exception()
+                                    jump(handler)
+
+                                propagate:
+                                    exc_throw(0)
+
+                                continue:
+                                    call(g, [x])
+
+Thrown exceptions that are not caught locally are recorded as pending before
+returning from the function. Functions that are inlined (see
+flypy.compiler.optimizations.inlining) propagate exceptions from their calls
+without knowing the handlers of the blocks they end up in, so these are
+dispatched after inlining (see `dispatch_rethrows`).
 """
 
+from __future__ import print_function, division, absolute_import
+
 from flypy.compiler import excmodel
+from flypy.compiler.utils import Caller
+from flypy.compiler.optimizations.unrolling import handlers
+from flypy.compiler.lower.externs import symbol_address
+from flypy.runtime import raising
+from flypy.types import int64
 
+from pykit import types as ptypes
 from pykit.analysis import cfa
 from pykit.optimizations import local_exceptions
+from pykit.ir import Builder, Function, Const, Undef
 
 def rewrite_local_exceptions(func, env):
     """
     Rewrite exc_throw(exc) -> jump(handler_block) for statically determined
     exceptions.
     """
+    dispatch_rethrows(func, env)
     local_exceptions.run(func, env, exc_model=excmodel.ExcModel(env))
 
+#===------------------------------------------------------------------===
+# Exception checks
+#===------------------------------------------------------------------===
+
+def insert_exception_checks(func, env):
+    """
+    Check for pending exceptions after calls to functions that may raise,
+    and record whether `func` may raise.
+    """
+    if env['flypy.state.opaque']:
+        return
+
+    context = env['flypy.typing.context']
+    envs = env['flypy.state.envs']
+    b = Builder(func)
+    caller = Caller(b, context, env)
+
+    for op in list(func.ops):
+        if op.opcode == 'call' and may_raise(op, envs):
+            insert_check(func, env, b, caller, op)
+
+    func.reset_uses()
+    env['flypy.exceptions.raises'] = any(
+        propagates(op, context) for op in func.ops if op.opcode == 'exc_throw')
+    env['flypy.exceptions.raises'] |= any(
+        inlined_raise(op, envs) for op in func.ops if op.opcode == 'call')
+
+def may_raise(call, envs):
+    """Whether the function called by `call` may raise an exception"""
+    f, args = call.args
+    if not isinstance(f, Function) or f not in envs:
+        return False
+
+    e = envs[f]
+    options = e['flypy.state.options'] or {}
+    if e['flypy.state.opaque']:
+        return bool(options.get('raises'))
+    elif options.get('inline'):
+        return False
+
+    # Unknown for recursive calls
+    return e['flypy.exceptions.raises'] is not False
+
+def inlined_raise(call, envs):
+    """
+    Whether the function called by `call` is inlined and may raise. We
+    can't tell whether the exception is caught after inlining, so we assume
+    it isn't.
+    """
+    f, args = call.args
+    if not isinstance(f, Function) or f not in envs:
+        return False
+
+    e = envs[f]
+    options = e['flypy.state.options'] or {}
+    return bool(options.get('inline') and e['flypy.exceptions.raises'])
+
+def insert_check(func, env, b, caller, call):
+    """Check for a pending exception after `call`"""
+    context = env['flypy.typing.context']
+    phase = env['flypy.state.phase']
+
+    b.position_after(call)
+    block, cont = b.splitblock()
+
+    # Check for a pending exception
+    b.position_at_end(block)
+    pending = caller.call(phase, raising.exception_pending, [])
+    dispatch = func.new_block(func.temp("dispatch"), after=block)
+    b.cbranch(pending, dispatch, cont)
+
+    # Dispatch to the handlers of the block
+    for handler in handlers(block):
+        mask = raising.exception_mask(catch_classes(handler))
+        catch = func.new_block(func.temp("catch"), after=dispatch)
+        b.position_at_end(catch)
+        caller.call(phase, raising.clear_exception, [])
+        b.jump(handler)
+
+        b.position_at_end(dispatch)
+        if mask == raising.ALL:
+            b.jump(catch)
+            return
+
+        mask = Const(mask, ptypes.Opaque)
+        context[mask] = int64
+        matches = caller.call(phase, raising.exception_matches, [mask])
+        dispatch = func.new_block(func.temp("dispatch"), after=catch)
+        b.cbranch(matches, catch, dispatch)
+
+    # Propagate the exception to our caller
+    b.position_at_end(dispatch)
+    exc = Const(0, ptypes.Opaque)
+    context[exc] = int64
+    rethrow = b.exc_throw(exc)
+    rethrow.add_metadata({'flypy.exc.rethrow': True})
+
+def catch_classes(handler):
+    """Exception classes caught by `handler`"""
+    classes = []
+    for op in handler.leaders:
+        if op.opcode == 'exc_catch':
+            for c in op.args[0]:
+                cls = c.const
+                classes.append(getattr(cls, 'impl', cls))
+    return classes
+
+def propagates(op, context):
+    """Whether `op` throws an exception that is not caught locally"""
+    if is_rethrow(op):
+        return True
+
+    [exc] = op.args
+    id = raising.exception_id(context[exc])
+    for handler in handlers(op.block):
+        if raising.exception_mask(catch_classes(handler)) & (1 << id):
+            return False
+    return True
+
+def is_rethrow(op):
+    """Whether `op` propagates the pending exception"""
+    [exc] = op.args
+    return ((op.metadata or {}).get('flypy.exc.rethrow') or
+            (isinstance(exc, Const) and exc.const == 0))
+
+#===------------------------------------------------------------------===
+# Inlined propagation
+#===------------------------------------------------------------------===
+
+def dispatch_rethrows(func, env):
+    """
+    Dispatch pending exceptions propagated by inlined functions to the
+    handlers of the blocks they were inlined into.
+    """
+    if env['flypy.state.opaque']:
+        return
+
+    b = Builder(func)
+    for op in list(func.ops):
+        if op.opcode == 'exc_throw' and is_rethrow(op) and handlers(op.block):
+            dispatch_rethrow(func, b, op)
+
+    func.reset_uses()
+
+def dispatch_rethrow(func, b, rethrow):
+    """
+    Low-level version of the dispatch in `insert_check`, since we are past
+    lowering.
+    """
+    block = rethrow.block
+    rethrow.delete()
+
+    b.position_at_end(block)
+    pending = symbol_address(b, raising.pending_symbol,
+                             ptypes.Pointer(ptypes.Int64))
+    id = b.ptrload(pending)
+
+    dispatch = block
+    for handler in handlers(block):
+        mask = raising.exception_mask(catch_classes(handler))
+        catch = func.new_block(func.temp("catch"), after=dispatch)
+        b.position_at_end(catch)
+        b.ptrstore(Const(0, ptypes.Int64), pending)
+        b.jump(handler)
+        add_incoming(handler, block, catch)
+
+        b.position_at_end(dispatch)
+        if mask == raising.ALL:
+            b.jump(catch)
+            return
+
+        bit = b.bitand(b.rshift(Const(mask, ptypes.Int64), id),
+                       Const(1, ptypes.Int64))
+        matches = b.ne(bit, Const(0, ptypes.Int64))
+        dispatch = func.new_block(func.temp("dispatch"), after=catch)
+        b.cbranch(matches, catch, dispatch)
+
+    # Propagate the exception to our caller
+    b.position_at_end(dispatch)
+    rethrow = b.exc_throw(Const(0, ptypes.Opaque))
+    rethrow.add_metadata({'flypy.exc.rethrow': True})
+
+def add_incoming(handler, block, catch):
+    """
+    Give phis in `handler` the values they have for `block` when coming from
+    `catch`
+    """
+    for op in handler.leaders:
+        if op.opcode == 'phi':
+            blocks, values = op.args
+            incoming = dict(zip(blocks, values))
+            if block in incoming:
+                op.set_args([list(blocks) + [catch],
+                             list(values) + [incoming[block]]])
+
+#===------------------------------------------------------------------===
+# Propagation
+#===------------------------------------------------------------------===
 
 def rewrite_exceptions(func, env):
+    context = env['flypy.typing.context']
+    b = Builder(func)
+
     blocks = set()
-    for op in func.ops:
+    for op in list(func.ops):
         if op.opcode == 'exc_throw':
-            raise NotImplementedError("Exception throwing", op, func)
+            propagate(func, context, b, op)
         if op.opcode in ('exc_catch', 'exc_setup'):
             blocks.add(op.block)
             op.delete()
 
     update_outdated_incoming_blocks(func, blocks)
 
+def propagate(func, context, b, op):
+    """
+    Rewrite exc_throw(exc) to record the exception and its constant
+    arguments as pending, and return
+    """
+    b.position_before(op)
+    if not is_rethrow(op):
+        [exc] = op.args
+        if exc in context:
+            id = raising.exception_id(context[exc])
+        else:
+            id = raising.exception_ids['Exception']
+        args = (op.metadata or {}).get('flypy.exc.args', ())
+        pending = symbol_address(b, raising.pending_symbol,
+                                 ptypes.Pointer(ptypes.Int64))
+        b.ptrstore(Const(id, ptypes.Int64), pending)
+        b.ptrstore(Const(raising.exception_args_id(args), ptypes.Int64),
+                   b.ptradd(pending, Const(raising.ARGS, ptypes.Int64)))
+
+    restype = func.type.restype
+    if restype.is_void:
+        b.ret(None)
+    else:
+        b.ret(Undef(restype))
+    op.delete()
+
 def update_outdated_incoming_blocks(func, candidates):
     """
     Update phi nodes in blocks previously containing 'exc_catch'. 'exc_setup'
@@ -45,4 +311,4 @@ def update_outdated_incoming_blocks(func, candidates):
                                      if block in preds]
                 assert len(newblocks) == len(preds), (op.block, newblocks,
                                                       preds, blocks)
-                op.set_args([newblocks, newvalues])
\ No newline at end of file
+                op.set_args([newblocks, newvalues])
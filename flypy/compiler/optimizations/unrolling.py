@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+
+"""
+Full unrolling of loops over `unroll(iterable)`, where the iterable has a
+length that is known at compile time:
+
+    - a constant (e.g. a class layout or a value we specialized on)
+    - an argument of type StaticTuple
+
+This runs on untyped SSA IR, so that every iteration can be typed
+separately:
+
+    for name, type in unroll(layout):
+        body
+
+becomes
+
+    name, type = layout[0]
+    body
+    name, type = layout[1]
+    body
+    ...
+
+Loops that 'break' or 'continue' are not unrolled.
+"""
+
+from __future__ import print_function, division, absolute_import
+import __builtin__
+
+from pykit import types as ptypes
+from pykit.ir import Builder, Op, Block, FuncArg, Const, OConst, Undef
+from pykit.analysis import loop_detection
+from pykit.utils import flatten
+
+#===------------------------------------------------------------------===
+# Pass
+#===------------------------------------------------------------------===
+
+def run(func, env):
+    """Unroll loops over unroll(...) until there are none left"""
+    changed = True
+    while changed:
+        changed = False
+        loop_forest = loop_detection.find_natural_loops(func)
+        for loop in loop_detection.flatloops(loop_forest):
+            unrollable = match_unrollable(func, env, loop)
+            if unrollable:
+                unroll_loop(func, env, loop, *unrollable)
+                changed = True
+                break
+
+#===------------------------------------------------------------------===
+# Matching
+#===------------------------------------------------------------------===
+
+def match_unrollable(func, env, loop):
+    """
+    Match a loop of the form
+
+        header:
+            it = phi([preheader, tail], [iter(unroll(seq)), it])
+            exc_setup([exit])
+            item = next(it)
+            ...
+
+    and return (preheader, exit, next, iter, unroll, seq, n). Returns None
+    if we can't fully unroll the loop.
+    """
+    from flypy.runtime import builtins
+    from flypy.runtime.specialize import unroll
+
+    header = loop.head
+    next_op = find_call(header, (__builtin__.next, builtins.next))
+    exc_setups = [op for op in header.ops if op.opcode == 'exc_setup']
+    if next_op is None or len(exc_setups) != 1:
+        return None
+
+    [exit] = exc_setups[0].args[0]
+    [iterator] = next_op.args[1]
+    preheader = find_preheader(func, loop)
+    if preheader is None or not is_simple_loop(loop, exit):
+        return None
+
+    iter_op = incoming_value(iterator, preheader)
+    if not is_call(iter_op, (__builtin__.iter, builtins.iter)):
+        return None
+    [unroll_op] = iter_op.args[1]
+    if not is_call(unroll_op, (unroll,)):
+        return None
+
+    [seq] = unroll_op.args[1]
+    n = constant_length(func, env, seq)
+    if n is None:
+        return None
+
+    return preheader, exit, next_op, iter_op, unroll_op, seq, n
+
+
+def find_call(block, funcs):
+    for op in block.ops:
+        if is_call(op, funcs):
+            return op
+
+def is_call(op, funcs):
+    if isinstance(op, Op) and op.opcode == 'call':
+        f, args = op.args
+        return isinstance(f, Const) and any(f.const is x for x in funcs)
+    return False
+
+def find_preheader(func, loop):
+    """Find the single block outside the loop jumping to the loop header"""
+    preds = [block for block in func.blocks
+                       if block not in loop.blocks and
+                          loop.head in successors(block)]
+    if len(preds) == 1:
+        return preds[0]
+
+def is_simple_loop(loop, exit):
+    """
+    A loop without 'break' and 'continue', that only exits through the
+    exhausted iterator.
+    """
+    for block in loop.blocks:
+        targets = successors(block)
+        if block is not loop.head:
+            targets += handlers(block)
+        if exit in targets:
+            return False
+        if loop.head in targets and block is not loop.tail:
+            return False
+        for target in targets:
+            if target not in loop.blocks:
+                return False
+    return True
+
+def successors(block):
+    """Successors of a block through its terminator"""
+    if not block.is_terminated():
+        return []
+    return [arg for arg in flatten(block.terminator.args)
+                    if isinstance(arg, Block)]
+
+def handlers(block):
+    """Exception handlers of a block"""
+    return [handler for op in block.ops if op.opcode == 'exc_setup'
+                        for handler in op.args[0]]
+
+def incoming_value(phi, block):
+    """Value of `phi` when coming from `block`"""
+    if not isinstance(phi, Op) or phi.opcode != 'phi':
+        return None
+    blocks, values = phi.args
+    return dict(zip(blocks, values)).get(block)
+
+def constant_length(func, env, seq):
+    """Determine the length of `seq` at compile time, or return None"""
+    from flypy.rules import typematch
+    from flypy.runtime.obj.tupleobject import StaticTuple, EmptyTuple
+
+    if isinstance(seq, Const):
+        if isinstance(seq.const, (tuple, list)):
+            return len(seq.const)
+    elif seq in func.args:
+        argtypes = env['flypy.typing.argtypes']
+        argtype = argtypes[func.args.index(seq)]
+        n = 0
+        while typematch(argtype, StaticTuple):
+            argtype = argtype.parameters[1]
+            n += 1
+        if typematch(argtype, EmptyTuple):
+            return n
+
+#===------------------------------------------------------------------===
+# Unrolling
+#===------------------------------------------------------------------===
+
+def unroll_loop(func, env, loop, preheader, exit, next_op, iter_op,
+                unroll_op, seq, n):
+    b = Builder(func)
+    header = loop.head
+    phis = [op for op in header.ops if op.opcode == 'phi']
+    skip = [op for op in header.ops if op.opcode == 'exc_setup'] + [next_op]
+
+    # -------------------------------------------------
+    # Compute items in the preheader
+
+    b.position_before(preheader.terminator)
+    items = make_items(b, seq, n)
+
+    # -------------------------------------------------
+    # Copy the loop body for each item, chaining the copies
+
+    # Values of the header phis at the start of each iteration
+    values = dict((phi, incoming_value(phi, preheader)) for phi in phis)
+    last, last_target = preheader, header
+
+    for item in items:
+        valuemap = dict(values)
+        valuemap[next_op] = item
+        copy_loop(func, loop, valuemap, skip, after=last)
+
+        patch_jump(last, last_target, valuemap[header])
+        last, last_target = valuemap[loop.tail], valuemap[header]
+        values = dict((phi, substitute(incoming_value(phi, loop.tail),
+                                       valuemap))
+                          for phi in phis)
+
+    patch_jump(last, last_target, exit)
+
+    # -------------------------------------------------
+    # Fix up the loop exit, which we now reach from the last iteration
+
+    values[next_op] = items[-1] if items else Undef(ptypes.Opaque)
+    for op in list(exit.ops):
+        if op.opcode == 'phi':
+            blocks, incoming = op.args
+            blocks = [last if block is header else block for block in blocks]
+            op.set_args([blocks, substitute(incoming, values)])
+        elif op.opcode == 'exc_catch':
+            op.delete()
+
+    # Uses of the header phis after the loop see the values of the last
+    # iteration
+    for phi in phis:
+        phi.replace_uses(values[phi])
+
+    for block in loop.blocks:
+        func.del_block(block)
+    func.reset_uses()
+
+    # -------------------------------------------------
+    # Remove the iterator, which is now dead
+
+    for op in [op for op in exit.ops if op.opcode == 'phi']:
+        if not func.uses[op]:
+            op.delete()
+    func.reset_uses()
+
+    for op in (iter_op, unroll_op):
+        if not func.uses[op]:
+            op.delete()
+    func.reset_uses()
+
+
+def make_items(b, seq, n):
+    """Build the items of the iterable in the preheader"""
+    from flypy.runtime.obj.tupleobject import head, tail
+
+    if isinstance(seq, Const):
+        return [OConst(item) for item in seq.const]
+
+    items = []
+    for i in range(n):
+        items.append(b.call(ptypes.Opaque, OConst(head), [seq]))
+        seq = b.call(ptypes.Opaque, OConst(tail), [seq])
+    return items
+
+
+def copy_loop(func, loop, valuemap, skip, after):
+    """
+    Copy the blocks of the loop after block `after`, mapping values through
+    `valuemap`. The header phis and the ops in `skip` are not copied.
+    """
+    b = Builder(func)
+
+    for block in loop.blocks:
+        newblock = func.new_block(func.temp(block.name), after=after)
+        valuemap[block] = newblock
+        after = newblock
+
+    # Create ops first, and fill in arguments later, since phis may refer
+    # to values defined later in the loop
+    copies = []
+    for block in loop.blocks:
+        b.position_at_end(valuemap[block])
+        for op in block.ops:
+            if op in skip or (block is loop.head and op.opcode == 'phi'):
+                continue
+            newop = Op(op.opcode, op.type, [])
+            newop.add_metadata(op.metadata or {})
+            b.emit(newop)
+            valuemap[op] = newop
+            copies.append((op, newop))
+
+    for op, newop in copies:
+        newop.set_args(substitute(op.args, valuemap))
+
+
+def substitute(args, valuemap):
+    if isinstance(args, list):
+        return [substitute(arg, valuemap) for arg in args]
+    elif isinstance(args, (Op, Block, FuncArg)):
+        return valuemap.get(args, args)
+    return args
+
+
+def patch_jump(block, old_target, new_target):
+    """Redirect the jump from `block` to `old_target` to `new_target`"""
+    jump = block.terminator
+    jump.set_args(substitute(jump.args, {old_target: new_target}))
@@ -7,7 +7,9 @@ Simplify untyped IR.
 from __future__ import print_function, division, absolute_import
 import operator
 
+from flypy.errors import error
 from flypy.typing import overlay_registry
+from flypy.compiler import annotations
 from flypy.compiler.special import lookup_special
 
 from pykit import types
@@ -65,6 +67,42 @@ def rewrite_overlays(func, env=None):
             new.append(c)
         substitute_args(op, consts, new)
 
+def specialize_values(func, env):
+    """
+    Substitute arguments we specialize on by their constant values (see
+    `flypy.runtime.specialize_value`):
+
+        def f(x):                   def f(x):
+            return x + 2    ->          return 2 + 2
+    """
+    for argname, value in env['flypy.typing.constants']:
+        arg = func.get_arg(argname)
+        const = Const(value, type=types.Opaque)
+        for op in func.ops:
+            substitute_args(op, [arg], [const])
+
+def evaluate_static_calls(func, env):
+    """
+    Evaluate calls of static functions (see `flypy.runtime.specialize.static`)
+    with constant arguments:
+
+        call(iterator_class, [f]) -> Const(FIterator)
+    """
+    for op in list(func.ops):
+        if op.opcode != 'call' or not isinstance(op.args[0], Const):
+            continue
+
+        f, args = op.args
+        if not annotations.get(f.const, 'static'):
+            continue
+        if not all(isinstance(arg, Const) for arg in args):
+            error(env, 'frontend', "Arguments of %s must be constant, e.g. "
+                                   "values we specialize on" % (f.const,))
+
+        result = Const(f.const(*[arg.const for arg in args]), types.Opaque)
+        op.replace_uses(result)
+        op.delete()
+
 #===------------------------------------------------------------------===
 # Helpers
 #===------------------------------------------------------------------===
@@ -37,7 +37,9 @@ from flypy.typing import resolve_simple, TypeVar, TypeConstructor
 from flypy.functionwrapper import FunctionWrapper
 from flypy.viz.prettyprint import debug_print
 from flypy.errors import error_context
-from .resolution import infer_call, Method, make_method, infer_getattr
+from .resolution import (infer_call, Method, make_method, infer_getattr,
+                         RecursionPending, MAX_RECURSION_ITERATIONS,
+                         push_frame)
 from .. import opaque
 
 import pykit.types
@@ -81,7 +83,8 @@ class Context(object):
         metadata: { Node : dict }
             extra metadata for graph nodes in the constraint graph
 
-    Only 'context' is mutable after construction!
+    Only 'context' is mutable after construction, use add_edge() to
+    extend the graph!
     """
 
     def __init__(self, func, context, constraints, graph, metadata):
@@ -90,11 +93,22 @@ class Context(object):
         self.constraints = constraints
         self.graph = graph
         self.metadata = metadata
+        self.shared = True
 
     def copy(self):
         return Context(self.func, copy_context(self.context),
                        self.constraints, self.graph, self.metadata)
 
+    def add_edge(self, src, dst):
+        """
+        Add a constraint edge after construction (for recursive calls). This
+        copies the graph, which is shared with the template.
+        """
+        if self.shared:
+            self.graph = self.graph.copy()
+            self.shared = False
+        self.graph.add_edge(src, dst)
+
 #===------------------------------------------------------------------===
 # Inference
 #===------------------------------------------------------------------===
@@ -191,11 +205,40 @@ def infer_function(cache, func, argtypes, env):
         ctx = build_graph(func)
         cache.ctxs[func] = ctx
 
-    ctx = ctx.copy()
+    # -------------------------------------------------
+    # Callees have a frame set up by the caller (see
+    # resolution.infer_function_call)
+
+    frame = env['flypy.typing.frame']
+    if frame is not None:
+        return infer_frame(cache, func, ctx, frame, argtypes, env)
 
     # -------------------------------------------------
-    # Infer typing context
+    # Register a frame for the outermost function, so that calls from its
+    # SCC resolve to it, and iterate the SCC to a fixed point
 
+    key = (env['flypy.state.function_wrapper'], argtypes,
+           env['flypy.typing.constants'])
+    frame = push_frame(cache, key)
+    env['flypy.typing.frame'] = frame
+    try:
+        for i in range(MAX_RECURSION_ITERATIONS):
+            result = infer_frame(cache, func, ctx, frame, argtypes, env)
+            typeset = result.context['return']
+            restype = reduce(typejoin, typeset) if typeset else void
+            if not frame.is_stale(restype):
+                return result
+            frame.retry(restype)
+        raise InferError(
+            "Return type of recursive function %s does not converge, "
+            "please annotate the return type" % (func,))
+    finally:
+        del cache.frames[key]
+
+def infer_frame(cache, func, template, frame, argtypes, env):
+    """Infer the typing context of `func` in `frame`"""
+    ctx = template.copy()
+    frame.enter(func, env, ctx)
     seed_context(ctx, argtypes)
     infer_graph(cache, ctx, env)
     return ctx
@@ -538,14 +581,31 @@ def infer_appl(ctx, env, node, processed, incoming, typeset, changed):
             key = (node, func_type, tuple(arg_types))
             if key not in processed:
                 processed.add(key)
-                _, signature, result = infer_call(func, op, func_type,
-                                                  arg_types, env)
+                try:
+                    _, signature, result = infer_call(func, op, func_type,
+                                                      arg_types, env)
+                except RecursionPending:
+                    # We call a function in our SCC that calls us back,
+                    # revisit when our return type is known
+                    frame = env['flypy.typing.frame']
+                    if not frame.pending:
+                        raise
+                    frame.pending = False
+                    processed.discard(key)
+                    ctx.add_edge('return', node)
+                    continue
+
                 if isinstance(result, TypeVar):
                     raise TypeError("Expected a concrete type result, "
                                     "not a type variable! (%s)" % (func,))
                 changed |= result not in typeset
                 typeset.add(result)
-                if None in func_types:
+
+                if op in env['flypy.typing.frame'].approximate:
+                    # Direct recursive call, revisit when the return type
+                    # changes
+                    processed.discard(key)
+                elif None in func_types:
                     func_types.remove(None)
                     func_types.add(signature)
 
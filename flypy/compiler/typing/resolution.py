@@ -7,17 +7,19 @@ Type resolution and method resolution.
 from __future__ import print_function, division, absolute_import
 import inspect
 
-from flypy.errors import UnificationError
+from flypy.errors import UnificationError, InferError
 from flypy.pipeline import fresh_env
 from flypy import promote, unify, typejoin
 from flypy.functionwrapper import FunctionWrapper
 from flypy.types import Type, Constructor, ForeignFunction, Function, void
-from flypy.typing import TypeConstructor
+from flypy.typing import TypeConstructor, TypeVar
 from flypy.compiler.signature import fill_missing_argtypes
 from flypy.rules import infer_type_from_layout
+from flypy.compiler import annotations
 
 from pykit import ir, types
 from pykit.ir import ops
+from pykit.utils import hashable
 
 #===------------------------------------------------------------------===
 # Function call typing
@@ -63,7 +65,7 @@ def infer_call(func, op, func_type, argtypes, env):
     flags = call_flags.get(op, {})
 
     if is_method(func_type) or is_flypy_func:
-        return infer_function_call(func, func_type, argtypes, env, flags)
+        return infer_function_call(func, op, func_type, argtypes, env, flags)
     elif is_class:
         return infer_class_call(func, func_type, argtypes, flags)
     elif not isinstance(func, ir.Function):
@@ -72,7 +74,7 @@ def infer_call(func, op, func_type, argtypes, env):
         raise NotImplementedError(func, func_type)
 
 
-def infer_function_call(func, func_type, argtypes, env, flags):
+def infer_function_call(func, op, func_type, argtypes, env, flags):
     """
     Method call or flypy function call.
     """
@@ -86,14 +88,107 @@ def infer_function_call(func, func_type, argtypes, env, flags):
     else:
         func = func.const
 
-    # TODO: Support recursion !
+    cache = env['flypy.inference.cache']
+    constants = specialized_constants(func, op, is_method(func_type))
+    key = (func, tuple(argtypes), constants)
+
+    # -------------------------------------------------
+    # Recursive call into a function that is being typed
+
+    frame = env['flypy.typing.frame']
+    if frame is None or frame.key != key:
+        frame = cache.frames.get(key)
+    if frame is not None and frame.func is not None:
+        return infer_recursive_call(frame, op, argtypes, env)
+
+    # -------------------------------------------------
+    # Type the callee, iterating recursive SCCs to a fixed point
+
+    frame = push_frame(cache, key)
+    try:
+        for i in range(MAX_RECURSION_ITERATIONS):
+            callee_env = env['flypy.fresh_env'](func, argtypes, **flags)
+            callee_env['flypy.typing.constants'] = constants
+            callee_env['flypy.typing.frame'] = frame
+            typed_func, callee_env = phase.typing(func, callee_env)
+            restype = callee_env["flypy.typing.restype"]
+            if not frame.is_stale(restype):
+                break
+            frame.retry(restype)
+        else:
+            raise InferError(
+                "Return type of recursive function %s does not converge, "
+                "please annotate the return type" % (func,))
+    finally:
+        del cache.frames[key]
 
-    env = env['flypy.fresh_env'](func, argtypes, **flags)
-    func, env = phase.typing(func, env)
-    # env["flypy.typing.restype"]
     if func_type is None:
-        func_type = env["flypy.typing.signature"]
-    return func, func_type, env["flypy.typing.restype"]
+        func_type = callee_env["flypy.typing.signature"]
+    return typed_func, func_type, restype
+
+
+def infer_recursive_call(frame, op, argtypes, env):
+    """
+    Call to a function in the same strongly connected component of the call
+    graph. We use the annotated return type if present, or otherwise the
+    return type inferred so far:
+
+        - direct recursion is solved by the constraint graph of the function
+          itself, we re-infer the call whenever the return type changes
+        - for indirect recursion we record the assumed return type, and
+          re-type the component if the assumption turns out to be wrong
+
+    Raises RecursionPending if we know nothing about the return type yet.
+    """
+    restype = frame.restype()
+
+    if frame.annotated is None:
+        if frame.env is env:
+            frame.ctx.add_edge('return', op)
+            frame.approximate.add(op)
+        elif restype is not None:
+            frame.assumed.add(restype)
+
+    if restype is None:
+        frame.pending = True
+        raise RecursionPending(
+            "Return type of recursive function %s is not yet known" % (
+                frame.func.name,))
+
+    return frame.func, Function[tuple(argtypes) + (restype,)], restype
+
+
+def specialized_constants(func, op, is_method_call):
+    """
+    Find the constant arguments of a call to a function that specializes
+    on their values (see `flypy.runtime.specialize_value`). Returns a tuple
+    of (argname, value) pairs.
+    """
+    if func.opaque or op is None or op.opcode != 'call':
+        return ()
+
+    names = set()
+    for py_func, _, kwds in func.overloads:
+        names.update(to_tuple(kwds.get('specialize_value')))
+        names.update(to_tuple(annotations.get(py_func, 'specialize_value')))
+    if not names:
+        return ()
+
+    f, args = op.args
+    if is_method_call:
+        args = [None] + list(args) # self
+    argnames = inspect.getargspec(func.py_func).args
+
+    return tuple((name, arg.const) for name, arg in zip(argnames, args)
+                     if name in names and isinstance(arg, ir.Const)
+                                      and hashable(arg.const))
+
+def to_tuple(names):
+    if names is None:
+        return ()
+    elif isinstance(names, basestring):
+        return (names,)
+    return tuple(names)
 
 
 def infer_class_call(func, func_type, argtypes, flags):
@@ -165,6 +260,116 @@ def infer_constructor_application(classtype, argtypes):
     return infer_type_from_layout(classtype, zip(argnames, argtypes))
 
 
+#===------------------------------------------------------------------===
+# Recursion
+#===------------------------------------------------------------------===
+
+# Maximum number of times we re-type a recursive SCC of the call graph
+MAX_RECURSION_ITERATIONS = 5
+
+class RecursionPending(InferError):
+    """
+    Raised when a function calls a function in its SCC of which we don't
+    know the return type yet. This is caught by the inference of that
+    function, which revisits the call when its return type becomes known.
+    """
+
+
+class Frame(object):
+    """
+    A specialization that is currently being typed. Calls to the
+    specialization from within its SCC in the call graph are resolved
+    against the frame instead of re-entering the pipeline.
+
+    Attributes
+    ==========
+
+        key: (FunctionWrapper, argtypes, constants)
+            the specialization
+
+        func, env: ir.Function, dict
+            function being inferred and its environment, set by inference
+
+        ctx: Context
+            inference context of `func`, set by inference
+
+        seed: Type
+            return type from a previous iteration over the SCC
+
+        approximate: set([Op])
+            direct recursive calls typed with an approximate return type
+
+        assumed: set([Type])
+            return types assumed by indirectly recursive calls
+
+        nested: [Frame]
+            frames of the functions typed while this frame was active
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.seed = None
+        self.reset()
+
+    def reset(self):
+        self.func = None
+        self.env = None
+        self.ctx = None
+        self.pending = False
+        self.approximate = set()
+        self.assumed = set()
+        self.nested = []
+
+    def enter(self, func, env, ctx):
+        """Start inference of `func` in `ctx`"""
+        self.func = func
+        self.env = env
+        self.ctx = ctx
+
+    @property
+    def annotated(self):
+        """Annotated return type, or None"""
+        restype = self.env['flypy.typing.restype']
+        if restype is None or isinstance(restype, TypeVar):
+            return None
+        return restype
+
+    def restype(self):
+        """Return type, or the approximation inferred so far"""
+        if self.annotated is not None:
+            return self.annotated
+
+        typeset = set(self.ctx.context['return'])
+        if self.seed is not None:
+            typeset.add(self.seed)
+        if typeset:
+            return reduce(typejoin, typeset)
+
+    def is_stale(self, restype):
+        """Whether recursive callers assumed a different return type"""
+        return any(t != restype for t in self.assumed)
+
+    def retry(self, restype):
+        """
+        Prepare for typing the SCC again, seeding the return type with the
+        type we found in this iteration.
+        """
+        typing_cache = self.env['flypy.typing.cache']
+        for frame in [self] + self.nested:
+            typing_cache.invalidate(frame)
+
+        self.seed = restype
+        self.reset()
+
+
+def push_frame(cache, key):
+    """Push a new frame for a specialization we are about to type"""
+    frame = Frame(key)
+    for active in cache.frames.itervalues():
+        active.nested.append(frame)
+    cache.frames[key] = frame
+    return frame
+
 #===------------------------------------------------------------------===
 # Attribute resolution
 #===------------------------------------------------------------------===
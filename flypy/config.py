@@ -12,4 +12,10 @@ class Config(object):
     # annotated with `cjit`
     debug = False
 
-config = Config()
\ No newline at end of file
+    # Default indexing policies of List, Buffer and NDArray, overridden per
+    # function by @jit(boundscheck=..., wraparound=...). These take effect
+    # for functions compiled after they are set.
+    boundscheck = False
+    wraparound = False
+
+config = Config()
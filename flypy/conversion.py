@@ -45,8 +45,6 @@ def toctypes(value, type, keepalive, valmemo=None, typememo=None):
 
     Returns (ctypes_value, keep_alive)
     """
-    from flypy.types import int8
-
     if hasattr(type, 'type'):
         type = type.type
 
@@ -65,39 +63,39 @@ def toctypes(value, type, keepalive, valmemo=None, typememo=None):
         if not stack_allocate(type):
             cty = cty._type_ # Get the base type
 
-        # Resolve types
-        layout = type.resolved_layout
-        if not layout:
-            types = [int8]
-        else:
-            types = [layout[name] for name, _ in cty._fields_]
-
         # Dereference pointer to aggregate
         if hasattr(value, 'contents'):
             value = value.contents
 
-        # Resolve values
-        values = []
-        for (name, cty_field), ty in zip(cty._fields_, types):
-            if hasattr(value, name):
-                val = getattr(value, name)
-            else:
-                assert name == 'dummy', (name, value, value.__class__)
-                val = 0
-
-            cval = toctypes(val, ty, keepalive, valmemo, typememo)
-            values.append(cval)
+        # Resolve values. Fields are set by name, since the struct may
+        # order them differently and add padding (see `ctype`)
+        values = {}
+        for name, ty in type.resolved_layout.items():
+            val = getattr(value, name)
+            values[name] = toctypes(val, ty, keepalive, valmemo, typememo)
 
         # Construct value from ctypes struct
-        result = cty(*values)
+        result = cty(**values)
 
         if not stack_allocate(type):
             keepalive.append(result)
-            result = ctypes.pointer(result)
+            result = heap_pointer(result)
 
     valmemo[id(value), strtype] = result
     return result
 
+def heap_pointer(struct):
+    """
+    Build a pointer to a heap-allocated object from ctypes struct `struct`.
+    Reference-counted objects need an object header.
+    """
+    from flypy import gc
+
+    if gc.impl == "refcount":
+        from flypy.runtime.gc import refcount
+        return refcount.toctypes(struct)
+    return ctypes.pointer(struct)
+
 def fromctypes(value, ty, memo=None):
     """
     Construct a flypy object from a ctypes representation.
@@ -145,7 +143,12 @@ def fromctypes(value, ty, memo=None):
 def ctype(type, memo=None):
     """
     Return the low-level ctypes type representation for a flypy type instance.
+
+    Fields are laid out in declaration order, unless the class sets
+    `layout_options` (see flypy.compiler.layout.plan_fields).
     """
+    from flypy.compiler.layout import plan_fields
+
     # -------------------------------------------------
     # Setup cache
 
@@ -174,6 +177,8 @@ def ctype(type, memo=None):
             return "{ %s }" % (", ".join("%s:%s" % (name, getattr(self, name))
                                              for name in names))
 
+    names = list(type.resolved_layout)
+
     struct = result
     if not stack_allocate(type):
         result = ctypes.POINTER(result)
@@ -183,13 +188,10 @@ def ctype(type, memo=None):
     # -------------------------------------------------
     # Determine field ctypes
 
-    names, types = zip(*type.resolved_layout.items()) or [(), ()]
-    types = [ctype(ty, memo) for ty in types]
-    if not types:
-        names = ['dummy']
-        types = [ctypes.c_int8]
-
-    struct._fields_ = zip(names, types)
+    fields = [(name, ctype(ty, memo))
+                  for name, ty in type.resolved_layout.items()]
+    fields = plan_fields(fields, getattr(cls, 'layout_options', None))
+    struct._fields_ = fields or [('dummy', ctypes.c_int8)]
     struct.__name__ = 'CTypes' + type.__class__.__name__
 
     return result
@@ -11,7 +11,7 @@ __all__ = [
     'float32', 'float64','int8', 'int16', 'int32', 'int64', 'uint8',
     'uint16', 'uint32', 'uint64', 'Py_ssize_t',
     'complex64', 'complex128', 'struct', 'Py_uintptr_t',
-    'sizeof_type', 'integral', 'floating'
+    'sizeof_type', 'sizeof_object', 'integral', 'floating'
 ]
 
 #===------------------------------------------------------------------===
@@ -30,6 +30,7 @@ from .runtime.obj.core import (Function, Pointer, Bool, Int, Float, Complex,
                                Void, NoneType, Tuple, StaticTuple, String,
                                ForeignFunction, struct_, Buffer)
 from .conversion import ctype
+from .representation import stack_allocate
 #from .compiler.typing.inference import Method
 
 #===------------------------------------------------------------------===
@@ -88,3 +89,13 @@ def sizeof_type(ty):
     """Compute the size of instances of a given type="""
     cty = ctype(ty)
     return ctypes.sizeof(cty)
+
+def sizeof_object(ty):
+    """
+    Compute the size of the storage of instances of a given type, which is
+    the size of the object on the heap for heap-allocated types.
+    """
+    cty = ctype(ty)
+    if not stack_allocate(ty):
+        cty = cty._type_
+    return ctypes.sizeof(cty)
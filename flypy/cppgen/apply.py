@@ -1,16 +1,74 @@
 # -*- coding: utf-8 -*-
 
 """
-Apply a flypy function over a tuple of arguments.
+Apply a flypy function over columns of arguments in a single native call.
+See FunctionWrapper.map and FunctionWrapper.apply_batch.
 """
 
 from __future__ import print_function, division, absolute_import
+import textwrap
 
-from flypy import jit
+import numpy as np
 
-def applier(f, argtypes):
-    # TODO: Make `apply` ingest a tuple/array of arguments
-    @jit
-    def apply(args):
-        return f(*args)
-    return apply
\ No newline at end of file
+from flypy import jit, targets
+from flypy.support import numpy_support
+
+_appliers = {}
+
+def applier(f, nargs):
+    """
+    Build a flypy function that applies `f` to rows of `nargs` argument
+    columns, storing the results in `out`:
+
+        apply(out, a, b)  <=>  out[i] = f(a[i], b[i]) for each row i
+    """
+    key = f, nargs
+    if key in _appliers:
+        return _appliers[key]
+
+    argnames = ["arg%d" % i for i in range(nargs)]
+    source = textwrap.dedent("""
+    def apply(out, %s):
+        for i in range(len(out)):
+            out[i] = f(%s)
+    """) % (", ".join(argnames), ", ".join("%s[i]" % a for a in argnames))
+
+    namespace = {'f': f}
+    exec source in namespace, namespace
+    # Calls compile `f` for the CPU of the caller
+    apply = jit(namespace['apply'], cpu=targets.cpu_option(f))
+    _appliers[key] = apply
+    return apply
+
+def map_columns(f, columns):
+    """Apply `f` to the rows of the given arrays, see FunctionWrapper.map"""
+    if not columns:
+        raise TypeError("Expected at least one column of arguments")
+
+    columns = [np.ascontiguousarray(c) for c in columns]
+    for c in columns:
+        if c.ndim != 1:
+            raise ValueError("Expected 1D columns, got %d dimensions" % c.ndim)
+        if len(c) != len(columns[0]):
+            raise ValueError("Columns have differing lengths: %s" % (
+                [len(c) for c in columns],))
+
+    # Specialize `f` for the row types to find the result type
+    argtypes = [numpy_support.from_dtype(c.dtype) for c in columns]
+    cfunc, restype = f.translate(argtypes)
+    dtype = numpy_support.to_dtype(restype)
+
+    out = np.empty(len(columns[0]), dtype=dtype)
+    applier(f, len(columns))(out, *columns)
+    return out
+
+def apply_records(f, records):
+    """
+    Apply `f` to the records of a structured array, passing the fields as
+    arguments. See FunctionWrapper.apply_batch.
+    """
+    records = np.asarray(records)
+    if not records.dtype.names:
+        raise TypeError("Expected a structured array, got dtype %s" % (
+            records.dtype,))
+    return map_columns(f, [records[name] for name in records.dtype.names])
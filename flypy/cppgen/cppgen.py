@@ -2,11 +2,13 @@
 
 """
 Generate C++ classes from flypy classes that can produce flypy-compatible
-objects.
+objects, and C declarations for the representation of flypy values.
 """
 
 from __future__ import print_function, division, absolute_import
 
+import re
+import ctypes
 import inspect
 import textwrap
 
@@ -69,3 +71,74 @@ def generate(cls, emit=print):
         'params':       ", ".join(params),
         'initializers': "\n".join("        " + i for i in initializers),
     })
+
+#===------------------------------------------------------------------===
+# C declarations
+#===------------------------------------------------------------------===
+
+c_names = {
+    ctypes.c_bool:      'bool',
+    ctypes.c_char:      'char',
+    ctypes.c_int8:      'int8_t',
+    ctypes.c_int16:     'int16_t',
+    ctypes.c_int32:     'int32_t',
+    ctypes.c_int64:     'int64_t',
+    ctypes.c_uint8:     'uint8_t',
+    ctypes.c_uint16:    'uint16_t',
+    ctypes.c_uint32:    'uint32_t',
+    ctypes.c_uint64:    'uint64_t',
+    ctypes.c_longlong:  'long long',
+    ctypes.c_ulonglong: 'unsigned long long',
+    ctypes.c_float:     'float',
+    ctypes.c_double:    'double',
+    ctypes.c_char_p:    'char *',
+    ctypes.c_void_p:    'void *',
+}
+
+def c_identifier(name):
+    """Make a C identifier from a flypy type or name, e.g. C[int32, float64]"""
+    return re.sub(r'\W+', '_', str(name)).strip('_')
+
+class CDeclarations(object):
+    """
+    C declarations for the ctypes representation of flypy types (see
+    flypy.conversion.ctype), which has the exact layout of the flypy type.
+    Structs are emitted once, before their first use.
+    """
+
+    def __init__(self, emit=print):
+        self.emit = emit
+        self.structs = {} # ctypes struct -> C name
+
+    def declare(self, cty, name, hint='anon'):
+        """Declaration of `name` with ctypes type `cty`"""
+        if cty is None:
+            return "void %s" % (name,)
+        if cty in c_names:
+            return "%s %s" % (c_names[cty], name)
+        if issubclass(cty, ctypes._Pointer):
+            return self.declare(cty._type_, "*" + name, hint)
+        if issubclass(cty, ctypes.Array):
+            return self.declare(cty._type_, "%s[%d]" % (name, cty._length_),
+                                hint)
+        if issubclass(cty, ctypes.Structure):
+            return "struct %s %s" % (self.struct(cty, hint), name)
+        if issubclass(cty, ctypes._CFuncPtr):
+            return "void *%s" % (name,)
+        raise TypeError("Cannot declare a C value of type %s" % (cty,))
+
+    def struct(self, cty, hint):
+        """Emit the definition of ctypes struct `cty`, return its name"""
+        if cty not in self.structs:
+            name = c_identifier(hint)
+            while name in self.structs.values():
+                name += '_'
+            self.structs[cty] = name
+
+            fields = [self.declare(fieldty, fieldname,
+                                   "%s_%s" % (name, fieldname))
+                          for fieldname, fieldty in cty._fields_]
+            self.emit("struct %s {\n%s\n};\n" % (
+                name, "\n".join("    %s;" % field for field in fields)))
+
+        return self.structs[cty]
@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+
+"""
+Ahead-of-time compilation of flypy functions to a shared library with C
+entry points:
+
+    flypy.export(kernels, {'dot': 'Buffer[float64] -> Buffer[float64] -> float64'})
+
+builds kernels.so, exporting `dot` under its own name, and kernels.h
+declaring it, with structs for the representation of its argument and
+return types (see flypy.cppgen.cppgen.CDeclarations).
+
+Compiled code refers to the runtime through external symbols (see
+flypy.extern_support). The library defines the runtime state it refers to,
+such as the pending exception, and links the libraries defining the foreign
+functions it calls. Functions are compiled for the libgc collector (see
+flypy.runtime.gc.libgc), which allocates by calling libgc. Functions
+referring to objects that only exist in the compiling process, such as
+functions compiled on demand (finalizers, trace functions, generators) or
+constant objects (e.g. strings), cannot be exported.
+
+The library is compiled for a single CPU, the `cpu` argument of `export` or
+the CPU selected with flypy.target_cpu (see flypy.targets).
+
+Exceptions raised by exported functions remain pending until the caller
+clears them with <module>_exception(), which returns the id of the pending
+exception (see flypy.runtime.raising) or 0.
+"""
+
+from __future__ import print_function, division, absolute_import
+import os
+import ctypes
+import inspect
+import shutil
+import tempfile
+import subprocess
+
+import llvm.core as lc
+import llvm.ee
+
+from flypy import typing, errors, extern_support, targets, gc
+from flypy.conversion import ctype
+from flypy.representation import byref, stack_allocate
+from flypy.runtime import raising
+from .cppgen import CDeclarations, c_identifier
+
+__all__ = ['export']
+
+#===------------------------------------------------------------------===
+# Entry point
+#===------------------------------------------------------------------===
+
+def export(module, exports, output=None, header=None, cpu=None):
+    """
+    Compile the functions named in `exports` of Python module `module` to a
+    shared library, and write a C header declaring them.
+
+    :param exports: {name: signature}, e.g. {'add': 'int32 -> int32 -> int32'}
+    :param output: path of the library, <module>.so by default
+    :param header: path of the header, <module>.h by default
+    :param cpu: CPU to generate code for, flypy.targets.cpu by default
+    :return: (library path, header path)
+    """
+    libname = c_identifier(module.__name__.split('.')[-1])
+    output = output or libname + '.so'
+    header = header or os.path.splitext(output)[0] + '.h'
+    cpu = cpu or targets.cpu
+
+    lmod = lc.Module.new(libname)
+    functions = []
+    gc_impl, gc.impl = gc.impl, "libgc"
+    try:
+        for name, signature in sorted(exports.items()):
+            func = getattr(module, name)
+            argtypes = parse_signature(func, signature)
+            argnames = inspect.getargspec(func.py_func).args
+            restype = compile_function(lmod, name, func, argtypes, cpu)
+            functions.append((name, argnames, argtypes, restype))
+    finally:
+        gc.impl = gc_impl
+
+    libraries, state = resolve_runtime(lmod)
+
+    with open(header, 'w') as f:
+        write_header(f.write, libname, functions)
+
+    build_library(lmod, libname, output, libraries, state, cpu)
+    return output, header
+
+def parse_signature(func, signature):
+    """Argument types of `signature`, a string or a sequence of types"""
+    if not isinstance(signature, basestring):
+        return tuple(signature)
+
+    scope = func.py_func.__globals__
+    signature = typing.resolve(typing.parse(signature), scope, {})
+    return tuple(signature.argtypes)
+
+#===------------------------------------------------------------------===
+# Compilation
+#===------------------------------------------------------------------===
+
+def compile_function(lmod, name, func, argtypes, cpu):
+    """
+    Compile `func` for `argtypes` and `cpu`, link it into `lmod` and define
+    the C entry point `name`. Returns the return type.
+    """
+    cfunc, restype = func.translate(argtypes, 'cpu', cpu)
+    lmod.link_in(func.link(argtypes, 'cpu', cpu), preserve=True)
+
+    lfunc = func.get_llvm_func(argtypes, 'cpu', cpu)
+    lfunc = lmod.get_function_named(lfunc.name)
+    entry = lmod.add_function(lfunc.type.pointee, name)
+    builder = lc.Builder.new(entry.append_basic_block("entry"))
+    result = builder.call(lfunc, entry.args)
+    if lfunc.type.pointee.return_type.kind == lc.TYPE_VOID:
+        builder.ret_void()
+    else:
+        builder.ret(result)
+
+    return restype
+
+def resolve_runtime(lmod):
+    """
+    Resolve the external symbols `lmod` refers to. Runtime state is defined
+    by the library, and foreign functions are called by their name in the
+    library defining them.
+
+    Returns the libraries to link, and the runtime state to define as
+    {symbol name: size}. Raises CompileError for code referring to objects
+    of this process, such as constant objects.
+    """
+    libraries = set()
+    state = {raising.pending_symbol.name: raising.pending_symbol.size}
+    unresolved = []
+
+    for f in lmod.functions:
+        symbol = extern_support.symbols.get(f.name)
+        if not f.is_declaration or symbol is None:
+            continue
+
+        if symbol.size is not None:
+            state[symbol.name] = symbol.size
+            continue
+
+        location = library_symbol(symbol.pointer, symbol.name)
+        if location is None:
+            unresolved.append(symbol.name)
+            continue
+
+        library, name = location
+        if name != f.name:
+            # Call the function by its own name
+            try:
+                lmod.get_function_named(name)
+            except llvm.LLVMException:
+                f.name = name
+            else:
+                unresolved.append(symbol.name)
+                continue
+        if '.so' in os.path.basename(library):
+            libraries.add(library)
+
+    if unresolved:
+        raise errors.CompileError(
+            "Cannot export code referring to runtime symbols of this "
+            "process: %s" % (", ".join(sorted(unresolved)),))
+
+    embedded = embedded_addresses(lmod)
+    if embedded:
+        raise errors.CompileError(
+            "Cannot export code embedding addresses of this process: %s" % (
+                ", ".join(sorted(embedded)),))
+
+    return libraries, state
+
+def embedded_addresses(lmod):
+    """
+    Find the functions of `lmod` that embed an address, as an integer
+    constant cast to a pointer.
+    """
+    functions = set()
+    for f in lmod.functions:
+        for block in f.basic_blocks:
+            for instr in block.instructions:
+                if any(map(holds_address, instr.operands)):
+                    functions.add(f.name)
+    return functions
+
+def holds_address(value):
+    """Whether LLVM constant `value` holds a non-NULL address"""
+    if isinstance(value, lc.ConstantExpr):
+        if value.opcode_name == 'inttoptr':
+            [address] = value.operands
+            if isinstance(address, lc.ConstantInt):
+                return address.z_ext_value != 0
+        return any(map(holds_address, value.operands))
+    elif isinstance(value, (lc.ConstantStruct, lc.ConstantArray,
+                            lc.ConstantVector)):
+        return any(map(holds_address, value.operands))
+    return False
+
+def library_symbol(address, name):
+    """
+    Return (library path, symbol name) of the function at `address`, known
+    as `name` in this process, or None if it has no symbol in a library.
+    """
+    info = extern_support.Dl_info()
+    dladdr = extern_support._dladdr
+    if dladdr is None or not dladdr(address, ctypes.byref(info)):
+        return None
+    if info.dli_sname and info.dli_saddr == address:
+        return info.dli_fname, info.dli_sname
+    if extern_support.symbol_name(address, name)[1]:
+        return info.dli_fname, name
+    return None
+
+#===------------------------------------------------------------------===
+# Output
+#===------------------------------------------------------------------===
+
+def prototype(decls, name, argnames, argtypes, restype):
+    """C prototype of an entry point, following the flypy calling convention
+    (see flypy.functionwrapper.FunctionWrapper.__call__)"""
+    params = []
+    for argname, argtype in zip(argnames, argtypes):
+        cty = ctype(argtype)
+        if byref(argtype) and stack_allocate(argtype):
+            cty = ctypes.POINTER(cty)
+        params.append(decls.declare(cty, argname, argtype))
+
+    c_restype = ctype(restype)
+    if byref(restype):
+        params.append(decls.declare(ctypes.POINTER(c_restype), "result",
+                                    restype))
+        c_restype = None
+
+    return "%s;" % decls.declare(c_restype, "%s(%s)" % (
+        name, ", ".join(params) or "void"), restype)
+
+def write_header(emit, libname, functions):
+    guard = libname.upper() + "_H"
+    emit("/* Generated by flypy.export */\n\n"
+         "#ifndef %(guard)s\n#define %(guard)s\n\n"
+         "#include <stdbool.h>\n#include <stdint.h>\n\n"
+         "#ifdef __cplusplus\nextern \"C\" {\n#endif\n\n" % {'guard': guard})
+
+    decls = CDeclarations(emit)
+    protos = [prototype(decls, name, argnames, argtypes, restype)
+                  for name, argnames, argtypes, restype in functions]
+    emit("\n".join(protos) + "\n\n")
+
+    emit("/* Return and clear the id of the pending exception, 0 if none */\n"
+         "int64_t %s_exception(void);\n\n" % (libname,))
+    for id, name in enumerate(raising.exception_names):
+        if id:
+            emit("#define %s_%s %d\n" % (guard[:-2], name, id))
+
+    emit("\n#ifdef __cplusplus\n}\n#endif\n\n#endif\n")
+
+def runtime_source(libname, state):
+    """C source defining runtime state, and the exception entry point"""
+    lines = ["#include <stdint.h>", ""]
+    for name, size in sorted(state.items()):
+        lines.append('int64_t %s[%d] __asm__("%s");' % (
+            c_identifier(name), max(1, (size + 7) // 8), name))
+
+    lines.append("""
+int64_t %(libname)s_exception(void) {
+    int64_t id = %(pending)s[%(index)d];
+    %(pending)s[%(index)d] = 0;
+    return id;
+}""" % {'libname': libname, 'index': raising.PENDING,
+        'pending': c_identifier(raising.pending_symbol.name)})
+    return "\n".join(lines) + "\n"
+
+def build_library(lmod, libname, output, libraries, state, cpu):
+    """Emit object code for `lmod` and link it with the runtime"""
+    tm = targets.target_machine(cpu, cm=llvm.ee.CM_DEFAULT,
+                                reloc=llvm.ee.RELOC_PIC)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        obj = os.path.join(tmpdir, libname + ".o")
+        with open(obj, 'wb') as f:
+            f.write(tm.emit_object(lmod))
+
+        src = os.path.join(tmpdir, libname + "_runtime.c")
+        with open(src, 'w') as f:
+            f.write(runtime_source(libname, state))
+
+        cc = os.environ.get('CC', 'cc')
+        subprocess.check_call([cc, '-shared', '-fPIC', '-o', output, src, obj]
+                              + sorted(libraries))
+    finally:
+        shutil.rmtree(tmpdir)
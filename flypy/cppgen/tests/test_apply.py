@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import unittest
+
+from flypy import jit
+
+import numpy as np
+
+@jit
+def f(x, y):
+    return x * y + 1
+
+@jit
+def g(x):
+    return x * 2
+
+class TestApply(unittest.TestCase):
+
+    def test_map(self):
+        xs = np.arange(10.0)
+        ys = np.arange(10.0, 20.0)
+        result = f.map(xs, ys)
+        self.assertEqual(result.dtype, np.float64)
+        self.assertTrue(np.all(result == xs * ys + 1))
+
+    def test_map_single(self):
+        xs = np.arange(5, dtype=np.int64)
+        self.assertEqual(list(g.map(xs)), [0, 2, 4, 6, 8])
+
+    def test_map_lengths(self):
+        self.assertRaises(ValueError, f.map, np.arange(3.0), np.arange(4.0))
+
+    def test_apply_batch(self):
+        records = np.array([(1.0, 2.0), (3.0, 4.0), (5.0, 6.0)],
+                           dtype=[('x', np.float64), ('y', np.float64)])
+        result = f.apply_batch(records)
+        self.assertEqual(list(result), [3.0, 13.0, 31.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import os
+import sys
+import shutil
+import ctypes
+import tempfile
+import unittest
+
+import flypy
+from flypy import jit, errors
+from flypy.runtime import raising
+
+@jit
+def add(a, b):
+    return a + b
+
+@jit
+def checked_sqrt(x):
+    if x < 0.0:
+        raise ValueError
+    return x ** 0.5
+
+@jit
+class Box(object):
+    layout = [('value', 'float64')]
+
+@jit
+def boxed(x):
+    return Box(x)
+
+@jit
+class Resource(object):
+    layout = [('value', 'float64')]
+
+    @jit
+    def __del__(self):
+        pass
+
+@jit
+def resource(x):
+    return Resource(x)
+
+@jit
+def greeting():
+    return "hello"
+
+thismodule = sys.modules[__name__]
+
+class TestExport(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def export(self, exports):
+        output = os.path.join(self.tmpdir, "kernels.so")
+        return flypy.export(thismodule, exports, output=output)
+
+    def test_export(self):
+        lib, header = self.export({'add': 'int32 -> int32 -> int32',
+                                   'checked_sqrt': 'float64 -> float64'})
+
+        with open(header) as f:
+            source = f.read()
+        self.assertIn("int32_t add(int32_t a, int32_t b);", source)
+        self.assertIn("double checked_sqrt(double x);", source)
+
+        so = ctypes.CDLL(lib)
+        so.add.argtypes = [ctypes.c_int32, ctypes.c_int32]
+        so.add.restype = ctypes.c_int32
+        self.assertEqual(so.add(2, 3), 5)
+
+    def test_exceptions(self):
+        lib, header = self.export({'checked_sqrt': 'float64 -> float64'})
+
+        so = ctypes.CDLL(lib)
+        so.checked_sqrt.argtypes = [ctypes.c_double]
+        so.checked_sqrt.restype = ctypes.c_double
+        so.test_export_exception.restype = ctypes.c_int64
+
+        self.assertEqual(so.checked_sqrt(4.0), 2.0)
+        self.assertEqual(so.test_export_exception(), 0)
+        so.checked_sqrt(-1.0)
+        self.assertEqual(so.test_export_exception(),
+                         raising.exception_ids['ValueError'])
+        self.assertEqual(so.test_export_exception(), 0)
+
+    def test_header_compiles(self):
+        lib, header = self.export({'add': 'int32 -> int32 -> int32'})
+        main = os.path.join(self.tmpdir, "main.c")
+        with open(main, 'w') as f:
+            f.write('#include "%s"\nint main(void) { return add(1, -1); }\n'
+                    % header)
+        self.assertEqual(os.system("cc -c -o %s.o %s" % (main, main)), 0)
+
+    def test_allocation(self):
+        lib, header = self.export({'boxed': 'float64 -> Box[]'})
+
+        so = ctypes.CDLL(lib)
+        so.boxed.argtypes = [ctypes.c_double]
+        so.boxed.restype = ctypes.POINTER(ctypes.c_double)
+        self.assertEqual(so.boxed(2.0)[0], 2.0)
+
+    def test_process_symbols(self):
+        # Finalizers are compiled in this process
+        self.assertRaises(errors.CompileError, self.export,
+                          {'resource': 'float64 -> Resource[]'})
+
+    def test_constants(self):
+        # Constant objects live in this process
+        self.assertRaises(errors.CompileError, self.export, {'greeting': ()})
+
+
+if __name__ == '__main__':
+    unittest.main()
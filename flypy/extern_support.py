@@ -4,27 +4,63 @@ External references.
 flypy runtime and library code should avoid injecting runtime addresses into
 the generated code. Instead, it should uses undefined external symbols that
 are resolved by LLVM JIT by mapping runtime addresses for to external symbols.
+
+Calls to ctypes and cffi functions are rewritten to calls of external
+symbols as well (see `foreign_symbol`), using the name the function is
+exported under when the dynamic linker resolves that name to the same
+function. LLVM then knows what is called, e.g. memcmp or sqrt, and can
+optimize accordingly.
+
+Symbols carry LLVM function attributes: all foreign functions are
+'nounwind', and functions can be declared 'readonly' or 'readnone', see
+`declare_attributes`.
+
+Runtime data, such as the state of the garbage collector, functions
+compiled on demand, such as finalizers, and constant objects, such as
+strings, are referenced through symbols as well (see `relocation`). Compiled
+code thus holds no process-specific addresses, and can be cached or linked
+ahead of time. Code loaded from a cache is bound with `bind_symbols`.
 """
 
 from __future__ import print_function, division, absolute_import
-from flypy.support import cffi_support
+import ctypes
+import ctypes.util
+import os
+
+from flypy.support import cffi_support, ctypes_support
 from pykit.utils import dylib_support
-from flypy import coretypes, typeof
+from flypy import coretypes, typeof, errors
 import cffi
 
+# Supported function attributes
+ATTRIBUTES = ('nounwind', 'readonly', 'readnone')
+
+# External symbols by name
+symbols = {}
+
 class ExternalSymbol(object):
     """Represent an external symbol
     """
 
-    def __init__(self, name, typ, ptr):
+    def __init__(self, name, typ, ptr, attributes=('nounwind',)):
         """
         :param name: symbol name
         :param typ: symbol type; usually function type
         :param ptr: cpu pointer for the default target
+        :param attributes: LLVM function attributes, see ATTRIBUTES
         """
+        unknown = set(attributes) - set(ATTRIBUTES)
+        if unknown:
+            raise ValueError("Unknown function attributes: %s" % (unknown,))
+
         self.name = name
         self.type = typ
         self.pointer = ptr
+        self.attributes = tuple(attributes)
+        symbols[name] = self
+
+    # Size of the runtime state named by relocations, see `relocation`
+    size = None
 
     def __repr__(self):
         return "ExternalSymbol(%s, %s)" % (self.name, self.type)
@@ -47,40 +83,207 @@ class ExternalLibrary(object):
 def is_extern_symbol(pyval):
     return isinstance(pyval, ExternalSymbol)
 
+def is_foreign_function(pyval):
+    """Whether `pyval` is a ctypes or cffi function"""
+    return (ctypes_support.is_ctypes_function(pyval) or
+            cffi_support.is_cffi_func(pyval))
+
 # --- shorthand
 
-def extern(name, ffiobj):
+def extern(name, ffiobj, attributes=('nounwind',)):
     """Creates an ExternalSymbol object and bind CFFI value to the default
     target "cpu".
     """
     # Get type
     foreignfunc = typeof(ffiobj)
-    functy = coretypes.Function[foreignfunc.parameters]
-    functy.varargs = foreignfunc.varargs
+    functy = function_type(foreignfunc)
     # Get pointer
     ptr = cffi_support.get_pointer(ffiobj)
 
-    return ExternalSymbol(name, functy, ptr)
+    return ExternalSymbol(name, functy, ptr, attributes)
 
 
-def externlib(prefix, lib, symbols):
+def externlib(prefix, lib, symbols, attributes=None):
     """
-    Wraps external libraries and expose them as external library.
+    Wraps external libraries and expose them as external library. Symbols
+    are prefixed with `prefix`, or keep their names if `prefix` is None.
+    `attributes` maps symbol names to additional function attributes.
     """
     if isinstance(symbols, str):
         symbols = symbols.split()
-    fullnames = ['.'.join((prefix, sym)) for sym in symbols]
+    if prefix is None:
+        fullnames = symbols
+    else:
+        fullnames = ['.'.join((prefix, sym)) for sym in symbols]
+    attributes = attributes or {}
     extlib = ExternalLibrary()
     for raw, mangled in zip(symbols, fullnames):
-        setattr(extlib, raw, extern(mangled, getattr(lib, raw)))
+        attrs = ('nounwind',) + tuple(attributes.get(raw, ()))
+        setattr(extlib, raw, extern(mangled, getattr(lib, raw), attrs))
     return extlib
 
-def extern_cffi(prefix, dlopen, declstr):
+def extern_cffi(prefix, dlopen, declstr, attributes=None):
     ffi = cffi.FFI()
     ffi.cdef(declstr)
     clib = ffi.dlopen(dlopen)
     symbols = _parse_cdecl(declstr)
-    return externlib(prefix, clib, symbols), clib
+    return externlib(prefix, clib, symbols, attributes), clib
+
+def function_type(foreignfunc):
+    """Function type for ForeignFunction type `foreignfunc`"""
+    functy = coretypes.Function[foreignfunc.parameters]
+    functy.varargs = foreignfunc.varargs
+    return functy
+
+# ----- foreign functions
+
+_declared = {}  # address -> attributes
+_foreign = {}   # address -> ExternalSymbol
+
+def declare_attributes(func, *attributes):
+    """
+    Declare LLVM function attributes for a ctypes or cffi function, e.g.
+
+        declare_attributes(libm.cos, 'readnone')
+    """
+    _declared[function_address(func)] = attributes
+
+def function_address(func):
+    """Address of a ctypes or cffi function"""
+    if cffi_support.is_cffi_func(func):
+        return cffi_support.get_pointer(func)
+    return ctypes.cast(func, ctypes.c_void_p).value
+
+def foreign_symbol(func, type):
+    """
+    Get the ExternalSymbol for a ctypes or cffi function of ForeignFunction
+    type `type`.
+
+    Functions declared by flypy under their exported name, e.g. those of
+    flypy.runtime.lib.c, share their symbol with other bindings of the
+    function. Bindings with another type than the symbol are rejected, since
+    a module can only declare a symbol with a single type.
+    """
+    address = function_address(func)
+    functype = function_type(type)
+    if address not in _foreign:
+        name, exported = symbol_name(address, getattr(func, '__name__', None))
+        if not exported:
+            name = ".flypy.foreign.%s" % (name,)
+        if name in symbols:
+            symbol = symbols[name]
+            if symbol.pointer != address:
+                raise errors.CompileError(
+                    "Symbol %s is bound to address 0x%x, not 0x%x" % (
+                                            name, symbol.pointer, address))
+        else:
+            attributes = ('nounwind',) + tuple(_declared.get(address, ()))
+            symbol = ExternalSymbol(name, functype, address, attributes)
+        _foreign[address] = symbol
+
+    symbol = _foreign[address]
+    if not same_function_type(symbol.type, functype):
+        raise errors.CompileError(
+            "Cannot call foreign function %s with type %s, it is declared "
+            "with type %s" % (symbol.name, functype, symbol.type))
+    return symbol
+
+def same_function_type(t1, t2):
+    return (t1 == t2 and
+            getattr(t1, 'varargs', False) == getattr(t2, 'varargs', False))
+
+# ----- relocations
+
+def relocation(name, address, type=None, size=None):
+    """
+    Name runtime address `address` of data or of a compiled function by an
+    external symbol, bound to the address when code is loaded. Code refers
+    to the symbol (see flypy.compiler.lower.externs.symbol_address) instead
+    of embedding the address.
+
+    Names are derived from what they identify, e.g. a type or a function
+    specialization, and not from the address or the order in which they are
+    created. Binding a name to another address is an error.
+
+    `size` gives the size in bytes of zero-initialized runtime state at
+    `address`, which ahead-of-time builds define themselves (see
+    flypy.cppgen.export).
+    """
+    if name in symbols:
+        symbol = symbols[name]
+        if symbol.pointer != address:
+            raise ValueError("Symbol %s is bound to address 0x%x, not 0x%x" % (
+                name, symbol.pointer, address))
+        return symbol
+
+    type = type or coretypes.Function[(coretypes.void,)]
+    symbol = ExternalSymbol(name, type, address, attributes=())
+    symbol.size = size
+    return symbol
+
+def type_name(type):
+    """Name flypy type `type` in symbol names, qualified by its module"""
+    return "%s.%s" % (type.impl.__module__, type)
+
+def bind_symbols(module):
+    """
+    Bind the external symbols referenced by LLVM module `module`, e.g. a
+    module loaded from the code cache, to their addresses in this process.
+
+    Raises LookupError for flypy symbols without an address in this process,
+    such as the symbols of constant objects built by another process.
+    """
+    for value in module.functions + module.global_variables:
+        if not value.is_declaration:
+            continue
+        if value.name in symbols:
+            symbols[value.name].install()
+        elif value.name.startswith(".flypy."):
+            raise LookupError("No address for symbol %s" % (value.name,))
+
+class Dl_info(ctypes.Structure):
+    _fields_ = [('dli_fname', ctypes.c_char_p),
+                ('dli_fbase', ctypes.c_void_p),
+                ('dli_sname', ctypes.c_char_p),
+                ('dli_saddr', ctypes.c_void_p)]
+
+def _load_dladdr():
+    for lib in (None, ctypes.util.find_library('dl')):
+        try:
+            dladdr = ctypes.CDLL(lib).dladdr
+        except (OSError, AttributeError):
+            continue
+        dladdr.argtypes = [ctypes.c_void_p, ctypes.POINTER(Dl_info)]
+        dladdr.restype = ctypes.c_int
+        return dladdr
+
+_dladdr = _load_dladdr()
+_process = ctypes.CDLL(None)
+
+def symbol_name(address, name=None):
+    """
+    Find the name of the function at `address`, which ctypes functions know
+    themselves. Returns (name, exported), where `exported` indicates whether
+    the dynamic linker resolves `name` to `address`. Otherwise `name` only
+    identifies the function within its library.
+    """
+    info = Dl_info()
+    if _dladdr is None or not _dladdr(address, ctypes.byref(info)):
+        return name or "%x" % address, False
+
+    if name is None and info.dli_sname and info.dli_saddr == address:
+        name = info.dli_sname
+    if name is None:
+        # Unnamed (e.g. an IFUNC implementation), use the offset
+        name = "%x" % (address - (info.dli_fbase or 0))
+
+    try:
+        resolved = ctypes.cast(getattr(_process, name), ctypes.c_void_p).value
+    except AttributeError:
+        resolved = None
+    if resolved == address:
+        return name, True
+    return "%s.%s" % (os.path.basename(info.dli_fname or ''), name), False
 
 # ----- cdecl
 
@@ -11,6 +11,7 @@ from functools import partial
 from itertools import starmap
 import copy
 
+from flypy import targets, optimization
 from flypy.rules import typeof
 from flypy.compiler.overloading import lookup_previous, overload, Dispatcher
 from flypy.compiler.signature import dummy_signature, flatargs
@@ -50,6 +51,8 @@ class FunctionWrapper(object):
         from flypy.representation import byref, stack_allocate
         from flypy.conversion import (
             toctypes, fromctypes, toobject, fromobject, ctype)
+        from flypy.runtime.raising import reraise
+        from flypy.runtime import arena
         #from flypy.support.ctypes_support import CTypesStruct
         #from flypy.types import Function
 
@@ -59,17 +62,26 @@ class FunctionWrapper(object):
         # Order arguments
         args = flatargs(self.py_func, args, kwargs)
 
-        # Translate
-        cfunc, restype = self.translate([typeof(x) for x in args.flat])
+        # Translate, selecting the version for the host CPU of
+        # multiversioned functions (see flypy.targets)
+        flat_argtypes = [typeof(x) for x in args.flat]
+        cpu = targets.function_cpu(self)
+        cfunc, restype = self.translate(flat_argtypes, cpu=cpu)
+        env = self.envs[self.key(flat_argtypes, self.target, cpu)]
+        options = env['flypy.state.options'] or {}
+
+        # Objects allocated in an arena may not escape to Python
+        arena.check_call(self, env)
 
         # Construct flypy values
         argtypes = [typeof(x) for x in args]
         arg_objs = list(starmap(fromobject, zip(args, argtypes)))
 
         # Map flypy values to a ctypes representation
-        args = []
+        args, c_args = [], []
         for arg, argtype in zip(arg_objs, argtypes):
             c_arg = toctypes(arg, argtype, keepalive)
+            c_args.append(c_arg)
             if byref(argtype) and stack_allocate(argtype):
                 c_arg = ctypes.pointer(c_arg)
             args.append(c_arg)
@@ -82,14 +94,35 @@ class FunctionWrapper(object):
             args.append(ctypes.pointer(c_result))
             c_restype = None # void
 
-        c_signature = ctypes.PYFUNCTYPE(c_restype, *[type(arg) for arg in args])
+        # Functions compiled with @jit(nogil=True) release the GIL for the
+        # duration of the call, see flypy.compiler.analysis.nogil
+        if options.get('nogil'):
+            prototype = ctypes.CFUNCTYPE
+        else:
+            prototype = ctypes.PYFUNCTYPE
+        c_signature = prototype(c_restype, *[type(arg) for arg in args])
         cfunc = ctypes.cast(cfunc, c_signature)
 
+        # The semispace collector moves the heap objects referred to by
+        # arguments from Python, so register these references as roots
+        frame = None
+        if env['flypy.gc.impl'] == 'semispace':
+            from flypy.runtime.gc import semispace
+            frame = semispace.python_frame(zip(c_args, argtypes))
+            semispace.push_frame(frame)
+
         # Handle calling convention
-        if byref(restype):
-            cfunc(*args)
-        else:
-            c_result = cfunc(*args)
+        try:
+            if byref(restype):
+                cfunc(*args)
+            else:
+                c_result = cfunc(*args)
+        finally:
+            if frame is not None:
+                semispace.pop_frame(frame)
+
+        # Propagate exceptions raised in compiled code
+        reraise()
 
         # Map ctypes result back to a python value
         result = fromctypes(c_result, restype)
@@ -97,16 +130,63 @@ class FunctionWrapper(object):
 
         return result_obj
 
-    def translate(self, argtypes, target=None):
+    def map(self, *columns):
+        """
+        Apply the function to the rows of the given 1D arrays in a single
+        native call, returning an array of the results:
+
+            f.map(xs, ys)  <=>  np.array([f(x, y) for x, y in zip(xs, ys)])
+        """
+        from flypy.cppgen.apply import map_columns
+        return map_columns(self, columns)
+
+    def apply_batch(self, records):
+        """
+        Apply the function to each record of a NumPy structured array,
+        passing the fields of the record as arguments. See `map`.
+        """
+        from flypy.cppgen.apply import apply_records
+        return apply_records(self, records)
+
+    def key(self, argtypes, target, cpu):
+        """
+        Key of the specialization for `argtypes` on `target`. Code for the
+        cpu target is also keyed on its CPU, unless it is generic, on the
+        indexing policies it enables, and on the collector unless it is
+        Boehm.
+        """
+        from flypy import gc
+
+        if target != 'cpu':
+            return tuple(argtypes), target
+
+        policies = self.policies()
+        if cpu == 'generic' and not policies and gc.impl == 'boehm':
+            return tuple(argtypes), target
+
+        key = tuple(argtypes), target, cpu
+        if policies:
+            key += (policies,)
+        if gc.impl != 'boehm':
+            key += (gc.impl,)
+        return key
+
+    def policies(self):
+        """Indexing policies enabled for this function"""
+        from flypy.runtime.obj import indexing
+        return indexing.function_policies(self)
+
+    def translate(self, argtypes, target=None, cpu=None):
         target = target or self.target
+        cpu = cpu or targets.function_cpu(self)
 
-        key = tuple(argtypes), target
+        key = self.key(argtypes, target, cpu)
         if key in self.ctypes_funcs:
             env = self.envs[key]
             return self.ctypes_funcs[key], env["flypy.typing.restype"]
 
         # Translate
-        llvm_func, env = self._do_lower(target, argtypes)
+        llvm_func, env = self._do_lower(target, argtypes, cpu)
         cfunc = env["codegen.llvm.ctypes"]
 
         # Cache
@@ -117,14 +197,17 @@ class FunctionWrapper(object):
 
         return cfunc, env["flypy.typing.restype"]
 
-    def _do_lower(self, target, argtypes):
+    def _do_lower(self, target, argtypes, cpu='generic'):
         from .pipeline import phase, environment
-        env = environment.fresh_env(self, argtypes, target)
+        options = optimization.function_options(self)
+        env = environment.fresh_env(self, argtypes, target, cpu=cpu,
+                                    options=options,
+                                    policies=self.policies())
         llvm_func, env = phase.codegen(self, env)
         return llvm_func, env
 
-    def link(self, argtypes, target):
-        key = tuple(argtypes), target
+    def link(self, argtypes, target, cpu=None):
+        key = self.key(argtypes, target, cpu or targets.function_cpu(self))
         env = self.envs[key]
         module = self._do_linkage(env)
         return module
@@ -153,7 +236,16 @@ class FunctionWrapper(object):
                 mod = fw._do_linkage(dep)
                 depmods.append(mod)
 
-        linker = llvmlinker.Linker(thismod)
+        # Post-link optimization keeps the defaults of the linker, unless
+        # optimization options were given to @jit (see flypy.optimization)
+        options = env['flypy.optimization']
+        kwds = {}
+        if options['opt'] != optimization.defaults['opt']:
+            kwds['opt'] = options['opt']
+        if (options['inline_threshold'] !=
+                optimization.defaults['inline_threshold']):
+            kwds['inline'] = options['inline_threshold']
+        linker = llvmlinker.Linker(thismod, **kwds)
         for m in depmods:
             linker.add_module(m)
         linker.link()
@@ -192,10 +284,10 @@ class FunctionWrapper(object):
             #    "it has already been used!")
         self._pending_overloads.append((py_func, signature, kwds))
 
-    def get_llvm_func(self, argtypes, target):
+    def get_llvm_func(self, argtypes, target, cpu=None):
         """Get the LLVM function object for the argtypes.
         """
-        key = tuple(argtypes), target
+        key = self.key(argtypes, target, cpu or targets.function_cpu(self))
         return self.llvm_funcs[key]
 
     @property
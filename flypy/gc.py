@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+"""
+Garbage collector selection. Select the collector used by code compiled
+afterwards with
+
+    flypy.gc.impl = "semispace"
+
+Available collectors are listed in flypy.runtime.gc.impls. The "libgc"
+collector calls the Boehm collector directly, and is used by code linked
+ahead of time (see flypy.cppgen.export). Code is compiled and cached
+separately for each collector (see flypy.pipeline.environment.target_env),
+but objects allocated by one collector can't be passed to code compiled for
+another.
+
+Set `count_allocations` to count the heap allocations of each allocation
+site in code compiled afterwards, see `allocation_counts`.
+
+Set `arenas` to allocate objects in the active arena, if any, in code
+compiled afterwards (see flypy.runtime.arena). This is needed by functions
+compiled with @jit(allocator="arena"), and adds a check of the arena state
+to each allocation.
+"""
+
+from __future__ import print_function, division, absolute_import
+
+impl = "boehm"
+
+count_allocations = False
+
+arenas = False
+
+def stats():
+    """
+    Return statistics of the selected collector as a dict:
+
+        heap_size:          size of the heap in bytes
+        bytes_since_gc:     bytes allocated since the last collection
+        collections:        number of collections
+        pause_time:         total time spent in collections, in seconds
+        max_pause_time:     longest collection, in seconds
+        finalizers:         registered finalizers that did not run yet
+    """
+    from flypy.runtime import gc
+    return gc.gc_impl(impl).stats()
+
+def allocation_counts():
+    """
+    Return the number of heap allocations of each allocation site as a dict
+    {(function name, line number, type): count}
+    """
+    from flypy.runtime.gc import sites
+    return sites.counts()
@@ -12,10 +12,13 @@ from flypy.support import numpy_support
 from flypy.conversion import fromobject, toobject
 from flypy.runtime.obj.core import (Type, Pointer, StaticTuple, address,
                                      Buffer, Slice, NoneType,
-                                     fromseq, head, tail, EmptyTuple)
+                                     fromseq, head, tail, EmptyTuple,
+                                     counting_iterator)
 from flypy.runtime.obj.sliceobject import normalize
+from flypy.runtime.obj.indexing import normalize_index
 from flypy.runtime.lib import libcpy
 from flypy.runtime.hacks import choose
+from flypy.lib.vectorobject import splat, vector_width
 
 import numpy as np
 
@@ -67,13 +70,23 @@ class NDArray(object):
 
     @jit #('NDArray[a, n] -> Iterable[a]')
     def __iter__(self):
-        for i in range(len(self)):
-            yield self[i]
+        return counting_iterator(self)
 
     @jit('a -> int64')
     def __len__(self):
         return self.dims.extent
 
+    @jit
+    def chunks(self, vector_type):
+        """
+        Iterate over a 1D array in vectors of type `vector_type`. Trailing
+        elements that don't fill a vector are left out, these start at
+        len(array) - len(array) % vector_width(vector_type).
+        """
+        n = len(self)
+        stop = n - n % vector_width(vector_type)
+        return ChunkIterator(self.data, self.dims.stride, 0, stop, vector_type)
+
     @jit
     def getshape(self):
         # TODO: properties
@@ -167,10 +180,7 @@ class Dimension(object):
     @jit('Dimension[base] -> Pointer[a] -> '
          'StaticTuple[x : integral, y] -> Type[a] -> r')
     def index(self, p, indices, dtype):
-        idx = head(indices)
-        #if idx < 0 or idx > self.extent:
-        #    print("Index out of bounds!")
-        #    return self.base.index(p, tail(indices))
+        idx = normalize_index(head(indices), self.extent)
         return self.base.index(p + idx * self.stride, tail(indices), dtype)
 
     @jit('Dimension[base] -> Pointer[a] -> '
@@ -218,7 +228,8 @@ class EmptyDim(object):
 @sjit('BoundsCheck[base]')
 class BoundsCheck(object):
     """
-    Check bounds for the Dimension that we wrap.
+    Check bounds for the Dimension that we wrap, regardless of the indexing
+    policy (see flypy.runtime.obj.indexing).
     """
 
     layout = [('base', 'base')]
@@ -226,13 +237,9 @@ class BoundsCheck(object):
     @jit
     def index(self, p, indices, dtype):
         idx = head(indices)
-        if 0 <= idx < self.base.extent:
-            return self.base.index(p, indices, dtype)
-
-        # TODO: Exceptions
-        print("Index out of bounds: index", end="")
-        print(idx, end=", extent ")
-        print(self.base.extent)
+        if idx < 0 or idx >= self.base.extent:
+            raise IndexError
+        return self.base.index(p, indices, dtype)
 
     #@jit('BoundsCheck[EmptyTuple[]] -> a -> b -> c')
     #def index(self, p, indices):
@@ -248,7 +255,38 @@ class BoundsCheck(object):
     def stride(self):
         return self.base.stride
 
-# TODO: Dimensions for bounds checking and wraparound
+#===------------------------------------------------------------------===
+# Vector chunks
+#===------------------------------------------------------------------===
+
+@sjit('ChunkIterator[a, v]')
+class ChunkIterator(object):
+    """Iterator over consecutive vectors of a 1D array, see NDArray.chunks"""
+
+    layout = [('data', 'Pointer[a]'), ('stride', 'int64'), ('index', 'int64'),
+              ('stop', 'int64'), ('vector_type', 'Type[v]')]
+
+    @jit('a -> a')
+    def __iter__(self):
+        return self
+
+    @ijit
+    def __next__(self):
+        if self.index >= self.stop:
+            raise StopIteration
+        p = self.data + self.index * self.stride
+        self.index += vector_width(self.vector_type)
+        if self.stride == 1:
+            return p.vload(self.vector_type)
+        return gather(p, self.stride, self.vector_type)
+
+@jit('Pointer[a] -> int64 -> Type[v] -> v')
+def gather(p, stride, vector_type):
+    """Load a vector from strided elements"""
+    result = splat(p[0], vector_type)
+    for i in range(1, vector_width(vector_type)):
+        result = result.set(i, p[i * stride])
+    return result
 
 #===------------------------------------------------------------------===
 # getitem/setitem
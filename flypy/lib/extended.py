@@ -6,7 +6,7 @@ from __future__ import print_function, division, absolute_import
 
 from .pyobject import Object
 from .arrays.ndarrayobject import NDArray, Dimension, EmptyDim
-from .vectorobject import Vector
+from .vectorobject import Vector, splat, vector_width
 
 try:
     from .decimalobject import decimal
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+import unittest
+
+from flypy import jit
+from flypy.types import float64, int64, Vector
+from flypy.lib.vectorobject import splat, vector_width
+
+import numpy as np
+
+float4 = Vector[float64, 4]
+
+class TestVector(unittest.TestCase):
+
+    def test_splat_arith(self):
+        @jit
+        def f(x):
+            v = splat(x, float4)
+            w = v * 2.0 + v
+            return w.sum()
+
+        self.assertEqual(f(1.5), 18.0)
+
+    def test_width(self):
+        @jit
+        def f():
+            return vector_width(float4)
+
+        self.assertEqual(f(), 4)
+
+    def test_compare_select(self):
+        @jit
+        def f(a):
+            v = a.data.vload(float4)
+            mask = v > 1.5
+            return mask.select(v, splat(0.0, float4)).sum()
+
+        self.assertEqual(f(np.arange(4.0)), 5.0)
+
+    def test_reductions(self):
+        @jit
+        def f(a):
+            v = a.data.vload(float4)
+            return v.min() * 100 + v.max()
+
+        self.assertEqual(f(np.array([3.0, 1.0, 4.0, 2.0])), 104.0)
+
+    def test_load_store(self):
+        @jit
+        def f(src, dst):
+            v = src.data.vload(float4)
+            dst.data.vstore(-v)
+
+        src = np.arange(4.0)
+        dst = np.empty(4)
+        f(src, dst)
+        self.assertTrue(np.all(dst == -src))
+
+    def test_neg_zero(self):
+        @jit
+        def f(src, dst):
+            dst.data.vstore(-src.data.vload(float4))
+
+        dst = np.empty(4)
+        f(np.zeros(4), dst)
+        self.assertTrue(np.all(np.signbit(dst)))
+
+    def test_shuffle(self):
+        @jit
+        def f(a, mask):
+            v = a.data.vload(float4)
+            w = v.shuffle(mask)
+            a.data.vstore(w)
+
+        a = np.arange(4.0)
+        f(a, Vector([3, 2, 1, 0]))
+        self.assertEqual(list(a), [3.0, 2.0, 1.0, 0.0])
+
+    def test_chunks(self):
+        @jit
+        def dot(a, b):
+            acc = splat(0.0, float4)
+            for x, y in zip(a.chunks(float4), b.chunks(float4)):
+                acc = acc + x * y
+            result = acc.sum()
+            start = len(a) - len(a) % vector_width(float4)
+            for i in range(start, len(a)):
+                result += a[i] * b[i]
+            return result
+
+        a = np.arange(10.0)
+        b = np.arange(10.0, 20.0)
+        self.assertEqual(dot(a, b), np.dot(a, b))
+        self.assertEqual(dot(a[::2], b[::2]), np.dot(a[::2], b[::2]))
+
+
+if __name__ == '__main__':
+    unittest.main()
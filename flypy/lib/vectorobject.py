@@ -1,13 +1,22 @@
 # -*- coding: utf-8 -*-
 
 """
-vector implementation.
+SIMD vectors.
+
+Vector[base, count] is represented as an LLVM vector. Arithmetic and bitwise
+operations map to vector instructions, and accept a scalar operand, which is
+broadcast to all lanes. Comparisons produce a Vector[bool, count] mask.
+
+Vectors are loaded from and stored to memory with Pointer.vload and
+Pointer.vstore, and NDArray.chunks iterates over an array in vectors.
 """
 
 from __future__ import print_function, division, absolute_import
+import ctypes
+import operator
 
 import flypy
-from flypy import sjit, jit
+from flypy import sjit, jit, typeof
 from flypy.compiler import representation_type, lltype
 from flypy.conversion import ctype
 from flypy.runtime import formatting
@@ -22,7 +31,7 @@ class Vector(Number):
     layout = []
 
     def __init__(self, items):
-        self.items = items
+        self.items = list(items)
 
     def wrap(self, items):
         return Vector(items)
@@ -50,10 +59,10 @@ class Vector(Number):
 
     @jit('Vector[base, count] -> Pointer[Array[base, count]] -> void', opaque=True)
     def to_array(self, parray):
-        p[0][:] = self.items
+        parray[0][:] = self.items
 
     @jit('Vector[base, count] -> Int[bits, True]', opaque=True)
-    def to_int(self, parray):
+    def to_int(self):
         # TODO:
         pass
 
@@ -61,6 +70,210 @@ class Vector(Number):
     def __len__(self):
         return len(self.items)
 
+    #===------------------------------------------------------------------===
+    # Arith
+    #===------------------------------------------------------------------===
+
+    @jit('a -> a -> a', opaque=True, inline=True)
+    def __add__(self, other):
+        return lanewise(operator.add, self, other)
+
+    @jit('Vector[base, count] -> base -> Vector[base, count]',
+         opaque=True, inline=True)
+    def __add__(self, other):
+        return lanewise(operator.add, self, other)
+
+    @jit('a -> a -> a', opaque=True, inline=True)
+    def __sub__(self, other):
+        return lanewise(operator.sub, self, other)
+
+    @jit('Vector[base, count] -> base -> Vector[base, count]',
+         opaque=True, inline=True)
+    def __sub__(self, other):
+        return lanewise(operator.sub, self, other)
+
+    @jit('a -> a -> a', opaque=True, inline=True)
+    def __mul__(self, other):
+        return lanewise(operator.mul, self, other)
+
+    @jit('Vector[base, count] -> base -> Vector[base, count]',
+         opaque=True, inline=True)
+    def __mul__(self, other):
+        return lanewise(operator.mul, self, other)
+
+    @jit('a -> a -> a', opaque=True, inline=True)
+    def __div__(self, other):
+        return lanewise(operator.div, self, other)
+
+    @jit('Vector[base, count] -> base -> Vector[base, count]',
+         opaque=True, inline=True)
+    def __div__(self, other):
+        return lanewise(operator.div, self, other)
+
+    @jit('a -> a -> a')
+    def __truediv__(self, other):
+        return self.__div__(other)
+
+    @jit('Vector[base, count] -> base -> Vector[base, count]')
+    def __truediv__(self, other):
+        return self.__div__(other)
+
+    @jit('a -> a -> a', opaque=True, inline=True)
+    def __mod__(self, other):
+        return lanewise(operator.mod, self, other)
+
+    @jit('a -> a', opaque=True, inline=True)
+    def __neg__(self):
+        return Vector([-x for x in self.items])
+
+    #===------------------------------------------------------------------===
+    # Bitwise
+    #===------------------------------------------------------------------===
+
+    @jit('a -> a -> a', opaque=True, inline=True)
+    def __and__(self, other):
+        return lanewise(operator.and_, self, other)
+
+    @jit('a -> a -> a', opaque=True, inline=True)
+    def __or__(self, other):
+        return lanewise(operator.or_, self, other)
+
+    @jit('a -> a -> a', opaque=True, inline=True)
+    def __xor__(self, other):
+        return lanewise(operator.xor, self, other)
+
+    #===------------------------------------------------------------------===
+    # Compare
+    #===------------------------------------------------------------------===
+
+    @jit('Vector[base, count] -> Vector[base, count] -> Vector[bool, count]',
+         opaque=True, inline=True)
+    def __eq__(self, other):
+        return lanewise(operator.eq, self, other)
+
+    @jit('Vector[base, count] -> base -> Vector[bool, count]',
+         opaque=True, inline=True)
+    def __eq__(self, other):
+        return lanewise(operator.eq, self, other)
+
+    @jit('Vector[base, count] -> Vector[base, count] -> Vector[bool, count]',
+         opaque=True, inline=True)
+    def __ne__(self, other):
+        return lanewise(operator.ne, self, other)
+
+    @jit('Vector[base, count] -> base -> Vector[bool, count]',
+         opaque=True, inline=True)
+    def __ne__(self, other):
+        return lanewise(operator.ne, self, other)
+
+    @jit('Vector[base, count] -> Vector[base, count] -> Vector[bool, count]',
+         opaque=True, inline=True)
+    def __lt__(self, other):
+        return lanewise(operator.lt, self, other)
+
+    @jit('Vector[base, count] -> base -> Vector[bool, count]',
+         opaque=True, inline=True)
+    def __lt__(self, other):
+        return lanewise(operator.lt, self, other)
+
+    @jit('Vector[base, count] -> Vector[base, count] -> Vector[bool, count]',
+         opaque=True, inline=True)
+    def __le__(self, other):
+        return lanewise(operator.le, self, other)
+
+    @jit('Vector[base, count] -> base -> Vector[bool, count]',
+         opaque=True, inline=True)
+    def __le__(self, other):
+        return lanewise(operator.le, self, other)
+
+    @jit('Vector[base, count] -> Vector[base, count] -> Vector[bool, count]',
+         opaque=True, inline=True)
+    def __gt__(self, other):
+        return lanewise(operator.gt, self, other)
+
+    @jit('Vector[base, count] -> base -> Vector[bool, count]',
+         opaque=True, inline=True)
+    def __gt__(self, other):
+        return lanewise(operator.gt, self, other)
+
+    @jit('Vector[base, count] -> Vector[base, count] -> Vector[bool, count]',
+         opaque=True, inline=True)
+    def __ge__(self, other):
+        return lanewise(operator.ge, self, other)
+
+    @jit('Vector[base, count] -> base -> Vector[bool, count]',
+         opaque=True, inline=True)
+    def __ge__(self, other):
+        return lanewise(operator.ge, self, other)
+
+    #===------------------------------------------------------------------===
+    # Horizontal operations
+    #===------------------------------------------------------------------===
+
+    @jit('Vector[base, count] -> base')
+    def sum(self):
+        result = self[0]
+        for i in range(1, len(self)):
+            result += self[i]
+        return result
+
+    @jit('Vector[base, count] -> base')
+    def min(self):
+        result = self[0]
+        for i in range(1, len(self)):
+            if self[i] < result:
+                result = self[i]
+        return result
+
+    @jit('Vector[base, count] -> base')
+    def max(self):
+        result = self[0]
+        for i in range(1, len(self)):
+            if self[i] > result:
+                result = self[i]
+        return result
+
+    @jit('Vector[bool, count] -> bool')
+    def any(self):
+        for i in range(len(self)):
+            if self[i]:
+                return True
+        return False
+
+    @jit('Vector[bool, count] -> bool')
+    def all(self):
+        for i in range(len(self)):
+            if not self[i]:
+                return False
+        return True
+
+    @jit('Vector[bool, count] -> Vector[base, count] -> Vector[base, count] '
+         '-> Vector[base, count]')
+    def select(self, x, y):
+        """Pick lanes from x where the mask is set, and from y otherwise"""
+        result = y
+        for i in range(len(self)):
+            if self[i]:
+                result = result.set(i, x[i])
+        return result
+
+    @jit('Vector[base, count] -> Vector[int64, n] -> Vector[base, n]',
+         opaque=True)
+    def shuffle(self, mask):
+        """
+        Permute the lanes of the vector: result[i] = self[mask[i]]. Constant
+        masks compile to a single shuffle.
+        """
+        return Vector([self.items[i] for i in mask.items])
+
+    @jit('Vector[base, count] -> Vector[base, count]')
+    def reverse(self):
+        result = self
+        n = len(self)
+        for i in range(n):
+            result = result.set(i, self[n - i - 1])
+        return result
+
     # --------------------
     @staticmethod
     def fromobject(items, type):
@@ -68,14 +281,12 @@ class Vector(Number):
 
     @classmethod
     def toctypes(cls, val, ty):
-        # TODO:
         if isinstance(val, Vector):
             val = val.items
         return make_ctypes_vector(val, ty)
 
     @classmethod
     def fromctypes(cls, val, ty):
-        # TODO:
         if hasattr(val, '_type_'):
             return Vector(list(val))
         return val
@@ -86,11 +297,36 @@ class Vector(Number):
         return ctype(base) * count
 
 
+@typeof.case(Vector)
+def typeof(vector):
+    base = flypy.typeof(vector.items[0])
+    return Vector[base, len(vector.items)]
+
+def lanewise(op, x, y):
+    """Apply `op` to the lanes of x and y (at the python level)"""
+    if not isinstance(y, Vector):
+        y = Vector([y] * len(x.items))
+    return Vector([op(a, b) for a, b in zip(x.items, y.items)])
+
 #===------------------------------------------------------------------===
-# Low-level implementations
+# Constructors
 #===------------------------------------------------------------------===
 
-# Constructors
+@jit('base -> Type[Vector[base, count]] -> Vector[base, count]', opaque=True)
+def splat(value, vector_type):
+    """Build a vector of type `vector_type` with `value` in all lanes"""
+    raise NotImplementedError("Not implemented at the python level")
+
+def vector_count(argtypes):
+    [vector_type] = argtypes
+    base, count = vector_type.parameters[0].parameters
+    return count
+
+@jit('Type[Vector[base, count]] -> int64', opaque=True,
+     eval_from_types=vector_count)
+def vector_width(vector_type):
+    """Number of lanes of `vector_type`"""
+    raise NotImplementedError("Not implemented at the python level")
 
 @jit('Pointer[Array[base, count]] -> Vector[base, count]', opaque=True)
 def from_array(parray):
@@ -101,17 +337,41 @@ def from_int(pint, base_t):
     # TODO:
     pass
 
+#===------------------------------------------------------------------===
+# Low-level implementations
+#===------------------------------------------------------------------===
+
+def index(i):
+    return ir.Const(i, ptypes.Int64)
+
+def broadcast(builder, vector_type, value):
+    """Broadcast a scalar to all lanes of a vector of type `vector_type`"""
+    base, count = vector_type.parameters
+    result = Undef(lltype(vector_type))
+    for i in range(count):
+        result = builder.set(result, value, index(i))
+    return result
+
+# Constructors
+
+def implement_splat(builder, argtypes, value, vector_type):
+    [vector_type] = argtypes[1].parameters
+    builder.ret(broadcast(builder, vector_type, value))
+
+def implement_vector_width(builder, argtypes, vector_type):
+    builder.ret(index(vector_count(argtypes)))
+
 def implement_from_array(builder, argtypes, parray):
-    base, count = argtypes[0]
-    vector_type = ptypes.Vector(base, count)
-    ptr_type    = ptypes.Pointer(vector_type)
-    pv = builder.bitcast(parray, ptr_type)
-    v = builder.ptrload(p)
-    return builder.ret(v)
+    [array_type] = argtypes[0].parameters
+    base, count = array_type.parameters
+    vector_type = ptypes.Vector(lltype(base), count)
+    pv = builder.bitcast(parray, ptypes.Pointer(vector_type))
+    return builder.ret(builder.ptrload(pv))
 
 def restype_from_array(argtypes):
-    base, count = argtypes[0]
-    return ptypes.Vector(base, count)
+    [array_type] = argtypes[0].parameters
+    base, count = array_type.parameters
+    return ptypes.Vector(lltype(base), count)
 
 def restype_from_int(argtypes):
     (bits,), count = argtypes[0]
@@ -124,51 +384,126 @@ def implement_from_int(builder, argtypes, i, base_t):
     v = builder.bitcast(i, vector_type)
     return builder.ret(v)
 
+add_impl(splat, "splat", implement_splat,
+         restype_func=lambda argtypes: lltype(argtypes[1].parameters[0]))
+add_impl(vector_width, "vector_width", implement_vector_width,
+         restype=ptypes.Int64)
 add_impl(from_array, "from_array", implement_from_array, restype_func=restype_from_array)
 add_impl(from_int, "from_int", implement_from_int, restype_func=restype_from_int)
 
-# low level operations
+# Lanes
+
+def implement_getitem(builder, argtypes, vector, idx):
+    return builder.ret(builder.get(vector, idx))
+
+def implement_set(builder, argtypes, vector, idx, item):
+    return builder.ret(builder.set(vector, item, idx))
 
 def implement_len(builder, argtypes, vector):
     count = argtypes[0].parameters[1]
-    return builder.ret(ir.Const(count, ptypes.Int64))
+    return builder.ret(index(count))
 
 def implement_to_array(builder, argtypes, vector, parray):
-    pvector_t = ptypes.Pointer(argtypes[0])
-    pvector = builder.bitcast(pvector_t, parray)
+    pvector = builder.bitcast(parray, ptypes.Pointer(lltype(argtypes[0])))
     builder.ptrstore(vector, pvector)
+    builder.ret(None)
 
 def restype_to_int(argtypes):
-    (bits,), count = argtypes[0]
-    i_t = ptypes.Int(targetBits, True)
-    return i_t
+    base, count = argtypes[0].parameters
+    bits = flypy.types.sizeof_type(base) * 8 * count
+    return ptypes.Integral(bits, False)
 
 def implement_to_int(builder, argtypes, vector):
     i_t = restype_to_int(argtypes)
-    i = builder.bitcast(i_t, vector)
+    i = builder.bitcast(vector, i_t)
     return builder.ret(i)
 
-# implementations
+def _base_type(argtypes):
+    base, count = argtypes[0].parameters
+    return lltype(base)
 
-add_impl_cls(Vector, "__len__", implement_len, restype=ptypes.UInt64)
+add_impl_cls(Vector, "__getitem__", implement_getitem, restype_func=_base_type)
+add_impl_cls(Vector, "set", implement_set)
+add_impl_cls(Vector, "__len__", implement_len, restype=ptypes.Int64)
 add_impl_cls(Vector, "to_array", implement_to_array, restype=ptypes.Void)
 add_impl_cls(Vector, "to_int", implement_to_int, restype_func=restype_to_int)
 
+# Arithmetic
+
+def vector_operands(builder, argtypes, x, y):
+    """Broadcast scalar right-hand operands"""
+    vector_type, other_type = argtypes
+    if other_type.impl != Vector:
+        y = broadcast(builder, vector_type, y)
+    return x, y
+
+def add_vector_binop(name, pykitname=None):
+    pykitname = pykitname or name
+    def impl(builder, argtypes, x, y):
+        x, y = vector_operands(builder, argtypes, x, y)
+        builder.ret(getattr(builder, pykitname)(x, y))
+    add_impl_cls(Vector, "__%s__" % name, impl)
+
+def add_vector_compare(name):
+    # Compare lane by lane, since the result is a vector of booleans rather
+    # than a single one. LLVM combines these into a vector compare.
+    def impl(builder, argtypes, x, y):
+        x, y = vector_operands(builder, argtypes, x, y)
+        base, count = argtypes[0].parameters
+        result = Undef(ptypes.Vector(ptypes.Bool, count))
+        for i in range(count):
+            lhs = builder.get(x, index(i))
+            rhs = builder.get(y, index(i))
+            result = builder.set(result, getattr(builder, name)(lhs, rhs),
+                                 index(i))
+        builder.ret(result)
+
+    restype = lambda argtypes: ptypes.Vector(ptypes.Bool,
+                                             argtypes[0].parameters[1])
+    add_impl_cls(Vector, "__%s__" % name, impl, restype_func=restype)
+
+add_vector_binop("add")
+add_vector_binop("sub")
+add_vector_binop("mul")
+add_vector_binop("div")
+add_vector_binop("mod")
+add_vector_binop("and", pykitname="bitand")
+add_vector_binop("or", pykitname="bitor")
+add_vector_binop("xor", pykitname="bitxor")
+
+for name in ["eq", "ne", "lt", "le", "gt", "ge"]:
+    add_vector_compare(name)
+
+def implement_neg(builder, argtypes, x):
+    base, count = argtypes[0].parameters
+    # 0.0 - 0.0 is 0.0, not -0.0, so negate float lanes as -0.0 - x
+    base_t = lltype(base)
+    zero = ir.Const(-0.0 if base_t.is_real else 0, base_t)
+    builder.ret(builder.sub(broadcast(builder, argtypes[0], zero), x))
+
+add_impl_cls(Vector, "__neg__", implement_neg)
+
+# Shuffles
+
+def implement_shuffle(builder, argtypes, vector, mask):
+    base, count = argtypes[0].parameters
+    _, n = argtypes[1].parameters
+    result = Undef(ptypes.Vector(lltype(base), n))
+    for i in range(n):
+        item = builder.get(vector, builder.get(mask, index(i)))
+        result = builder.set(result, item, index(i))
+    builder.ret(result)
+
+add_impl_cls(Vector, "shuffle", implement_shuffle,
+             restype_func=lambda argtypes: ptypes.Vector(
+                 _base_type(argtypes), argtypes[1].parameters[1]))
+
 #===------------------------------------------------------------------===
 # Utils
 #===------------------------------------------------------------------===
 
 def make_ctypes_vector(items, type):
-    # TODO:
-    from flypy.support.cffi_support import is_cffi, ffi
-    from flypy.support.ctypes_support import is_ctypes_pointer_type
-
     cty = ctype(type)
-    if is_cffi(ptr):
-        addr = ffi.cast('uintptr_t', ptr)
-        ctypes_ptr = ctypes.c_void_p(int(addr))
-        ptr = ctypes.cast(ctypes_ptr, cty)
-    else:
-        ptr = ctypes.cast(ptr, cty)
-
-    return ptr
+    if isinstance(items, cty):
+        return items
+    return cty(*items)
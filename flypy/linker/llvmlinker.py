@@ -53,7 +53,7 @@ class Linker(object):
         Thus, reducing the need to link to A.
     """
 
-    def __init__(self, result):
+    def __init__(self, result, opt=1, inline=200):
         """
         Modules are linked into result
 
@@ -61,9 +61,13 @@ class Linker(object):
         -----------
 
         result: llvm Module
+        opt: optimization level after linking
+        inline: inline threshold after linking
         """
         self.result = LinkerUnit(result)
         self.modules = []
+        self.opt = opt
+        self.inline = inline
 
     def add_module(self, module):
         """
@@ -108,15 +112,18 @@ class Linker(object):
                     break
 
         self.result.correct_linkage()
-        post_link_optimize(self.result.module)
+        post_link_optimize(self.result.module, self.opt, self.inline)
 
 
-def post_link_optimize(mod, inline=200):
+def post_link_optimize(mod, opt=1, inline=200):
     """Inline small functions
     """
+    if not opt:
+        return
+
     pm = llvm.passes.PassManager.new()
     pmb = llvm.passes.PassManagerBuilder.new()
-    pmb.opt_level = 1      # allow minimum optimization to reduce code size
+    pmb.opt_level = opt
     pmb.use_inliner_with_threshold(inline)
     pmb.populate(pm)
     pm.run(mod)
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+"""
+Optimization options, given per function to @jit:
+
+    @jit(opt=1, inline_threshold=225, vectorize=False)
+    def kernel(...): ...
+
+    opt                 LLVM optimization level, from 0 to 3. Level 0 also
+                        skips the pykit optimization pipeline.
+    inline_threshold    threshold of the LLVM inliner
+    vectorize           run the LLVM loop and SLP vectorizers
+    unroll              let LLVM unroll loops. Loops over unroll(...) are
+                        unrolled regardless, see
+                        flypy.compiler.optimizations.unrolling
+    fastmath            let LLVM reassociate floating point arithmetic and
+                        assume that it sees no NaNs or infinities, see
+                        flypy.compiler.backend.fastmath
+
+Like the target CPU (see flypy.targets), the options of a function apply to
+the functions it calls, which are compiled in the same environment (see
+flypy.pipeline.environment.target_env). Functions called from compiled code
+are compiled with the options of the caller.
+"""
+
+from __future__ import print_function, division, absolute_import
+
+defaults = {
+    'opt':              3,
+    'inline_threshold': 1000,
+    'vectorize':        True,
+    'unroll':           True,
+    'fastmath':         False,
+}
+
+def function_options(func):
+    """
+    Optimization options given to @jit for FunctionWrapper `func`, see
+    `normalize`.
+    """
+    options = {}
+    for py_func, signature, kwds in func.overloads:
+        for name in defaults:
+            if kwds.get(name) is not None:
+                options.setdefault(name, kwds[name])
+    return normalize(options)
+
+def normalize(options):
+    """
+    Return the options that differ from the defaults as a sorted tuple of
+    (name, value), which keys the environment compiling with them.
+    """
+    opt = options.get('opt', defaults['opt'])
+    if opt not in (0, 1, 2, 3):
+        raise ValueError("Expected an optimization level from 0 to 3, got %r"
+                         % (opt,))
+
+    return tuple(sorted((name, value) for name, value in options.items()
+                            if value != defaults[name]))
+
+def resolve(options):
+    """All optimization options as a dict, given the output of `normalize`"""
+    result = dict(defaults)
+    result.update(options)
+    return result
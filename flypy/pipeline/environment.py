@@ -6,6 +6,7 @@ flypy compilation environment.
 
 from __future__ import print_function, division, absolute_import
 
+from flypy import targets, optimization
 from flypy.utils import FrozenDict
 from flypy.caching import Cache, InferenceCache, TypingCache
 
@@ -34,6 +35,7 @@ _cpu_env = {
     'flypy.dpp_codegen.cache':  Cache(),
     'flypy.llvm.cache':         Cache(),
     'flypy.codegen.cache':      Cache(),
+    'flypy.principal.cache':    Cache(),
 
     # General state
     'flypy.state.func_name':    None,   # Function name
@@ -53,9 +55,19 @@ _cpu_env = {
     'flypy.state.called_flags': None,   # How this function itself was called
     'flypy.state.have_debugprint': False,   # Whether this function has a 'debugprint' op
     'flypy.state.dependence':   None,
+    'flypy.state.principal':    None,   # Function whose code we share
 
     # GC
-    'flypy.gc.impl':            "boehm",
+    'flypy.gc.impl':            "boehm",    # See flypy.gc
+    'flypy.gc.count_allocations': False,    # Count allocations per site
+    'flypy.gc.arenas':          False,      # Support arena allocation
+
+    # Exceptions
+    'flypy.exceptions.raises':  None,   # Whether the function may raise
+
+    # Generators, see flypy.compiler.lower.generators
+    'flypy.generators.constructor': None,   # GeneratorInfo of a generator
+    'flypy.generators.resume':      None,   # GeneratorInfo of a resume func
 
     # Global state
     'flypy.state.envs':         {},     # All cached environments
@@ -63,14 +75,20 @@ _cpu_env = {
     # Typing
     'flypy.typing.restype': None,       # Input/Output
     'flypy.typing.argtypes': None,      # Input
+    'flypy.typing.constants': (),       # Input: ((argname, value), ...)
     'flypy.typing.signature': None,     # Output
     'flypy.typing.context': None,       # Output
     'flypy.typing.constraints': None,   # Output
+    'flypy.typing.frame': None,         # Frame for recursive calls
 
     # Flags
     'flypy.verify':         True,
     'flypy.optimize':       True,
+    'flypy.optimization':   optimization.resolve(()),  # See flypy.optimization
+    'flypy.policies':       (),     # Enabled indexing policies
+    'flypy.principal':      False,  # Share code between specializations
     'flypy.target':         'cpu',
+    'flypy.target_cpu':     'generic',  # See flypy.targets
 
     # Codegen
     "codegen.llvm.opt":     None,
@@ -114,17 +132,73 @@ _target_env_map = {
     'dpp': dpp_env,
 }
 
+#===------------------------------------------------------------------===
+# Target CPU Environments
+#===------------------------------------------------------------------===
+
+_cpu_envs = {
+    # ((LLVM cpu, features), optimization options, policies, gc impl) -> env
+}
+
+def target_env(target, cpu=None, options=(), policies=(), gc_impl="boehm"):
+    """
+    Return the environment for `target`. Code for the cpu target can be
+    generated for other CPUs than the generic one (see flypy.targets), with
+    other optimization options than the defaults (see flypy.optimization,
+    `options` is the output of normalize()), with indexing policies
+    enabled (see flypy.runtime.obj.indexing), and for other collectors than
+    Boehm (see flypy.gc). These have their own caches and their own LLVM
+    module, engine and target machine.
+    """
+    if target != 'cpu' or (cpu in (None, 'generic') and not options
+                           and not policies and gc_impl == "boehm"):
+        return _target_env_map[target]
+
+    cpu = cpu or 'generic'
+    key = targets.resolve(cpu), options, policies, gc_impl
+    if key not in _cpu_envs:
+        env = dict(cpu_env)
+        env.update(pykit_env.fresh_env())
+        for name, value in env.items():
+            if name.startswith('flypy.') and name.endswith('.cache'):
+                env[name] = type(value)()
+        env['flypy.state.envs'] = {}
+        env['flypy.target_cpu'] = cpu
+        env['flypy.policies'] = policies
+        env['flypy.gc.impl'] = gc_impl
+
+        settings = optimization.resolve(options)
+        env['flypy.optimization'] = settings
+        env['flypy.optimize'] = settings['opt'] > 0
+
+        tm = targets.target_machine(cpu, opt=settings['opt'])
+        llvm_codegen.install(env, opt=settings['opt'], llvm_target_machine=tm)
+        _cpu_envs[key] = FrozenDict(env)
+
+    return _cpu_envs[key]
+
 #===------------------------------------------------------------------===
 # New envs
 #===------------------------------------------------------------------===
 
-def fresh_env(func, argtypes, target="cpu", varargs=False, keywords=False):
+def fresh_env(func, argtypes, target="cpu", varargs=False, keywords=False,
+              cpu=None, options=(), policies=(), gc_impl=None):
     """
-    Allocate a new environment.
+    Allocate a new environment. Code for the cpu target is generated for
+    `cpu` with optimization options `options`, indexing policies `policies`
+    and collector `gc_impl` (the selected one by default), see `target_env`.
     """
-    env = dict(_target_env_map[target])
+    from flypy import gc
+
+    gc_impl = gc_impl or gc.impl
+    env = dict(target_env(target, cpu, options, policies, gc_impl))
     py_func = func.py_func
 
+    # GC
+    env['flypy.gc.impl'] = gc_impl
+    env['flypy.gc.count_allocations'] = gc.count_allocations
+    env['flypy.gc.arenas'] = gc.arenas
+
     # Types
     env['flypy.typing.argtypes'] = argtypes
 
@@ -140,6 +214,10 @@ def fresh_env(func, argtypes, target="cpu", varargs=False, keywords=False):
 
     # Copy
     def copy(func1, argtypes1, **kwds):
+        kwds.setdefault('cpu', cpu)
+        kwds.setdefault('options', options)
+        kwds.setdefault('policies', policies)
+        kwds.setdefault('gc_impl', gc_impl)
         return fresh_env(func1, argtypes1, target, **kwds)
 
     env['flypy.fresh_env'] = copy
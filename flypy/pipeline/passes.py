@@ -11,26 +11,31 @@ from flypy.compiler.backend import lltyping, llvm, lowering, rewrite_lowlevel_co
 from flypy.compiler.frontend import (translate, simplify_exceptions, checker,
                                      setup, debugprint)
 from flypy.compiler.backend import (lltyping, llvm, lowering,
-                                     rewrite_lowlevel_constants)
-from flypy.compiler.analysis import dependence_analysis
+                                     rewrite_lowlevel_constants, shadowstack,
+                                     fastmath)
+from flypy.compiler.analysis import dependence_analysis, escape, nogil
 from flypy.compiler import simplification, transition
 from flypy.compiler.typing import inference, typecheck
 from flypy.compiler.typing.resolution import (resolve_context, resolve_restype)
 from flypy.compiler.optimizations import (dataflow, optimize, inlining,
-                                           throwing, deadblocks, reg2mem)
+                                           throwing, deadblocks, reg2mem,
+                                           unrolling, sccp, sra,
+                                           refcount_elision, policies,
+                                           boundschecks)
 from flypy.compiler.lower import (rewrite_calls, rewrite_raise_exc_type,
                                    rewrite_getattr, rewrite_setattr,
                                    rewrite_unpacking, rewrite_varargs,
                                    rewrite_constructors, explicit_coercions,
                                    rewrite_optional_args, rewrite_constants,
                                    conversion, rewrite_obj_return, allocator,
-                                   rewrite_externs, generators, void2none)
+                                   rewrite_externs, generators, void2none,
+                                   insert_refcounts)
+from flypy.compiler.lower.generators import generator_frames
 from flypy.viz.prettyprint import dump, dump_cfg, dump_llvm, dump_optimized
 
 from pykit.transform import dce
 #from pykit.optimizations import local_exceptions
-from pykit.codegen.llvm import (verify, optimize as llvm_optimize,
-                                llvm_postpasses)
+from pykit.codegen.llvm import verify, llvm_postpasses
 
 #===------------------------------------------------------------------===
 # Passes
@@ -49,6 +54,10 @@ frontend = [
     simplification.rewrite_overlays,
     deadblocks,
     dataflow,
+    simplification.specialize_values,
+    simplification.evaluate_static_calls,
+    unrolling,
+    boundschecks,
     checker,
 ]
 
@@ -73,12 +82,15 @@ typing = [
 
 generators = [
     generators.generator_fusion,             # generators
-    #generators.rewrite_general_generators,  # generators
-
+    generators.rewrite_general_generators,   # generators
 ]
 
 hl_lowering = [
     rewrite_constructors,                   # constructors
+    escape,                                 # escape analysis
+    nogil,                                  # @jit(nogil=True)
+    throwing.insert_exception_checks,       # exceptions
+    insert_refcounts,                       # reference counting
     allocator,                              # allocation
     rewrite_optional_args,
     explicit_coercions,
@@ -90,8 +102,10 @@ hl_lowering = [
 ]
 
 optimizations = [
+    refcount_elision,
     dce,
     dataflow.dataflow,
+    sccp,
     optimize,
     dependence_analysis,
 ]
@@ -103,9 +117,14 @@ prelowering = [
 
 ll_lowering = [
     inlining,
+    policies,
+    sra,
     dataflow,
     throwing.rewrite_local_exceptions,
+    nogil.verify_exceptions,                # @jit(nogil=True)
+    generator_frames,
     rewrite_lowlevel_constants,
+    shadowstack,
     #lowering.lower_fields,
     dependence_analysis,
 ]
@@ -117,14 +136,17 @@ backend_init = [
 
 backend_run = [
     llvm.codegen_run,
+    llvm.relocate_constants,
+    fastmath,
     llvm_postpasses,
+    llvm.annotate_externs,
     llvm.codegen_link,
 ]
 
 backend_finalize = [
     verify,
     dump_llvm,
-    llvm_optimize,
+    llvm.optimize,
     dump_optimized,
 ]
 
@@ -134,6 +156,7 @@ codegen = [
 
 dpp_backend_run = [
     llvm.codegen_run,
+    llvm.relocate_constants,
     # llvm_postpasses,  # for math
     #llvm.codegen_link, # do nothing
 ]
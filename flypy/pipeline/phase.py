@@ -13,6 +13,7 @@ from flypy.viz.viz import dump
 from .pipeline import run_pipeline
 from . import passes
 from .environment import fresh_env
+from flypy.compiler.backend import principal
 
 from pykit.analysis import callgraph
 
@@ -28,6 +29,10 @@ phase_passes = {
     # phase -> passes
 }
 
+raw_phases = {
+    # phase name -> phase, without its dependences
+}
+
 def define_phase(phase_func, phase_name, passes):
     phases[phase_name] = phase_func
     phase_passes[phase_func] = passes
@@ -81,6 +86,7 @@ def phase(phase_name, passes, depend=None, skip_opaque=False, all=True, key=None
     """
     phase = Phase(phase_name, passes, all, skip_opaque, key or cache_key)
     phase_passes[phase] = passes
+    raw_phases[phase_name] = phase
     if depend:
         phase = phasecompose(phase, depend)
     return define_phase(phase, phase_name, passes)
@@ -137,7 +143,8 @@ def cache_key(func, env):
     return func
 
 def cache_key_argtypes(func, env):
-    return (func, tuple(env["flypy.typing.argtypes"]))
+    return (func, tuple(env["flypy.typing.argtypes"]),
+            env["flypy.typing.constants"])
 
 # ______________________________________________________________________
 # Utils
@@ -171,6 +178,7 @@ def llvm_phase(func, env):
 
     for f in dependences:
         run_pipeline(f, envs[f], passes.backend_init)
+    principal.share_specializations(dependences, envs)
     for f in dependences:
         run_pipeline(f, envs[f], passes.backend_run)
     for f in dependences:
@@ -181,6 +189,18 @@ def llvm_phase(func, env):
 
     return env["flypy.state.llvm_func"], env
 
+def compile_typed(func, env):
+    """
+    Compile a function that has passed the generators phase, but is not
+    called by other functions (e.g. the resume functions of generators, see
+    flypy.compiler.lower.generators). Returns the ctypes function.
+    """
+    for phase_name in ('hl_lower', 'opt', 'prelower', 'll_lower'):
+        func, env = raw_phases[phase_name](func, env)
+    lfunc, env = llvm_phase(func, env)
+    lfunc, env = raw_phases['codegen'](lfunc, env)
+    return env["codegen.llvm.ctypes"]
+
 # Data Parallel Python Specifics
 
 def dpp_llvm_phase(func, env):
@@ -7,5 +7,5 @@ from .obj import *
 from .casting import cast
 from . import lowlevel_impls
 from .obj.core import *
-from .specialize import specialize_value
+from .specialize import specialize_value, static
 from .hacks import choose
\ No newline at end of file
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+
+"""
+Arena (region) allocation for batch-scoped objects. Objects allocated while
+an arena is active are allocated by bumping a pointer through the arena,
+and all of them are freed at once when the arena exits:
+
+    @jit(allocator="arena")
+    def process(record):
+        ...     # objects allocated here, or in functions called from here,
+                # are freed when process returns
+
+Arenas may also be entered and exited explicitly from compiled code:
+
+    mark = enter_arena()
+    ...
+    exit_arena(mark)
+
+or around calls from Python:
+
+    with arena():
+        process(record)
+
+Objects are only allocated in arenas by code compiled with flypy.gc.arenas
+set, since this adds a check of the arena state to each allocation:
+
+    flypy.gc.arenas = True
+
+Objects allocated in an arena must not outlive it. Functions compiled with
+@jit(allocator="arena") therefore can't return heap objects, or take
+arguments through which heap objects may be stored, which is checked when
+they are compiled. The same holds for functions called from Python in an
+arena, which is checked when they are called. Arenas nest, exiting an arena
+frees the objects allocated since it was entered. Objects with a finalizer
+(__del__) are always allocated by the collector.
+
+Each thread has its own arenas. Arenas are only supported with the Boehm
+collector. Chunks of the arena are allocated uncollectable, so the collector
+scans them for references to collected objects, but doesn't reclaim them.
+"""
+
+from __future__ import print_function, division, absolute_import
+import ctypes
+
+from flypy import jit, ijit
+from flypy.types import Pointer, void, int64, uint32
+from flypy.runtime.ffi import objectsize, cast, symbol_pointer
+from flypy.runtime.lib.c import libc
+from flypy.extern_support import extern_cffi, relocation
+from flypy.runtime.gc import boehm
+from flypy.runtime.gc.boehm import gc as libboehm
+from flypy.runtime.gc.semispace import align
+
+__all__ = ['arena', 'enter_arena', 'exit_arena']
+
+ptr_size = ctypes.sizeof(ctypes.c_void_p)
+
+# Alignment of objects in the arena
+ALIGNMENT = 2 * ptr_size
+
+CHUNK_SIZE = 64 * 1024
+
+#===------------------------------------------------------------------===
+# Arena state
+#===------------------------------------------------------------------===
+
+# The state of the arena is an array of words, zero-initialized:
+CHUNK   = 0     # current chunk, or 0
+OFFSET  = 1     # bump pointer in the current chunk
+TOP     = 2     # end of the current chunk
+DEPTH   = 3     # number of active arenas
+SPARE   = 4     # freed chunk kept for reuse, or 0
+NSTATE  = 5
+
+# Word offsets in the header of chunks, which precedes the allocated objects
+PREV    = 0     # previous chunk, or 0
+SIZE    = 1     # size of the chunk, including the header
+HEADER_SIZE = ALIGNMENT
+
+# Word offsets in marks, recording the state when an arena is entered
+MARK_CHUNK  = 0
+MARK_OFFSET = 1
+MARK_SIZE   = ALIGNMENT
+
+# Threads run compiled code in turns, and may each be in an arena, so each
+# thread has its own state. It is allocated on first use, and found through
+# a pthread key. Exported code can't create the key, and therefore doesn't
+# support arenas.
+STATE_SIZE = NSTATE * ctypes.sizeof(ctypes.c_int64)
+
+pthread, pthread_cffi = extern_cffi(None, None, """
+void *pthread_getspecific(unsigned int key);
+int pthread_setspecific(unsigned int key, void *value);
+""", attributes={'pthread_getspecific': ('readonly',)})
+
+_pthread = ctypes.CDLL(None)
+_pthread.pthread_getspecific.argtypes = [ctypes.c_uint]
+_pthread.pthread_getspecific.restype = ctypes.c_void_p
+
+_key = ctypes.c_uint()
+if _pthread.pthread_key_create(ctypes.byref(_key), None):
+    raise OSError("Cannot create the key of the arena state")
+
+key_symbol = relocation(".flypy.runtime.arena.key", ctypes.addressof(_key))
+key_pointer = symbol_pointer("arena_key_pointer", key_symbol)
+
+@ijit
+def arena_state():
+    """The arena state of the current thread"""
+    key = key_pointer(uint32)[0]
+    p = pthread.pthread_getspecific(key)
+    if cast(p, int64) == 0:
+        return new_state(key)
+    return cast(p, Pointer[int64])
+
+@jit('uint32 -> Pointer[int64]')
+def new_state(key):
+    p = libc.calloc(1, STATE_SIZE)
+    pthread.pthread_setspecific(key, p)
+    return cast(p, Pointer[int64])
+
+#===------------------------------------------------------------------===
+# Allocation
+#===------------------------------------------------------------------===
+
+@ijit('Type[a] -> Pointer[void]')
+def gc_alloc_object(type):
+    """
+    Allocate the storage of an object of `type` in the current arena, or
+    through the collector if there is none.
+    """
+    if arena_state()[DEPTH] > 0:
+        return allocate(objectsize(type))
+    return boehm.gc_alloc_object(type)
+
+@ijit('int64 -> Pointer[void]')
+def allocate(size):
+    state = arena_state()
+    size = align(size, ALIGNMENT)
+    obj = state[OFFSET]
+    if obj + size > state[TOP]:
+        return allocate_slow(size)
+
+    state[OFFSET] = obj + size
+    return cast(obj, Pointer[void])
+
+@jit('int64 -> Pointer[void]')
+def allocate_slow(size):
+    """Allocate `size` bytes from a new chunk"""
+    state = arena_state()
+    new_chunk(state, size)
+    obj = state[OFFSET]
+    state[OFFSET] = obj + size
+    return cast(obj, Pointer[void])
+
+@jit('Pointer[int64] -> int64 -> void')
+def new_chunk(state, size):
+    """Push a new chunk holding at least `size` bytes"""
+    size = size + HEADER_SIZE
+    if size < CHUNK_SIZE:
+        size = CHUNK_SIZE
+
+    chunk = state[SPARE]
+    if chunk != 0 and cast(chunk, Pointer[int64])[SIZE] >= size:
+        state[SPARE] = 0
+        size = cast(chunk, Pointer[int64])[SIZE]
+    else:
+        p = libboehm.boehm_malloc_uncollectable(size)
+        chunk = cast(p, int64)
+
+    header = cast(chunk, Pointer[int64])
+    header[PREV] = state[CHUNK]
+    header[SIZE] = size
+    state[CHUNK] = chunk
+    state[OFFSET] = chunk + HEADER_SIZE
+    state[TOP] = chunk + size
+
+#===------------------------------------------------------------------===
+# Entering and exiting arenas
+#===------------------------------------------------------------------===
+
+@jit
+def enter_arena():
+    """
+    Enter a new arena. Returns a mark to pass to `exit_arena`, which frees
+    all objects allocated in the arena.
+    """
+    state = arena_state()
+    chunk = state[CHUNK]
+    offset = state[OFFSET]
+
+    mark = cast(allocate(MARK_SIZE), Pointer[int64])
+    mark[MARK_CHUNK] = chunk
+    mark[MARK_OFFSET] = offset
+    state[DEPTH] = state[DEPTH] + 1
+    return cast(mark, int64)
+
+@jit('int64 -> void')
+def exit_arena(mark):
+    """Exit the arena entered by `enter_arena`, freeing its objects"""
+    state = arena_state()
+    p = cast(mark, Pointer[int64])
+    chunk = p[MARK_CHUNK]
+    offset = p[MARK_OFFSET]
+
+    # Free the chunks allocated since the arena was entered. We keep the
+    # first one around, since we likely need it again for the next arena.
+    while state[CHUNK] != chunk:
+        current = state[CHUNK]
+        state[CHUNK] = cast(current, Pointer[int64])[PREV]
+        free_chunk(state, current)
+
+    state[OFFSET] = offset
+    if chunk == 0:
+        state[TOP] = 0
+    else:
+        state[TOP] = chunk + cast(chunk, Pointer[int64])[SIZE]
+    state[DEPTH] = state[DEPTH] - 1
+
+@jit('Pointer[int64] -> int64 -> void')
+def free_chunk(state, chunk):
+    if state[SPARE] == 0:
+        state[SPARE] = chunk
+    else:
+        libboehm.boehm_free(cast(chunk, Pointer[void]))
+
+#===------------------------------------------------------------------===
+# Python
+#===------------------------------------------------------------------===
+
+class arena(object):
+    """
+    Context manager running the code in its body in an arena:
+
+        with arena():
+            f(x)
+
+    Compiled functions called in the body may not hand out objects allocated
+    in the arena, see `check_call`.
+    """
+
+    def __enter__(self):
+        self.mark = enter_arena()
+        return self
+
+    def __exit__(self, *exc_info):
+        exit_arena(self.mark)
+
+def check_call(func, env):
+    """
+    Reject calls from Python to compiled function `func` while an arena is
+    active, if objects allocated in the arena may escape through its result
+    or its arguments, like for functions compiled with
+    @jit(allocator="arena").
+    """
+    from flypy.compiler.lower.allocation import arena_escape
+
+    if env['flypy.gc.arenas'] and depth() > 0:
+        escape = arena_escape(env)
+        if escape:
+            raise TypeError("Cannot call %s from Python in an arena: %s" % (
+                                                            func, escape))
+
+def state():
+    """The arena state of the current thread, as an array of words"""
+    p = _pthread.pthread_getspecific(_key)
+    if not p:
+        return (ctypes.c_int64 * NSTATE)()
+    return (ctypes.c_int64 * NSTATE).from_address(p)
+
+def depth():
+    """Number of active arenas of the current thread"""
+    return state()[DEPTH]
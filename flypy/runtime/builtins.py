@@ -10,7 +10,9 @@ except ImportError:
 from .. import jit, ijit, overlay, overload, cjit, typeof
 from .interfaces import Sequence, Iterable, Iterator
 from .obj.core import (Range, List, Type, Complex, Slice, StaticTuple,
-                       EmptyTuple, GenericTuple, EmptyList, NoneType, newbuffer)
+                       EmptyTuple, GenericTuple, EmptyList, NoneType, newbuffer,
+                       RangeIterator, ZipIterator, EnumerateIterator,
+                       reversed_iterator, map_iterator, filter_iterator)
 from .casting import cast
 from flypy.types import int32, float64
 from . import ffi
@@ -41,7 +43,11 @@ def iter(x):
 def next(x):
     return x.__next__()
 
-@jit #('Sequence[a] -> Py_ssize_t')
+def static_len(argtypes):
+    from .obj.tupleobject import static_length
+    return static_length(argtypes)
+
+@jit(eval_from_types=static_len) #('Sequence[a] -> Py_ssize_t')
 def len(x):
     return x.__len__()
 
@@ -133,22 +139,35 @@ def range(start, stop=0xdeadbeef, step=1):
 
     return Range(start, stop, step)
 
-@jit
+# Iterator combinators are inlined iterator objects, which compose without
+# allocation. Iterator objects can't hold a function, so map and filter
+# specialize on the function they apply, and construct an iterator class
+# built for it (see flypy.runtime.obj.iterators).
+
+@ijit
 def zip(a, b):
-    it1 = iter(a)
-    it2 = iter(b)
-    try:
-        while True:
-            yield next(it1), next(it2)
-    except StopIteration:
-        pass
+    return ZipIterator(iter(a), iter(b))
 
-@jit
+@ijit
 def enumerate(it):
-    i = 0
-    for x in it:
-        yield i, x
-        i += 1
+    return EnumerateIterator(iter(it), 0)
+
+@ijit('Range[] -> RangeIterator[]')
+def reversed(seq):
+    n = len(seq)
+    return RangeIterator(seq.start + (n - 1) * seq.step, -seq.step, n)
+
+@ijit('a -> ReversedIterator[a]')
+def reversed(seq):
+    return reversed_iterator(seq)
+
+@ijit(specialize_value=('f',))
+def map(f, it):
+    return map_iterator(f)(iter(it))
+
+@ijit(specialize_value=('f',))
+def filter(f, it):
+    return filter_iterator(f)(iter(it))
 
 # ____________________________________________________________
 
@@ -209,8 +228,11 @@ overlay(builtins.float, float)
 overlay(builtins.complex, complex)
 overlay(builtins.abs, abs)
 overlay(builtins.slice, slice)
-#overlay(builtins.zip, zip) # TODO: try/except
+overlay(builtins.zip, zip)
 overlay(builtins.enumerate, enumerate)
+overlay(builtins.reversed, reversed)
+overlay(builtins.map, map)
+overlay(builtins.filter, filter)
 overlay(builtins.range, range)
 overlay(builtins.xrange, range)
 overlay(builtins.list, list)
@@ -19,7 +19,7 @@ from pykit import types as ptypes
 
 void = Void[()]
 
-__all__ = ['malloc', 'memcmp', 'sizeof']
+__all__ = ['malloc', 'memcmp', 'sizeof', 'objectsize']
 
 #===------------------------------------------------------------------===
 # Implementations
@@ -49,10 +49,26 @@ def memcmp(a, b, size):
 def sizeof(obj):
     raise NotImplementedError("Not implemented at the python level")
 
-@cjit('Type[a] -> int64', opaque=True)
+def sizeof_from_types(argtypes):
+    [argtype] = argtypes
+    return flypy.types.sizeof_type(argtype.parameters[0])
+
+@cjit('Type[a] -> int64', opaque=True, eval_from_types=sizeof_from_types)
 def sizeof(obj):
     raise NotImplementedError("Not implemented at the python level")
 
+def objectsize_from_types(argtypes):
+    [argtype] = argtypes
+    return flypy.types.sizeof_object(argtype.parameters[0])
+
+@cjit('Type[a] -> int64', opaque=True, eval_from_types=objectsize_from_types)
+def objectsize(type):
+    """
+    Size of the storage of an object of type `type`. This is the size of
+    the object on the heap for heap-allocated objects.
+    """
+    raise NotImplementedError("Not implemented at the python level")
+
 #===------------------------------------------------------------------===
 # Low-level implementations
 #===------------------------------------------------------------------===
@@ -69,6 +85,12 @@ def implement_sizeof(builder, argtypes, obj):
 
 add_impl(sizeof, "sizeof", implement_sizeof, ptypes.Int64)
 
+def implement_objectsize(builder, argtypes, obj):
+    size = objectsize_from_types(argtypes)
+    return builder.ret(ir.Const(size, ptypes.Int64))
+
+add_impl(objectsize, "objectsize", implement_objectsize, ptypes.Int64)
+
 #======= UNDEF ==================================================
 
 @jit('Type[base] -> base', opaque=True)
@@ -88,3 +110,51 @@ def restype_undef(argtypes):
     return lltype(restype)
 
 add_impl(undef, "undef", implement_undef, restype_func=restype_undef)
+
+#======= Relocations ==================================================
+
+def symbol_pointer(name, symbol):
+    """
+    Build an opaque function `Type[a] -> Pointer[a]` returning a pointer to
+    the data of external symbol `symbol` (see flypy.extern_support), e.g.
+
+        state = symbol_pointer("state", relocation(".state", address))
+        state(int64)[0] = 1
+    """
+    def pointer(type):
+        raise NotImplementedError("Not implemented at the python level")
+
+    def restype(argtypes):
+        [argtype] = argtypes
+        return lltype(Pointer[argtype.parameters[0]])
+
+    def implement(builder, argtypes, type):
+        from flypy.compiler.lower.externs import symbol_address
+        builder.ret(symbol_address(builder, symbol, restype(argtypes)))
+
+    pointer.__name__ = name
+    pointer = jit('Type[a] -> Pointer[a]', opaque=True)(pointer)
+    add_impl(pointer, name, implement, restype_func=restype)
+    return pointer
+
+def symbol_constant(name, lookup):
+    """
+    Build an opaque function `Type[a] -> int64` evaluating to the address of
+    external symbol `lookup(a)`, or to 0 if `lookup(a)` is None.
+    """
+    def constant(type):
+        raise NotImplementedError("Not implemented at the python level")
+
+    def implement(builder, argtypes, type):
+        from flypy.compiler.lower.externs import symbol_address
+        [argtype] = argtypes
+        symbol = lookup(argtype.parameters[0])
+        if symbol is None:
+            builder.ret(ir.Const(0, ptypes.Int64))
+        else:
+            builder.ret(symbol_address(builder, symbol, ptypes.Int64))
+
+    constant.__name__ = name
+    constant = jit('Type[a] -> int64', opaque=True)(constant)
+    add_impl(constant, name, implement, ptypes.Int64)
+    return constant
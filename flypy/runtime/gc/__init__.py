@@ -6,10 +6,13 @@ Garbage collection package.
 
 from __future__ import print_function, division, absolute_import
 
-from . import boehm
+from . import boehm, semispace, refcount, libgc
 
 impls = {
     "boehm": boehm,
+    "semispace": semispace,
+    "refcount": refcount,
+    "libgc": libgc,
 }
 
 def gc_impl(name):
@@ -2,20 +2,49 @@
 
 """
 Garbage collection using the Boehm collector.
+
+Small objects that are scanned conservatively are allocated from
+allocation buffers: a free list of cleared objects for each size class,
+refilled in batches by GC_malloc_many. The fast path of `gc_alloc` pops an
+object from the free list and is inlined at allocation sites, so we only
+call into the collector when the buffer is exhausted.
+
+The buffers are shared by all threads, and protected by the GIL, which
+compiled code holds. Functions compiled with @jit(nogil=True) therefore
+can't allocate through the collector (see flypy.compiler.analysis.nogil).
+
+Other allocations are described to the collector using the layout of the
+allocated type (see `layout_kind`):
+
+    - memory without pointers is allocated with GC_MALLOC_ATOMIC, and is
+      never scanned (e.g. numeric arrays)
+    - structs with few pointers get a type descriptor (GC_make_descriptor),
+      so that only their pointer fields are scanned
+    - anything else is scanned conservatively
+
+Large blocks are allocated with the IGNORE_OFF_PAGE variants, since we keep
+a pointer to their start.
 """
 
 from __future__ import print_function, division, absolute_import
 import os
+import ctypes
 
 import flypy
-from flypy import cjit
+from flypy import jit, cjit, ijit, conversion
 from flypy.types import Pointer, void
-from flypy.runtime.ffi import sizeof, cast
+from flypy.representation import stack_allocate
+from flypy.runtime.ffi import sizeof, objectsize, cast, symbol_pointer
 from flypy.runtime.obj.core import Type
+from flypy.runtime.lowlevel_impls import add_impl
+from flypy.runtime.lib.c import libc
 from . import boehmlib
-from flypy.extern_support import extern_cffi
+from flypy.extern_support import extern_cffi, relocation
+
+from pykit import ir
+from pykit import types as ptypes
 
-__all__ = ['gc_alloc']
+__all__ = ['gc_alloc', 'gc_alloc_object']
 
 root = os.path.dirname(os.path.abspath(__file__))
 lib = os.path.join(root, "boehmlib.so")
@@ -27,6 +56,13 @@ lib = os.path.join(root, "boehmlib.so")
 gc, gclib_cffi = extern_cffi(".flypy.runtime.gc", lib, """
 void boehm_collect();
 void *boehm_malloc(size_t nbytes);
+void *boehm_malloc_atomic(size_t nbytes);
+void *boehm_malloc_ignore_off_page(size_t nbytes);
+void *boehm_malloc_atomic_ignore_off_page(size_t nbytes);
+void *boehm_malloc_typed(size_t n, size_t nbytes, size_t descr);
+void *boehm_refill(size_t nbytes);
+void *boehm_malloc_uncollectable(size_t nbytes);
+void boehm_free(void *p);
 void boehm_disable();
 void boehm_enable();
 void boehm_register_finalizer(void *obj, void *dtor);
@@ -51,14 +87,204 @@ void boehm_register_finalizer(void *obj, void *dtor);
 #}
 #""", libraries=["gc"])
 
+#===------------------------------------------------------------------===
+# Allocation buffers
+#===------------------------------------------------------------------===
+
+# Size classes, these must match boehmlib.pyx
+GRANULE = 16
+NCLASSES = 16
+MAX_BUFFERED_SIZE = GRANULE * NCLASSES
+
+_boehmlib = ctypes.CDLL(lib)
+_boehmlib.boehm_freelists.restype = ctypes.c_void_p
+_boehmlib.boehm_make_descriptor.restype = ctypes.c_size_t
+_boehmlib.boehm_make_descriptor.argtypes = [ctypes.POINTER(ctypes.c_size_t),
+                                            ctypes.c_size_t]
+
+freelists_address = _boehmlib.boehm_freelists()
+freelists_symbol = relocation(".flypy.runtime.gc.freelists", freelists_address)
+freelists_pointer = symbol_pointer("freelists_pointer", freelists_symbol)
+
+@ijit('int64 -> int64', eval_if_const=True)
+def size_class(size):
+    """Index of the allocation buffer for objects of `size` bytes"""
+    if size <= GRANULE:
+        return 0
+    return (size + GRANULE - 1) // GRANULE - 1
+
+@ijit('int64 -> Pointer[Pointer[void]]')
+def freelist(cls):
+    return freelists_pointer(Pointer[void]) + cls
+
+#===------------------------------------------------------------------===
+# Layouts
+#===------------------------------------------------------------------===
+
+# Kinds of allocations
+ATOMIC = 0      # no pointers, never scanned
+NORMAL = 1      # scanned conservatively
+TYPED  = 2      # scanned according to a type descriptor
+
+# Use a type descriptor if at most one in TYPED_RATIO words is a pointer
+TYPED_RATIO = 4
+
+# Size from which we use the IGNORE_OFF_PAGE allocation functions
+LARGE_OBJECT_SIZE = 100 * 1024
+
+word_size = ctypes.sizeof(ctypes.c_void_p)
+word_bits = word_size * 8
+
+# Type codes of ctypes scalars without pointers
+scalar_codes = "cbBhHiIlLqQfdg?"
+
+_descriptors = {}
+
+def item_ctype(type):
+    """ctypes type of an item of an array of `type`"""
+    return conversion.ctype(type)
+
+def object_ctype(type):
+    """ctypes type of the storage of an object of `type`"""
+    cty = conversion.ctype(type)
+    if not stack_allocate(type):
+        cty = cty._type_ # Get the base type
+    return cty
+
+def pointer_offsets(cty, offset=0):
+    """
+    Find the offsets of all words that may hold a pointer in values of
+    ctypes type `cty`, which follows the resolved layout of flypy types.
+    """
+    if issubclass(cty, (ctypes.Structure, ctypes.Union)):
+        offsets = []
+        for field in cty._fields_:
+            name, fieldtype = field[:2]
+            field_offset = offset + getattr(cty, name).offset
+            offsets.extend(pointer_offsets(fieldtype, field_offset))
+        return offsets
+    elif issubclass(cty, ctypes.Array):
+        itemsize = ctypes.sizeof(cty._type_)
+        return [o for i in range(cty._length_)
+                      for o in pointer_offsets(cty._type_, offset + i * itemsize)]
+    elif issubclass(cty, ctypes._SimpleCData) and cty._type_ in scalar_codes:
+        return []
+    else:
+        # Pointers, function pointers, or something we don't know about
+        return [offset]
+
+def layout_kind(cty):
+    """Determine how the collector should scan values of ctypes type `cty`"""
+    offsets = pointer_offsets(cty)
+    nwords = ctypes.sizeof(cty) // word_size
+    if not offsets:
+        return ATOMIC
+    elif (len(offsets) * TYPED_RATIO <= nwords and
+              all(offset % word_size == 0 for offset in offsets)):
+        return TYPED
+    return NORMAL
+
+def layout_descriptor(cty):
+    """Build a type descriptor for values of ctypes type `cty`"""
+    if layout_kind(cty) != TYPED:
+        return 0
+
+    if cty not in _descriptors:
+        nwords = ctypes.sizeof(cty) // word_size
+        bitmap = (ctypes.c_size_t * ((nwords + word_bits - 1) // word_bits))()
+        for offset in pointer_offsets(cty):
+            word = offset // word_size
+            bitmap[word // word_bits] |= 1 << (word % word_bits)
+
+        descr = _boehmlib.boehm_make_descriptor(bitmap, nwords)
+        # Descriptors are words, pass them around as int64
+        _descriptors[cty] = ctypes.c_int64(descr).value
+
+    return _descriptors[cty]
+
+def layout_constant(name, compute):
+    """
+    Build an opaque function `Type[a] -> int64` which evaluates to
+    `compute(a)` at compile time.
+    """
+    def from_types(argtypes):
+        [argtype] = argtypes
+        return compute(argtype.parameters[0])
+
+    def constant(type):
+        raise NotImplementedError("Not implemented at the python level")
+
+    def implement(builder, argtypes, type):
+        builder.ret(ir.Const(from_types(argtypes), ptypes.Int64))
+
+    constant.__name__ = name
+    constant = jit('Type[a] -> int64', opaque=True,
+                   eval_from_types=from_types)(constant)
+    add_impl(constant, name, implement, ptypes.Int64)
+    return constant
+
+item_kind = layout_constant(
+    "item_kind", lambda type: layout_kind(item_ctype(type)))
+item_descriptor = layout_constant(
+    "item_descriptor", lambda type: layout_descriptor(item_ctype(type)))
+object_kind = layout_constant(
+    "object_kind", lambda type: layout_kind(object_ctype(type)))
+object_descriptor = layout_constant(
+    "object_descriptor", lambda type: layout_descriptor(object_ctype(type)))
+
 #===------------------------------------------------------------------===
 # Implementations
 #===------------------------------------------------------------------===
 
-@cjit('int64 -> Type[a] -> Pointer[void]')
+@ijit('int64 -> Type[a] -> Pointer[void]')
 def gc_alloc(items, type):
-    p = gc.boehm_malloc(items * sizeof(type))
-    return p #cast(p, Pointer[type])
+    """Allocate an array of `items` values of `type`"""
+    return allocate(items, sizeof(type), item_kind(type),
+                    item_descriptor(type))
+
+@ijit('Type[a] -> Pointer[void]')
+def gc_alloc_object(type):
+    """Allocate the storage of an object of `type`"""
+    return allocate(1, objectsize(type), object_kind(type),
+                    object_descriptor(type))
+
+@ijit('int64 -> int64 -> int64 -> int64 -> Pointer[void]')
+def allocate(items, itemsize, kind, descriptor):
+    size = items * itemsize
+    if kind != NORMAL or size > MAX_BUFFERED_SIZE:
+        return allocate_unbuffered(items, itemsize, kind, descriptor)
+
+    head = freelist(size_class(size))
+    obj = head[0]
+    if not obj:
+        return gc.boehm_refill(size)
+
+    # Unlink the object, and clear the link
+    link = cast(obj, Pointer[Pointer[void]])
+    head[0] = link[0]
+    link[0] = cast(0, Pointer[void])
+    return obj
+
+@jit('int64 -> int64 -> int64 -> int64 -> Pointer[void]')
+def allocate_unbuffered(items, itemsize, kind, descriptor):
+    """
+    Allocate memory that isn't served by the allocation buffers. Like the
+    buffers, small atomic memory is cleared, large atomic memory is not.
+    """
+    size = items * itemsize
+    if kind == TYPED:
+        return gc.boehm_malloc_typed(items, itemsize, descriptor)
+    elif kind == ATOMIC:
+        if size >= LARGE_OBJECT_SIZE:
+            return gc.boehm_malloc_atomic_ignore_off_page(size)
+        p = gc.boehm_malloc_atomic(size)
+        if size <= MAX_BUFFERED_SIZE:
+            libc.memset(p, 0, size)
+        return p
+    else:
+        if size >= LARGE_OBJECT_SIZE:
+            return gc.boehm_malloc_ignore_off_page(size)
+        return gc.boehm_malloc(size)
 
 @cjit('int64 -> Type[a] -> Pointer[a]')
 def gc_delalloc(items, type):
@@ -80,4 +306,8 @@ def gc_enable():
 
 @cjit('Pointer[void] -> Pointer[void] -> void')
 def gc_add_finalizer(obj, finalizer):
-    gc.boehm_register_finalizer(obj, finalizer)
\ No newline at end of file
+    gc.boehm_register_finalizer(obj, finalizer)
+
+def stats():
+    """Return collector statistics, see flypy.gc.stats()"""
+    return boehmlib.stats()
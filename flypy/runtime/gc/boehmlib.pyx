@@ -7,21 +7,100 @@ Boehm support utilities.
 # future feature absolute_import is not defined ?
 from __future__ import print_function, division #, absolute_import
 
+from posix.time cimport clock_gettime, timespec, CLOCK_MONOTONIC
+
 cdef extern from "gc.h":
     void GC_INIT()
     void GC_gcollect()
     void *GC_MALLOC(size_t nbytes)
+    void *GC_MALLOC_ATOMIC(size_t nbytes)
+    void *GC_MALLOC_UNCOLLECTABLE(size_t nbytes)
+    void *GC_MALLOC_IGNORE_OFF_PAGE(size_t nbytes)
+    void *GC_MALLOC_ATOMIC_IGNORE_OFF_PAGE(size_t nbytes)
+    void *GC_malloc_many(size_t nbytes)
+    void GC_FREE(void *p)
+    void GC_add_roots(void *low, void *high_plus_1)
     void GC_disable()
     void GC_enable()
 
+    size_t GC_get_heap_size()
+    size_t GC_get_bytes_since_gc()
+    size_t GC_get_gc_no()
+
+    ctypedef enum GC_EventType:
+        GC_EVENT_START
+        GC_EVENT_END
+
+    ctypedef void (*GC_on_collection_event_proc)(GC_EventType event)
+    void GC_set_on_collection_event(GC_on_collection_event_proc fn)
+
     ctypedef void (*GC_finalization_proc) (void * obj, void * client_data)
 
     void GC_register_finalizer(void * obj, GC_finalization_proc fn,
                   void * cd, GC_finalization_proc *ofn,
                   void * *ocd)
 
+cdef extern from "gc_typed.h":
+    ctypedef size_t GC_word
+    ctypedef GC_word GC_descr
+
+    GC_descr GC_make_descriptor(GC_word *bitmap, size_t len)
+    void *GC_calloc_explicitly_typed(size_t nelements, size_t element_size,
+                                     GC_descr d)
+
+# Size classes of the allocation buffers, must match boehm.py
+DEF GRANULE = 16
+DEF NCLASSES = 16
+
+# Allocation buffers, a free list of cleared objects for each size class.
+# Compiled code pops objects from these directly, see boehm.gc_alloc.
+cdef void *freelists[NCLASSES]
+
+# Statistics, see stats()
+cdef double pause_start = 0.0
+cdef double pause_time = 0.0
+cdef double max_pause_time = 0.0
+cdef size_t finalizers_registered = 0
+cdef size_t finalizers_run = 0
+
+ctypedef void (*finalizer_t)(void *obj, void *client_data)
+
+cdef double now() nogil:
+    cdef timespec ts
+    clock_gettime(CLOCK_MONOTONIC, &ts)
+    return ts.tv_sec + ts.tv_nsec * 1e-9
+
+cdef void on_collection_event(GC_EventType event) nogil:
+    global pause_start, pause_time, max_pause_time
+    cdef double pause
+
+    if event == GC_EVENT_START:
+        pause_start = now()
+    elif event == GC_EVENT_END:
+        pause = now() - pause_start
+        pause_time += pause
+        if pause > max_pause_time:
+            max_pause_time = pause
+
+cdef void run_finalizer(void *obj, void *dtor) nogil:
+    global finalizers_run
+    finalizers_run += 1
+    (<finalizer_t> dtor)(obj, NULL)
 
 GC_INIT()
+GC_add_roots(<void *> &freelists[0], <void *> &freelists[NCLASSES])
+GC_set_on_collection_event(on_collection_event)
+
+def stats():
+    """Return collector statistics, see flypy.gc.stats()"""
+    return {
+        'heap_size':        GC_get_heap_size(),
+        'bytes_since_gc':   GC_get_bytes_since_gc(),
+        'collections':      GC_get_gc_no(),
+        'pause_time':       pause_time,
+        'max_pause_time':   max_pause_time,
+        'finalizers':       finalizers_registered - finalizers_run,
+    }
 
 cdef public void boehm_collect():
     GC_gcollect()
@@ -29,6 +108,47 @@ cdef public void boehm_collect():
 cdef public void *boehm_malloc(size_t nbytes):
     return GC_MALLOC(nbytes)
 
+cdef public void *boehm_malloc_uncollectable(size_t nbytes):
+    return GC_MALLOC_UNCOLLECTABLE(nbytes)
+
+cdef public void boehm_free(void *p):
+    GC_FREE(p)
+
+cdef public void *boehm_malloc_atomic(size_t nbytes):
+    return GC_MALLOC_ATOMIC(nbytes)
+
+cdef public void *boehm_malloc_ignore_off_page(size_t nbytes):
+    return GC_MALLOC_IGNORE_OFF_PAGE(nbytes)
+
+cdef public void *boehm_malloc_atomic_ignore_off_page(size_t nbytes):
+    return GC_MALLOC_ATOMIC_IGNORE_OFF_PAGE(nbytes)
+
+cdef public void *boehm_malloc_typed(size_t n, size_t nbytes, size_t descr):
+    return GC_calloc_explicitly_typed(n, nbytes, <GC_descr> descr)
+
+cdef public size_t boehm_make_descriptor(size_t *bitmap, size_t nwords):
+    return GC_make_descriptor(<GC_word *> bitmap, nwords)
+
+cdef public void *boehm_freelists():
+    return <void *> &freelists[0]
+
+cdef public void *boehm_refill(size_t nbytes):
+    """
+    Refill the allocation buffer for objects of `nbytes` bytes with a batch
+    of objects from the collector, and return the first object.
+    """
+    cdef size_t cls = (nbytes + GRANULE - 1) // GRANULE
+    if cls > 0:
+        cls -= 1
+
+    cdef void **obj = <void **> GC_malloc_many((cls + 1) * GRANULE)
+    if obj == NULL:
+        return NULL
+
+    freelists[cls] = obj[0]
+    obj[0] = NULL
+    return <void *> obj
+
 cdef public void boehm_disable():
     GC_disable()
 
@@ -36,8 +156,11 @@ cdef public void boehm_enable():
     GC_enable()
 
 cdef public void boehm_register_finalizer(void *obj, void *dtor):
+    global finalizers_registered
     cdef GC_finalization_proc old_finalizer
     cdef void *old_client_data
 
-    GC_register_finalizer(obj, <GC_finalization_proc> dtor, NULL,
+    # Run the finalizer through run_finalizer(), which counts them
+    finalizers_registered += 1
+    GC_register_finalizer(obj, run_finalizer, dtor,
                           &old_finalizer, &old_client_data)
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+"""
+Garbage collection using the Boehm collector, calling libgc directly.
+
+Compiled code refers to nothing but the functions exported by libgc, so it
+can be linked ahead of time (see flypy.cppgen.export). Unlike
+flypy.runtime.gc.boehm, there are no allocation buffers, so each allocation
+calls into the collector, and memory with pointers is scanned
+conservatively, since type descriptors are built by the collector of the
+compiling process.
+
+Like the allocation buffers of the boehm collector, small allocations and
+objects are cleared. Large atomic memory is not.
+"""
+
+from __future__ import print_function, division, absolute_import
+import ctypes.util
+
+from flypy import jit, ijit
+from flypy.types import Pointer, void
+from flypy.runtime.ffi import sizeof, objectsize, cast
+from flypy.extern_support import extern_cffi
+from . import boehm
+from .boehm import item_kind, ATOMIC, MAX_BUFFERED_SIZE, LARGE_OBJECT_SIZE
+
+__all__ = ['gc_alloc', 'gc_alloc_object']
+
+#===------------------------------------------------------------------===
+# Decls
+#===------------------------------------------------------------------===
+
+# Use the real names, so that exported code links against libgc
+gc, gclib_cffi = extern_cffi(None, ctypes.util.find_library('gc'), """
+void GC_gcollect();
+void *GC_malloc(size_t nbytes);
+void *GC_malloc_atomic(size_t nbytes);
+void *GC_malloc_ignore_off_page(size_t nbytes);
+void *GC_malloc_atomic_ignore_off_page(size_t nbytes);
+void GC_disable();
+void GC_enable();
+void GC_register_finalizer(void *obj, void *fn, void *cd, void *ofn,
+                           void *ocd);
+""")
+
+#===------------------------------------------------------------------===
+# Implementations
+#===------------------------------------------------------------------===
+
+@ijit('int64 -> Type[a] -> Pointer[void]')
+def gc_alloc(items, type):
+    """Allocate an array of `items` values of `type`"""
+    return allocate(items * sizeof(type), item_kind(type))
+
+@ijit('Type[a] -> Pointer[void]')
+def gc_alloc_object(type):
+    """Allocate the storage of an object of `type`"""
+    return gc.GC_malloc(objectsize(type))
+
+@ijit('int64 -> int64 -> Pointer[void]')
+def allocate(size, kind):
+    if kind == ATOMIC and size > MAX_BUFFERED_SIZE:
+        if size >= LARGE_OBJECT_SIZE:
+            return gc.GC_malloc_atomic_ignore_off_page(size)
+        return gc.GC_malloc_atomic(size)
+    if size >= LARGE_OBJECT_SIZE:
+        return gc.GC_malloc_ignore_off_page(size)
+    return gc.GC_malloc(size)
+
+@jit
+def gc_collect():
+    gc.GC_gcollect()
+
+@jit
+def gc_disable():
+    gc.GC_disable()
+
+@jit
+def gc_enable():
+    gc.GC_enable()
+
+@jit('Pointer[void] -> Pointer[void] -> void')
+def gc_add_finalizer(obj, finalizer):
+    # Finalizers are called with (obj, client data), see boehmlib.pyx
+    null = cast(0, Pointer[void])
+    gc.GC_register_finalizer(obj, finalizer, null, null, null)
+
+def stats():
+    """Return collector statistics, see flypy.gc.stats()"""
+    return boehm.stats()
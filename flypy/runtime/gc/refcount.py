@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+
+"""
+Reference counting. Select it with
+
+    flypy.gc.impl = "refcount"
+
+before compiling any code.
+
+Objects are released as soon as the last reference to them disappears, which
+runs their finalizer (__del__) promptly. The compiler inserts incref and
+decref operations (see flypy.compiler.lower.refcounting), and redundant
+pairs are removed again by flypy.compiler.optimizations.refcount_elision.
+
+Memory is still allocated through the Boehm collector, and freed explicitly
+when the reference count drops to zero. The collector reclaims what reference
+counting can't: cycles, and objects whose references were stored in raw
+memory (e.g. through Pointer.store), which we don't count.
+
+Objects are preceded by a header:
+
+    refcount        number of references to the object
+    release         function releasing the references held by the object
+    finalizer       __del__ of the object, or 0
+"""
+
+from __future__ import print_function, division, absolute_import
+import ctypes
+import textwrap
+
+from flypy import jit, ijit
+from flypy.types import Pointer, void, int64
+from flypy.runtime.ffi import objectsize, cast, symbol_constant
+from flypy.extern_support import relocation, type_name
+from flypy.runtime.lowlevel_impls import add_impl
+from flypy.compiler import lltype
+from . import boehm
+from .boehm import gc as libboehm
+from .semispace import reference_fields, call_finalizer
+
+from pykit import ir
+from pykit import types as ptypes
+
+__all__ = ['gc_alloc', 'gc_alloc_object', 'incref', 'decref']
+
+# Word offsets in the header
+REFCOUNT    = 0
+RELEASE     = 1
+FINALIZER   = 2
+HEADER_WORDS = 3
+
+HEADER_SIZE = HEADER_WORDS * ctypes.sizeof(ctypes.c_int64)
+
+_release_functions = {}
+_release_addresses = {}
+
+#===------------------------------------------------------------------===
+# Allocation
+#===------------------------------------------------------------------===
+
+@ijit('int64 -> Type[a] -> Pointer[void]')
+def gc_alloc(items, type):
+    """Allocate an array of `items` values of `type`, which is not counted"""
+    return boehm.gc_alloc(items, type)
+
+@ijit('Type[a] -> Pointer[void]')
+def gc_alloc_object(type):
+    """Allocate an object of `type` with a reference count of 1"""
+    p = boehm.allocate(1, HEADER_SIZE + objectsize(type), boehm.NORMAL, 0)
+    header = cast(p, Pointer[int64])
+    header[REFCOUNT] = 1
+    header[RELEASE] = release_address(type)
+    header[FINALIZER] = 0
+    return cast(header + HEADER_WORDS, Pointer[void])
+
+@ijit('Pointer[void] -> Pointer[int64]')
+def object_header(obj):
+    return cast(obj, Pointer[int64]) - HEADER_WORDS
+
+#===------------------------------------------------------------------===
+# Reference counting
+#===------------------------------------------------------------------===
+
+@ijit('Pointer[void] -> void')
+def incref(obj):
+    if obj:
+        header = object_header(obj)
+        header[REFCOUNT] = header[REFCOUNT] + 1
+
+@ijit('Pointer[void] -> void')
+def decref(obj):
+    if obj:
+        header = object_header(obj)
+        refcount = header[REFCOUNT] - 1
+        header[REFCOUNT] = refcount
+        if refcount == 0:
+            release(obj)
+
+@jit('Pointer[void] -> void')
+def release(obj):
+    """
+    Release an object without references: run its finalizer, release the
+    references it holds, and free it.
+    """
+    header = object_header(obj)
+    address = cast(obj, int64)
+    if header[FINALIZER] != 0:
+        call_finalizer(header[FINALIZER], address)
+    if header[RELEASE] != 0:
+        call_release(header[RELEASE], address)
+    libboehm.boehm_free(cast(header, Pointer[void]))
+
+@jit('int64 -> int64 -> void', opaque=True)
+def call_release(release, obj):
+    raise NotImplementedError("Not implemented at the python level")
+
+@jit('Type[a] -> a', opaque=True)
+def null(type):
+    """The null reference of heap type `type`"""
+    raise NotImplementedError("Not implemented at the python level")
+
+#===------------------------------------------------------------------===
+# Release functions
+#===------------------------------------------------------------------===
+
+def release_function(type):
+    """
+    Generate the function releasing the references held by objects of heap
+    type `type`, or return None if it doesn't hold any.
+    """
+    if type not in _release_functions:
+        fields = reference_fields(type)
+        if not fields:
+            return None
+
+        stmts = []
+        for offset, fieldtype in fields:
+            stmts.append("p = cast(obj + %d, Pointer[Pointer[void]])" % offset)
+            stmts.append("decref(p[0])")
+
+        source = textwrap.dedent("""
+        def __flypy_release__(obj):
+            %s
+        """) % ("\n    ".join(stmts),)
+
+        namespace = {
+            'decref': decref,
+            'cast': cast,
+            'Pointer': Pointer,
+            'void': void,
+        }
+        exec source in namespace, namespace
+
+        _release_functions[type] = jit('int64 -> void')(
+            namespace['__flypy_release__'])
+
+    return _release_functions[type]
+
+def release_function_address(type):
+    """Compile the release function for `type` and return its address"""
+    from flypy.pipeline import phase
+
+    if type not in _release_addresses:
+        release = release_function(type)
+        if release is None:
+            _release_addresses[type] = 0
+        else:
+            lfunc, env = phase.apply_phase(phase.codegen, release, (int64,),
+                                           'cpu')
+            cfunc = env["codegen.llvm.ctypes"]
+            address = ctypes.cast(cfunc, ctypes.c_void_p).value
+            _release_addresses[type] = address
+
+    return _release_addresses[type]
+
+def release_function_symbol(type):
+    """External symbol for the release function for `type`, if any"""
+    address = release_function_address(type)
+    if address:
+        return relocation(".flypy.gc.release.%s" % (type_name(type),), address)
+
+release_address = symbol_constant("release_address", release_function_symbol)
+
+#===------------------------------------------------------------------===
+# Objects from Python
+#===------------------------------------------------------------------===
+
+_containers = {}
+
+def toctypes(struct):
+    """
+    Build a pointer to a copy of ctypes struct `struct` with an object
+    header. The reference count starts at 1 for the reference held by the
+    pointer, so compiled code never releases it.
+    """
+    cty = type(struct)
+    if cty not in _containers:
+        class Container(ctypes.Structure):
+            _fields_ = [('header', ctypes.c_int64 * HEADER_WORDS),
+                        ('obj', cty)]
+        _containers[cty] = Container
+
+    container = _containers[cty]()
+    container.header[REFCOUNT] = 1
+    container.obj = struct
+    return ctypes.pointer(container.obj)
+
+#===------------------------------------------------------------------===
+# GC interface
+#===------------------------------------------------------------------===
+
+@jit
+def gc_collect():
+    boehm.gc_collect()
+
+@jit
+def gc_disable():
+    boehm.gc_disable()
+
+@jit
+def gc_enable():
+    boehm.gc_enable()
+
+@jit('Pointer[void] -> Pointer[void] -> void')
+def gc_add_finalizer(obj, finalizer):
+    object_header(obj)[FINALIZER] = cast(finalizer, int64)
+
+def stats():
+    """Return collector statistics, see flypy.gc.stats()"""
+    return boehm.stats()
+
+#===------------------------------------------------------------------===
+# Low-level implementations
+#===------------------------------------------------------------------===
+
+release_type = ptypes.Function(ptypes.Void, (ptypes.Int64,), False)
+
+def implement_call_release(builder, argtypes, release, obj):
+    f = builder.convert(ptypes.Pointer(release_type), release)
+    builder.call(ptypes.Void, f, [obj])
+    builder.ret(None)
+
+add_impl(call_release, "call_release", implement_call_release, ptypes.Void)
+
+def restype_null(argtypes):
+    [argtype] = argtypes
+    return lltype(argtype.parameters[0])
+
+def implement_null(builder, argtypes, type):
+    restype = restype_null(argtypes)
+    builder.ret(builder.convert(restype, ir.Const(0, ptypes.Int64)))
+
+add_impl(null, "null", implement_null, restype_func=restype_null)
@@ -4,43 +4,74 @@
 Root finding on the stack. Here we are using simple Henderson shadow stacks [0].
 Later, we probably want to use LLVM stack maps.
 
+Every function that holds heap references across calls pushes a frame on
+the shadow stack (see flypy.compiler.backend.shadowstack). A frame is a
+stack-allocated array of words:
+
+    prev            address of the previous frame, or 0
+    n               number of roots
+    trace_0         address of the trace function for root 0
+    address_0       address of the slot holding root 0, or 0 if unused
+    ...
+    trace_n-1
+    address_n-1
+    slots           slots for roots held in registers
+
+Note that we could generate a trace function for each function that
+hold heap pointers, but we consider that too expensive. We instead
+generate a table containing a trace function for each root. A slot may
+also point into a stack-allocated value, which holds heap references in
+its fields.
+
 [0]: Accurate Garbage Collection in an Uncooperative Environment,
      Fergus Henderson, 2002
 """
 
 from __future__ import print_function, division, absolute_import
 
-from flypy import jit, sjit, cast, sizeof, NULL
+from flypy import jit
+from flypy.types import Pointer, int64
+from flypy.runtime.ffi import cast
+from flypy.runtime.lowlevel_impls import add_impl
+
+from pykit import types as ptypes
+
+# Word offsets in a frame
+PREV    = 0
+NROOTS  = 1
+ROOTS   = 2
+
+#===------------------------------------------------------------------===
+# Root tracing
+#===------------------------------------------------------------------===
+
+@jit('Pointer[int64] -> void')
+def trace_roots(frame):
+    """Trace all roots on the stack, updating the slots with the new objects"""
+    while frame.ptrtoint() != 0:
+        n = frame[NROOTS]
+        for i in range(n):
+            trace = frame[ROOTS + 2 * i]
+            address = frame[ROOTS + 2 * i + 1]
+            if address != 0:
+                slot = cast(address, Pointer[int64])
+                slot[0] = call_trace(trace, slot[0])
 
+        frame = cast(frame[PREV], Pointer[int64])
 
-@sjit
-class StackFrame(object):
-    """
-    Stack-allocated frame holding roots and per-type traverse functions.
 
-    Note that we could generate a trace function for each function that
-    hold heap pointers, but we consider that too expensive. We instead
-    generate a table containing a trace function for each root.
-    """
+@jit('int64 -> int64 -> int64', opaque=True)
+def call_trace(trace, obj):
+    raise NotImplementedError("Not implemented at the python level")
 
-    layout = [
-        ('prev',        'Pointer[StackFrame[]]'),
-        ('n',           'int64'),
-        ('trace_funcs', 'Pointer[Pointer[void]]'),
-        ('roots',       'Pointer[Pointer[void]]'),
-    ]
+#===------------------------------------------------------------------===
+# Low-level implementations
+#===------------------------------------------------------------------===
 
+trace_type = ptypes.Function(ptypes.Int64, (ptypes.Int64,), False)
 
-@jit('Pointer[StackFrame[]] -> r')
-def find_roots(top_frame):
-    """Find all roots in the stack along with their trace functions"""
-    while top_frame != NULL:
-        roots = top_frame[0].roots
-        trace_funcs = top_frame[0].trace_funcs
-        for i in range(len(roots)):
-            if trace_funcs[i] == NULL:
-                break
-            if roots[i] != NULL:
-                yield roots[i], trace_funcs[i]
+def implement_call_trace(builder, argtypes, trace, obj):
+    f = builder.convert(ptypes.Pointer(trace_type), trace)
+    builder.ret(builder.call(ptypes.Int64, f, [obj]))
 
-        top_frame = top_frame[0].prev
\ No newline at end of file
+add_impl(call_trace, "call_trace", implement_call_trace, ptypes.Int64)
@@ -1,28 +1,576 @@
 # -*- coding: utf-8 -*-
 
 """
-Semi-space copying collector.
+Semi-space copying collector. Select it with
+
+    flypy.gc.impl = "semispace"
+
+before compiling any code.
+
+Objects are allocated by bumping a pointer through the current semi-space
+(fromspace). The fast path of `gc_alloc` is inlined at allocation sites.
+When fromspace is full, we copy all objects reachable from the roots to the
+other semi-space (tospace), and swap the two.
+
+Objects are not tagged with their type. Instead, we generate a trace
+function for each type (see `trace_function`), and every function holding
+heap references across calls registers its roots on a shadow stack along
+with their trace functions (see roots.py). A trace function copies the
+object, leaves a forwarding pointer in the old copy and traces its children:
+
+    @jit('int64 -> int64')
+    def __flypy_trace__(obj):
+        if not in_fromspace(obj):
+            return obj
+        if forwarded(obj):
+            return forwarding_address(obj)
+        obj = copy(obj, 24)
+        p = cast(obj + 8, Pointer[int64])
+        p[0] = trace_0(p[0])
+        return obj
+
+We support tagless representations, so any word in an object may look like
+a forwarding pointer. We therefore keep a forwarding table with a byte for
+each word in fromspace, which marks the objects that were copied.
+
+Finalizers run after a collection for objects that were not copied.
 """
 
 from __future__ import print_function, division, absolute_import
 import ctypes
-
-from flypy import jit, sjit, cast, sizeof, NULL
-from flypy.runtime.obj.core import newbuffer, Buffer, Pointer, head, tail
-from flypy.lib.bitvector import BitVector
-from flypy.types import void, int8, int64, uint64
+import textwrap
+
+from flypy import jit, ijit, cjit, sjit, conversion, errors
+from flypy.representation import stack_allocate, c_primitive
+from flypy.runtime.ffi import sizeof, objectsize, cast, symbol_pointer
+from flypy.extern_support import relocation, type_name
+from flypy.runtime.lib import libc
+from flypy.runtime.obj.core import newbuffer, Buffer, Pointer
+from flypy.runtime.lowlevel_impls import add_impl
+from flypy.types import void, int8, int64
 from . import roots
 
+from pykit import types as ptypes
+
 ptr_size  = ctypes.sizeof(ctypes.c_void_p)
 
+# Alignment of objects in the heap
+ALIGNMENT = ptr_size
+
+INITIAL_HEAP_SIZE = 1024**2
+
 # live data / heap size ratio threshold to increase heap size
 # TODO: Research good parameters
-OCCUPATION_THRESHOLD_LO = 0.25
 OCCUPATION_THRESHOLD_HI = 0.7
 
 # how much to grow the heap when OCCUPATION_THRESHOLD is exceeded
 GROW_FACTOR = 2
-SHRINK_FACTOR = 2
+
+#===------------------------------------------------------------------===
+# Heap state
+#===------------------------------------------------------------------===
+
+# The state of the heap is shared by all compiled code. It is an array of
+# words at a fixed address, zero-initialized:
+OFFSET      = 0     # bump pointer in fromspace
+TOP         = 1     # end of fromspace
+BOTTOM      = 2     # start of fromspace
+TOSPACE     = 3     # start of tospace
+SIZE        = 4     # size of the semi-spaces
+FORWARDING  = 5     # forwarding table, a byte for each word in fromspace
+COPY        = 6     # bump pointer in tospace during collection
+FRAME       = 7     # top of the shadow stack
+DISABLED    = 8     # whether collection is disabled
+FINALIZERS  = 9     # array of (object, finalizer) pairs
+NFINALIZERS = 10
+FINALIZERS_CAPACITY = 11
+COLLECTIONS = 12    # number of collections
+LIVE        = 13    # bytes copied by the last collection
+PAUSE_TIME  = 14    # total time spent in collections, in nanoseconds
+MAX_PAUSE_TIME = 15 # longest collection, in nanoseconds
+TIMESPEC    = 16    # struct timespec filled by clock_gettime, 2 words
+NSTATE      = 18
+
+# Collections are timed with the monotonic clock, in wall-clock time
+CLOCK_MONOTONIC = 1
+NANOSECONDS_PER_SEC = 1000000000
+
+_state = (ctypes.c_int64 * NSTATE)()
+state_address = ctypes.addressof(_state)
+state_symbol = relocation(".flypy.runtime.gc.semispace.state", state_address,
+                          size=ctypes.sizeof(_state))
+state_pointer = symbol_pointer("heap_state_pointer", state_symbol)
+
+@ijit
+def heap_state():
+    return state_pointer(int64)
+
+#===------------------------------------------------------------------===
+# Allocation
+#===------------------------------------------------------------------===
+
+@ijit('int64 -> Type[a] -> Pointer[void]')
+def gc_alloc(items, type):
+    """Allocate an array of `items` values of `type`"""
+    return allocate(object_size(items * sizeof(type)))
+
+@ijit('Type[a] -> Pointer[void]')
+def gc_alloc_object(type):
+    """Allocate the storage of an object of `type`"""
+    return allocate(object_size(objectsize(type)))
+
+@ijit('int64 -> Pointer[void]')
+def allocate(size):
+    state = heap_state()
+    obj = state[OFFSET]
+    if obj + size > state[TOP]:
+        return gc_alloc_slow(size)
+
+    state[OFFSET] = obj + size
+    return cast(obj, Pointer[void])
+
+@jit('int64 -> Pointer[void]')
+def gc_alloc_slow(size):
+    """
+    Allocate `size` bytes when fromspace is full. Returns NULL if we run out
+    of memory.
+    """
+    state = heap_state()
+    if state[BOTTOM] == 0:
+        init_heap(state, align(size, INITIAL_HEAP_SIZE))
+    else:
+        collect(state, size)
+
+    obj = state[OFFSET]
+    if obj + size > state[TOP]:
+        return cast(0, Pointer[void])
+
+    state[OFFSET] = obj + size
+    return cast(obj, Pointer[void])
+
+@ijit('int64 -> int64', eval_if_const=True)
+def object_size(size):
+    """Size of an object in the heap, which must hold a forwarding pointer"""
+    if size < ALIGNMENT:
+        return ALIGNMENT
+    return align(size, ALIGNMENT)
+
+@jit('int64 -> int64 -> int64', eval_if_const=True)
+def align(size, alignment):
+    "Round `size` up to a multiple of `alignment`"
+    offset = size % alignment
+    if offset > 0:
+        size += alignment - offset
+    return size
+
+@jit('Pointer[int64] -> int64 -> void')
+def init_heap(state, size):
+    set_fromspace(state, new_space(size), size)
+    state[TOSPACE] = new_space(size)
+    state[FORWARDING] = new_space(size // ALIGNMENT)
+
+@jit('Pointer[int64] -> int64 -> int64 -> void')
+def set_fromspace(state, space, size):
+    state[BOTTOM] = space
+    state[OFFSET] = space
+    state[TOP] = space + size
+    state[SIZE] = size
+
+@jit('int64 -> int64')
+def new_space(size):
+    """Allocate zero-initialized memory"""
+    return cast(libc.calloc(size, 1), int64)
+
+@jit('int64 -> void')
+def free_space(space):
+    libc.free(cast(space, Pointer[void]))
+
+@jit('int64 -> int64 -> void')
+def clear_space(space, size):
+    libc.memset(cast(space, Pointer[void]), 0, size)
+
+#===------------------------------------------------------------------===
+# Collection
+#===------------------------------------------------------------------===
+
+@jit('Pointer[int64] -> int64 -> void')
+def collect(state, size):
+    """
+    Collect garbage by copying all live data to tospace, starting with the
+    roots on the shadow stack. If there is little garbage, or the request
+    for `size` bytes cannot be satisfied, grow the heap.
+    """
+    heap_size = state[SIZE]
+    if state[DISABLED] == 0:
+        live = copy_live_objects(state, heap_size)
+        if live + size <= heap_size * OCCUPATION_THRESHOLD_HI:
+            return
+    else:
+        live = heap_size
+
+    new_size = heap_size * GROW_FACTOR
+    if new_size < (live + size) * GROW_FACTOR:
+        new_size = (live + size) * GROW_FACTOR
+    copy_live_objects(state, align(new_size, ALIGNMENT))
+
+@jit('Pointer[int64] -> int64 -> int64')
+def copy_live_objects(state, new_size):
+    """
+    Copy all reachable objects to a tospace of `new_size` bytes and make it
+    the new fromspace. Returns the number of bytes copied.
+    """
+    start = monotonic_time(state)
+    heap_size = state[SIZE]
+    fromspace = state[BOTTOM]
+    tospace = state[TOSPACE]
+    if new_size != heap_size:
+        free_space(tospace)
+        tospace = new_space(new_size)
+
+    # Copy live data
+    state[COPY] = tospace
+    roots.trace_roots(cast(state[FRAME], Pointer[int64]))
+    run_finalizers(state)
+    live = state[COPY] - tospace
+
+    # Swap spaces, and clear the old fromspace for future allocation
+    set_fromspace(state, tospace, new_size)
+    state[OFFSET] = tospace + live
+    if new_size != heap_size:
+        free_space(fromspace)
+        free_space(state[FORWARDING])
+        state[TOSPACE] = new_space(new_size)
+        state[FORWARDING] = new_space(new_size // ALIGNMENT)
+    else:
+        clear_space(fromspace, heap_size)
+        clear_space(state[FORWARDING], heap_size // ALIGNMENT)
+        state[TOSPACE] = fromspace
+
+    # Update statistics
+    pause = monotonic_time(state) - start
+    state[COLLECTIONS] = state[COLLECTIONS] + 1
+    state[LIVE] = live
+    state[PAUSE_TIME] = state[PAUSE_TIME] + pause
+    if pause > state[MAX_PAUSE_TIME]:
+        state[MAX_PAUSE_TIME] = pause
+
+    return live
+
+@jit('Pointer[int64] -> int64')
+def monotonic_time(state):
+    """Time of the monotonic clock, in nanoseconds"""
+    timespec = state + TIMESPEC
+    libc.clock_gettime(CLOCK_MONOTONIC, timespec)
+    return timespec[0] * NANOSECONDS_PER_SEC + timespec[1]
+
+@jit('int64 -> bool')
+def in_fromspace(obj):
+    state = heap_state()
+    return state[BOTTOM] <= obj and obj < state[TOP]
+
+@jit('int64 -> bool')
+def forwarded(obj):
+    """Whether this object was copied to tospace"""
+    return forwarding_entry(obj)[0] != 0
+
+@jit('int64 -> int64')
+def forwarding_address(obj):
+    return cast(obj, Pointer[int64])[0]
+
+@jit('int64 -> Pointer[int8]')
+def forwarding_entry(obj):
+    state = heap_state()
+    table = cast(state[FORWARDING], Pointer[int8])
+    return table + (obj - state[BOTTOM]) // ALIGNMENT
+
+@jit('int64 -> int64 -> int64')
+def copy(obj, size):
+    """
+    Copy the object (excluding its children!) to tospace.
+
+    This writes a forwarding pointer in fromspace after having copied the
+    object, and remembers doing so by marking the entry corresponding to
+    the object in the forwarding table.
+    """
+    state = heap_state()
+    dst_obj = state[COPY]
+    state[COPY] = dst_obj + size
+    libc.memcpy(cast(dst_obj, Pointer[void]), cast(obj, Pointer[void]), size)
+
+    cast(obj, Pointer[int64])[0] = dst_obj
+    forwarding_entry(obj)[0] = cast(1, int8)
+
+    return dst_obj
+
+#===------------------------------------------------------------------===
+# Finalizers
+#===------------------------------------------------------------------===
+
+@jit('Pointer[int64] -> void')
+def run_finalizers(state):
+    """
+    Run the finalizers of objects that were not copied, and update the
+    addresses of objects that were.
+    """
+    finalizers = cast(state[FINALIZERS], Pointer[int64])
+    n = state[NFINALIZERS]
+    live = 0
+    for i in range(n):
+        obj = finalizers[2 * i]
+        finalizer = finalizers[2 * i + 1]
+        if not in_fromspace(obj):
+            continue
+        if forwarded(obj):
+            finalizers[2 * live] = forwarding_address(obj)
+            finalizers[2 * live + 1] = finalizer
+            live += 1
+        else:
+            call_finalizer(finalizer, obj)
+
+    state[NFINALIZERS] = live
+
+@jit('int64 -> int64 -> void', opaque=True)
+def call_finalizer(finalizer, obj):
+    raise NotImplementedError("Not implemented at the python level")
+
+#===------------------------------------------------------------------===
+# GC interface
+#===------------------------------------------------------------------===
+
+@cjit
+def gc_collect():
+    state = heap_state()
+    if state[BOTTOM] != 0:
+        copy_live_objects(state, state[SIZE])
+
+@cjit
+def gc_disable():
+    heap_state()[DISABLED] = 1
+
+@cjit
+def gc_enable():
+    heap_state()[DISABLED] = 0
+
+@cjit('Pointer[void] -> Pointer[void] -> void')
+def gc_add_finalizer(obj, finalizer):
+    state = heap_state()
+    n = state[NFINALIZERS]
+    if n == state[FINALIZERS_CAPACITY]:
+        capacity = n * 2 + 16
+        p = libc.realloc(cast(state[FINALIZERS], Pointer[void]),
+                         capacity * 2 * ptr_size)
+        state[FINALIZERS] = cast(p, int64)
+        state[FINALIZERS_CAPACITY] = capacity
+
+    finalizers = cast(state[FINALIZERS], Pointer[int64])
+    finalizers[2 * n] = cast(obj, int64)
+    finalizers[2 * n + 1] = cast(finalizer, int64)
+    state[NFINALIZERS] = n + 1
+
+def stats():
+    """Return collector statistics, see flypy.gc.stats()"""
+    allocated = _state[OFFSET] - _state[BOTTOM]
+    return {
+        'heap_size':        _state[SIZE] * 2,
+        'bytes_since_gc':   max(allocated - _state[LIVE], 0),
+        'collections':      _state[COLLECTIONS],
+        'pause_time':       _state[PAUSE_TIME] / NANOSECONDS_PER_SEC,
+        'max_pause_time':   _state[MAX_PAUSE_TIME] / NANOSECONDS_PER_SEC,
+        'finalizers':       _state[NFINALIZERS],
+    }
+
+#===------------------------------------------------------------------===
+# Trace functions
+#===------------------------------------------------------------------===
+
+_trace_functions = {}
+_trace_addresses = {}
+
+def is_heap_type(type):
+    """Whether values of `type` are references to objects in the heap"""
+    return (not stack_allocate(type) and
+            not hasattr(type.impl, 'ctype') and
+            type.resolved_layout is not None)
+
+def is_struct_type(type):
+    """Whether values of `type` are stack-allocated aggregates"""
+    return (stack_allocate(type) and not c_primitive(type) and
+            not hasattr(type.impl, 'ctype') and
+            bool(type.resolved_layout))
+
+def reference_fields(type, cty=None, offset=0):
+    """
+    Find the heap references in a value of `type`, including those in
+    fields of stack-allocated aggregates. Returns [(offset, type)].
+    """
+    if cty is None:
+        cty = conversion.ctype(type)
+        if not stack_allocate(type):
+            cty = cty._type_ # Get the base type
+
+    fields = []
+    for name, fieldtype in type.resolved_layout.items():
+        field_offset = offset + getattr(cty, name).offset
+        if is_heap_type(fieldtype):
+            fields.append((field_offset, fieldtype))
+        elif is_struct_type(fieldtype):
+            fields.extend(reference_fields(fieldtype,
+                                           conversion.ctype(fieldtype),
+                                           field_offset))
+
+    return sorted(fields)
+
+def untraced_references(type, seen=None):
+    """
+    Whether values of `type` point to memory outside the heap that holds
+    heap references, like the storage of Buffers and Lists of objects. We
+    don't know the extent of such memory, so we can't trace it.
+    """
+    if seen is None:
+        seen = set()
+    if type in seen:
+        return False
+    seen.add(type)
+
+    if type.impl == Pointer:
+        base = type.parameters[0]
+        return (is_heap_type(base) or
+                (is_struct_type(base) and bool(reference_fields(base))) or
+                untraced_references(base, seen))
+    elif is_heap_type(type) or is_struct_type(type):
+        return any(untraced_references(fieldtype, seen)
+                       for fieldtype in type.resolved_layout.values())
+    return False
+
+def check_traced(type):
+    """
+    Raise a CompileError if values of `type` refer to heap objects that the
+    collector can't trace, see `untraced_references`.
+    """
+    if untraced_references(type):
+        raise errors.CompileError(
+            "The semispace collector cannot trace heap references stored "
+            "outside the heap, in values of type %s" % (type,))
+
+def trace_function(type):
+    """Generate the trace function for objects of heap type `type`"""
+    if type not in _trace_functions:
+        check_traced(type)
+        cty = conversion.ctype(type)._type_
+        fields = reference_fields(type)
+
+        stmts = []
+        for i, (offset, fieldtype) in enumerate(fields):
+            stmts.append("p = cast(obj + %d, Pointer[int64])" % (offset,))
+            stmts.append("p[0] = trace_%d(p[0])" % (i,))
+
+        source = textwrap.dedent("""
+        def __flypy_trace__(obj):
+            if not in_fromspace(obj):
+                return obj
+            if forwarded(obj):
+                return forwarding_address(obj)
+            obj = copy(obj, %d)
+            %s
+            return obj
+        """) % (object_size.py_func(ctypes.sizeof(cty)),
+                "\n    ".join(stmts))
+
+        namespace = {
+            'in_fromspace': in_fromspace,
+            'forwarded': forwarded,
+            'forwarding_address': forwarding_address,
+            'copy': copy,
+            'cast': cast,
+            'Pointer': Pointer,
+            'int64': int64,
+        }
+        exec source in namespace, namespace
+
+        trace = jit('int64 -> int64')(namespace['__flypy_trace__'])
+        _trace_functions[type] = trace
+
+        # Resolve the trace functions of the children, which may refer
+        # back to this one
+        for i, (offset, fieldtype) in enumerate(fields):
+            namespace['trace_%d' % i] = trace_function(fieldtype)
+
+    return _trace_functions[type]
+
+def trace_address(type):
+    """Compile the trace function for `type` and return its address"""
+    from flypy.pipeline import phase
+
+    if type not in _trace_addresses:
+        trace = trace_function(type)
+        lfunc, env = phase.apply_phase(phase.codegen, trace, (int64,), 'cpu')
+        cfunc = env["codegen.llvm.ctypes"]
+        _trace_addresses[type] = ctypes.cast(cfunc, ctypes.c_void_p).value
+
+    return _trace_addresses[type]
+
+def trace_symbol(type):
+    """External symbol for the trace function of `type`"""
+    return relocation(".flypy.gc.trace.%s" % (type_name(type),),
+                      trace_address(type))
+
+#===------------------------------------------------------------------===
+# Roots held by Python
+#===------------------------------------------------------------------===
+
+def python_frame(values):
+    """
+    Build a shadow stack frame (see flypy.runtime.gc.roots) registering the
+    heap references in objects passed from Python, given as
+    [(ctypes value, type)]. These objects live outside the heap, so the
+    collector doesn't trace them, but compiled code may store heap objects
+    in their fields. Objects returned to Python are converted to Python
+    values before any further collection (see FunctionWrapper.__call__).
+    """
+    entries = []
+    seen = set()
+    for value, type in values:
+        if is_heap_type(type):
+            address = ctypes.cast(value, ctypes.c_void_p).value
+        elif is_struct_type(type):
+            address = ctypes.addressof(value)
+        else:
+            continue
+        python_roots(address, type, entries, seen)
+
+    frame = (ctypes.c_int64 * (roots.ROOTS + 2 * len(entries)))()
+    frame[roots.NROOTS] = len(entries)
+    for i, (trace, address) in enumerate(entries):
+        frame[roots.ROOTS + 2 * i] = trace
+        frame[roots.ROOTS + 2 * i + 1] = address
+    return frame
+
+def python_roots(address, type, entries, seen):
+    """
+    Register the reference fields of the object or aggregate of `type` at
+    `address`, and of the objects outside the heap they refer to.
+    """
+    for offset, fieldtype in reference_fields(type):
+        slot = address + offset
+        entries.append((trace_address(fieldtype), slot))
+
+        obj = ctypes.c_int64.from_address(slot).value
+        in_heap = _state[BOTTOM] <= obj < _state[TOP]
+        if obj and not in_heap and obj not in seen:
+            seen.add(obj)
+            python_roots(obj, fieldtype, entries, seen)
+
+def push_frame(frame):
+    """Push a frame built by `python_frame` on the shadow stack"""
+    frame[roots.PREV] = _state[FRAME]
+    _state[FRAME] = ctypes.addressof(frame)
+
+def pop_frame(frame):
+    _state[FRAME] = frame[roots.PREV]
+
+#===------------------------------------------------------------------===
+# Bump allocator
+#===------------------------------------------------------------------===
 
 @sjit
 class BumpAllocator(object):
@@ -43,10 +591,10 @@ class BumpAllocator(object):
         self.offset = self.bottom()
         self._top = self.bottom() + initial_size
 
-    @jit('allocator -> size -> Pointer[int8]')
+    @jit('allocator -> int64 -> Pointer[int8]')
     def alloc(self, size):
         obj = self.offset
-        new_offset = align_pointer(obj + size, 8)
+        new_offset = align_pointer(obj + size, ALIGNMENT)
         if new_offset > self.top():
             return cast(0, Pointer[int8])
 
@@ -84,171 +632,7 @@ class BumpAllocator(object):
 def occupation(allocator, offset):
     total = allocator.top() - allocator.bottom()
     occupied = offset - allocator.bottom()
-    return total / float(occupied)
-
-
-@sjit
-class GC(object):
-    """
-    Simple semi-space copying GC
-
-        fromspace:
-            heap we are currently allocating objects in
-        tospace:
-            heap to copy live data to when fromspace is full
-        forwarding_table:
-            vector of bits, indicating for each pointer-sized word whether
-            it contains a forwarding pointer. See the 'copy' method for
-            an additional explanation
-    """
-
-    layout = [
-        ('fromspace', 'BumpAllocator[]'),
-        ('tospace',   'BumpAllocator[]'),
-        ('forwarding_table', 'BitVector[]'),
-    ]
-
-    @jit
-    def __init__(self, initial_size=1024**2):
-        self.fromspace = BumpAllocator(initial_size)
-        self.tospace = BumpAllocator(initial_size)
-        self.init_forwarding_table()
-        #self.finalizers = {}
-
-    @jit
-    def init_forwarding_table(self):
-        """Initialize an empty forwarding table for the heap"""
-        self.forwarding_table = BitVector(self.fromspace.size())
-
-    @jit('gc -> Pointer[int8] -> int64')
-    def offset(self, obj):
-        """Offset of object in heap, used for marking forwarded objects"""
-        return (obj - self.fromspace.bottom()) >> ptr_size
-
-    @jit('gc -> Pointer[int8] -> uint64')
-    def forwarded(self, obj):
-        """Whether this object was copied to tospace"""
-        return self.offset(obj) in self.forwarding_table
-
-    @jit('allocator -> size -> Pointer[int8]')
-    def alloc(self, size, top_of_stack):
-        obj = self.fromspace.alloc(size)
-        if obj == NULL:
-            # fromspace is full, collect garbage
-            self.collect(size, top_of_stack)
-            obj = self.fromspace.alloc(size)
-            # assert obj != NULL # MemoryError should have been raised by
-            #                    # collect, unless `obj` really is too large
-
-        return obj
-
-    @jit('gc -> int64 -> Pointer[StackFrame[]] -> void')
-    def collect(self, size, top_of_stack):
-        """
-        Collect garbage by copying all live data to tospace, starting with
-        `roots`. If there is no or little garbage and we're running out of heap
-        space, grow the heap. `size` indicates the size of the requested memory.
-
-        This method may raise MemoryError.
-
-        For every root, we determine the trace function and call it on the root.
-        The trace function traces the object itself (since only it knows its
-        size), and traces its children:
-
-            def __flypy_trace__(self, gc):
-                obj = gc.trace((int8 *) self, sizeof(self))
-                obj.field1 = obj.field1.trace(gc)
-                ...
-                obj.fieldN = obj.fieldN.trace(gc)
-                return obj
-        """
-        # Copy all live data
-        for item in roots.find_roots(top_of_stack):
-            obj = head(item)
-            trace = head(tail(item))
-            trace(obj)
-
-        # Swap spaces and adjust heap if necessary
-        self.fromspace, self.tospace = self.tospace, self.fromspace
-        if self.resize_heap(size):
-            self.init_forwarding_table()
-        else:
-            self.forwarding_table.clear()
-
-    @jit
-    def resize_heap(self, mininum_size):
-        """
-        Adjust heap size based on occupation ratio.
-        Returns True if the heap got resized.
-
-        NOTE: This may raise MemoryError
-        """
-        ratio = occupation(self.fromspace, self.fromspace.offset + mininum_size)
-        size = self.fromspace.size() + mininum_size
-        if ratio > OCCUPATION_THRESHOLD_HI:
-            self.fromspace.resize(int(size * GROW_FACTOR))
-        elif ratio < OCCUPATION_THRESHOLD_LO:
-            self.fromspace.resize(int(size / GROW_FACTOR))
-        else:
-            return False
-
-        return True
-
-    @jit('gc -> Pointer[int8] -> int64 -> Pointer[int8]')
-    def trace(self, obj, size, trace_children):
-        """
-        Mark the reachable object.  We first check if the object is already
-        copied, in which case we're done. Otherwise, we copy the object to the
-        tospace, and we trace the children. The copy operation will mark
-        the object as copied in the forwarding table.
-
-        We call __flypy_trace__ to mark GC-tracked children. This method
-        is automatically generated, and allows us to avoid type tagging values
-        to determine pointer locations. It also patches pointers to copied
-        objects.
-        """
-        #assert self.fromspace.bottom() <= obj < self.fromspace.top
-
-        if self.forwarded(obj):
-            # Object already copied, use forwarding pointer
-            forward_ptr_ptr = cast(obj, Pointer[Pointer[int8]])
-            dst_obj = forward_ptr_ptr[0]
-            return dst_obj
-
-        copied_obj = self.copy(obj, size)
-        trace_children(copied_obj)
-
-        return copied_obj
-
-    @jit('gc -> Pointer[int8] -> int64 -> Pointer[int8]')
-    def copy(self, obj, size):
-        """
-        Copy the object (excluding its children!) to the tospace.
-
-        This writes a forwarding pointer in the fromspace after having
-        copied the object, and remembers doing so by writing a bit in the
-        forwarding table corresponding to the offset of the object.
-
-        We could determine the forwarding address for any object that has
-        pointers using the type, for instance by overwriting the first pointer
-        in the object with the new pointer, and checking in which address space
-        that pointer points.
-
-        However, we support tagless representations, and we may not have any
-        reference, like a mutable value with only integers. We cannot
-        safely determine whether an overwritten location is a forwarding
-        address, or actually a value that happens to fall in the range
-        of the to-space.
-        """
-        dst_obj = self.tospace.alloc(size, type)
-        memcpy(obj, dst_obj, size)
-
-        forward_ptr_ptr = cast(obj, Pointer[Pointer[int8]])
-        forward_ptr_ptr[0] = dst_obj
-        self.forwarding_table.mark(self.offset(obj))
-
-        return dst_obj
-
+    return occupied / float(total)
 
 
 @jit('Pointer[int8] -> int64 -> Pointer[int8]')
@@ -260,15 +644,16 @@ def align_pointer(p, alignment):
         i += alignment - offset
     return cast(i, Pointer[int8])
 
+#===------------------------------------------------------------------===
+# Low-level implementations
+#===------------------------------------------------------------------===
 
-@jit('Pointer[void] -> Pointer[void] -> int64 -> void')
-def memcpy(src, dst, size):
-    """
-    Copy `size` bytes from `src` to `dst`
+finalizer_type = ptypes.Function(ptypes.Void, (ptypes.Int64,), False)
 
-    Note that the memory of src and dst may not overlap!
-    """
-    src = cast(src, Pointer[int8])
-    dst = cast(dst, Pointer[int8])
-    for i in range(size):
-        dst[i] = src[i]
+def implement_call_finalizer(builder, argtypes, finalizer, obj):
+    f = builder.convert(ptypes.Pointer(finalizer_type), finalizer)
+    builder.call(ptypes.Void, f, [obj])
+    builder.ret(None)
+
+add_impl(call_finalizer, "call_finalizer", implement_call_finalizer,
+         ptypes.Void)
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+"""
+Allocation counters for allocation sites, enabled with
+
+    flypy.gc.count_allocations = True
+
+Each site increments its counter when it allocates an object on the heap.
+Counters are referenced by symbols named after their site, see
+flypy.extern_support.relocation.
+"""
+
+from __future__ import print_function, division, absolute_import
+import ctypes
+
+from flypy import ijit
+from flypy.extern_support import relocation
+from flypy.types import Pointer, int64
+from flypy.runtime.ffi import cast
+
+# { (function name, line number, type) : ctypes.c_int64 }
+_counters = {}
+
+def counter_address(site):
+    """Return the address of the counter for allocation site `site`"""
+    if site not in _counters:
+        _counters[site] = ctypes.c_int64(0)
+    return ctypes.addressof(_counters[site])
+
+def counter_symbol(site):
+    """Return the external symbol for the counter of allocation site `site`"""
+    return relocation(".flypy.gc.site.%s.%d.%s" % site, counter_address(site),
+                      size=ctypes.sizeof(ctypes.c_int64))
+
+@ijit('int64 -> void')
+def count_allocation(address):
+    counter = cast(address, Pointer[int64])
+    counter[0] = counter[0] + 1
+
+def counts():
+    return dict((site, counter.value) for site, counter in _counters.items())
+
+def reset():
+    for counter in _counters.values():
+        counter.value = 0
@@ -1,11 +1,25 @@
 # -*- coding: utf-8 -*-
 from __future__ import print_function, division, absolute_import
+import ctypes
 import unittest
 
+import flypy
 from flypy import jit, cast, typeof
 from flypy.types import Pointer, float64, int32, void
 from flypy.runtime.gc import boehm as gc
 
+@jit
+class Sparse(object):
+    layout = [('a', 'int64'), ('b', 'int64'), ('c', 'int64'),
+              ('p', 'Pointer[float64]')]
+
+    @jit
+    def __init__(self, a, p):
+        self.a = a
+        self.b = a
+        self.c = a
+        self.p = p
+
 class TestBoehm(unittest.TestCase):
 
     def test_boehm_direct(self):
@@ -23,6 +37,113 @@ class TestBoehm(unittest.TestCase):
 
         f(1000000)
 
+    def test_boehm_small(self):
+        @jit
+        def f(n):
+            p = gc.gc_alloc(1, int32)
+            for i in range(n):
+                q = gc.gc_alloc(3, float64)
+                q[2] = 1.0
+                if q == p:
+                    return False
+                p = q
+            return True
+
+        self.assertTrue(f(100000))
+
+    def test_size_class(self):
+        self.assertEqual(gc.size_class(1), 0)
+        self.assertEqual(gc.size_class(16), 0)
+        self.assertEqual(gc.size_class(17), 1)
+        self.assertEqual(gc.size_class(gc.MAX_BUFFERED_SIZE), gc.NCLASSES - 1)
+
+    def test_layout_kind(self):
+        self.assertEqual(gc.layout_kind(gc.item_ctype(float64)), gc.ATOMIC)
+        self.assertEqual(gc.layout_kind(gc.item_ctype(Pointer[float64])),
+                         gc.NORMAL)
+
+        cty = gc.object_ctype(Sparse.type)
+        self.assertEqual(gc.pointer_offsets(cty), [24])
+        self.assertEqual(gc.layout_kind(cty), gc.TYPED)
+        self.assertNotEqual(gc.layout_descriptor(cty), 0)
+
+    def test_boehm_atomic(self):
+        @jit
+        def f(n):
+            for i in range(n):
+                p = gc.gc_alloc(1024 * 1024, float64)
+                p = cast(p, Pointer[float64])
+                p[1024 * 1024 - 1] = 1.0
+
+        f(100)
+
+    def test_boehm_small_atomic(self):
+        @jit
+        def f(n):
+            total = 0.0
+            for i in range(n):
+                p = cast(gc.gc_alloc(4, float64), Pointer[float64])
+                total += p[3]
+                p[3] = 1.0
+            return total
+
+        # Atomic memory is not taken from the allocation buffers, which hold
+        # memory that is scanned, but is cleared like it
+        freelists = (ctypes.c_void_p * gc.NCLASSES).from_address(
+                                                        gc.freelists_address)
+        head = freelists[gc.size_class(32)]
+        self.assertEqual(f(10000), 0.0)
+        self.assertEqual(freelists[gc.size_class(32)], head)
+
+    def test_boehm_objects(self):
+        @jit
+        def make(i, p):
+            return Sparse(i, p)
+
+        @jit
+        def f(n):
+            p = cast(gc.gc_alloc(1, float64), Pointer[float64])
+            total = 0
+            for i in range(n):
+                total += make(i, p).c
+            return total
+
+        self.assertEqual(f(1000), sum(range(1000)))
+
+    def test_stats(self):
+        @jit
+        def f(n):
+            for i in range(n):
+                p = gc.gc_alloc(1000, float64)
+            gc.gc_collect()
+
+        collections = flypy.gc.stats()['collections']
+        f(10000)
+        stats = flypy.gc.stats()
+        self.assertGreater(stats['collections'], collections)
+        self.assertGreater(stats['heap_size'], 0)
+        self.assertGreaterEqual(stats['pause_time'], stats['max_pause_time'])
+
+    def test_allocation_counts(self):
+        flypy.gc.count_allocations = True
+        try:
+            @jit
+            def make(i, p):
+                return Sparse(i, p)
+
+            @jit
+            def f(n):
+                p = cast(gc.gc_alloc(1, float64), Pointer[float64])
+                for i in range(n):
+                    make(i, p)
+
+            f(100)
+        finally:
+            flypy.gc.count_allocations = False
+
+        counts = flypy.gc.allocation_counts()
+        self.assertIn(100, counts.values())
+
     def test_boehm_disable(self):
         @jit
         def f(n):
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+import ctypes
+import unittest
+
+import flypy
+from flypy import jit, cast
+from flypy.types import Pointer, int64
+from flypy.runtime.gc import refcount
+
+released = ctypes.c_int64(0)
+released_address = ctypes.addressof(released)
+
+@jit
+class Resource(object):
+    layout = [('value', 'int64')]
+
+    @jit
+    def __init__(self, value):
+        self.value = value
+
+    @jit
+    def __del__(self):
+        p = cast(released_address, Pointer[int64])
+        p[0] = p[0] + 1
+
+@jit
+class Holder(object):
+    layout = [('resource', 'Resource[]')]
+
+    @jit
+    def __init__(self, resource):
+        self.resource = resource
+
+@jit
+def make(value):
+    return Resource(value)
+
+
+class TestRefcount(unittest.TestCase):
+
+    def setUp(self):
+        flypy.gc.impl = "refcount"
+        released.value = 0
+
+    def tearDown(self):
+        flypy.gc.impl = "boehm"
+
+    def test_release(self):
+        @jit
+        def f(n):
+            for i in range(n):
+                r = Resource(i)
+
+        f(100)
+        self.assertEqual(released.value, 100)
+
+    def test_release_returned(self):
+        @jit
+        def f(n):
+            total = 0
+            for i in range(n):
+                total += make(i).value
+            return total
+
+        self.assertEqual(f(100), sum(range(100)))
+        self.assertEqual(released.value, 100)
+
+    def test_release_fields(self):
+        @jit
+        def f(n):
+            h = Holder(make(0))
+            for i in range(n):
+                h.resource = make(i)
+            return h.resource.value
+
+        self.assertEqual(f(10), 9)
+        self.assertEqual(released.value, 11)
+
+    def test_keep_alive(self):
+        @jit
+        def f():
+            h = Holder(make(0))
+            r = h.resource
+            h.resource = make(1)
+            return r.value
+
+        self.assertEqual(f(), 0)
+        self.assertEqual(released.value, 2)
+
+    def test_release_functions(self):
+        self.assertIsNone(refcount.release_function(Resource.type))
+        self.assertIsNotNone(refcount.release_function(Holder.type))
+
+
+if __name__ == '__main__':
+    unittest.main()
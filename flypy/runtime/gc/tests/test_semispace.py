@@ -1,15 +1,14 @@
 # -*- coding: utf-8 -*-
 from __future__ import print_function, division, absolute_import
-import random
 import ctypes
 import unittest
 
-from flypy import jit, cast, typeof, sizeof, NULL
-from flypy.types import Pointer, float64, int32, int64, void, struct_
+import flypy
+from flypy import jit, errors, NULL
+from flypy.types import int32
+from flypy.runtime.obj.core import Buffer
 from flypy.runtime.gc import semispace as gc
 
-import numpy as np
-
 A_layout =  [
     ('left', 'B[]'),
     ('right', 'int32'),
@@ -23,24 +22,12 @@ B_layout = [
 class A(object):
     layout = A_layout
 
-    @jit
-    def __flypy_trace(self, gc):
-        self = gc.trace(self, sizeof(self))
-        self.left = self.left.__flypy_trace(gc)
-
 @jit
 class B(object):
     layout = B_layout
 
-    @jit
-    def __flypy_trace(self, gc):
-        self = gc.trace(self, sizeof(self))
-
 ptrsize = ctypes.sizeof(ctypes.c_void_p)
 
-type_a = Pointer[struct_(A_layout)]
-type_b = Pointer[struct_(B_layout)]
-
 class TestBumpAllocator(unittest.TestCase):
 
     def test_alloc(self):
@@ -61,22 +48,110 @@ class TestBumpAllocator(unittest.TestCase):
 
 class TestSemiSpace(unittest.TestCase):
 
-    def test_alloc(self):
+    def setUp(self):
+        self.impl = flypy.gc.impl
+        flypy.gc.impl = "semispace"
+
+    def tearDown(self):
+        flypy.gc.impl = self.impl
+
+    def test_reference_fields(self):
+        [(offset, type)] = gc.reference_fields(A.type)
+        self.assertEqual(offset, 0)
+        self.assertEqual(type, B.type)
+        self.assertEqual(gc.reference_fields(B.type), [])
+
+    def test_untraced_references(self):
+        self.assertTrue(gc.untraced_references(Buffer[B.type]))
+        self.assertFalse(gc.untraced_references(Buffer[int32]))
+        self.assertFalse(gc.untraced_references(A.type))
+
+    def test_untraced_store(self):
         @jit
-        def f():
-            space = gc.GC(100)
+        def f(n):
+            items = [B(n), B(n + 1)]
+            gc.gc_collect()
+            return items[0].value
+
+        self.assertRaises(errors.CompileError, f, 1)
+
+    def test_collector_key(self):
+        @jit
+        def f(x):
+            return x + 1
 
-            a = space.alloc(sizeof(A.type))
-            b = space.alloc(sizeof(B.type))
+        self.assertEqual(f(1), 2)
+        flypy.gc.impl = "boehm"
+        self.assertEqual(f(1), 2)
+        impls = sorted(env['flypy.gc.impl'] for env in f.envs.values())
+        self.assertEqual(impls, ['boehm', 'semispace'])
 
-            a = cast(a, type_a)
-            b = cast(b, type_b)
+    def test_collect(self):
+        @jit
+        def f(n):
+            keep = A(B(10), 9)
+            a = keep
+            for i in range(n):
+                a = A(B(i), i)
+            gc.gc_collect()
+            return keep.left.value + keep.right + a.left.value
 
-            a.left = b
-            a.right = 9
-            b.value = 10
+        self.assertEqual(f(100000), 10 + 9 + 99999)
 
+    def test_returned_object(self):
+        @jit
+        def make(n):
+            return A(B(n), n + 1)
+
+        @jit
+        def churn(n):
+            for i in range(n):
+                A(B(i), i)
+            gc.gc_collect()
+
+        a = make(5)
+        churn(100000)
+        self.assertEqual(a.left.value, 5)
+        self.assertEqual(a.right, 6)
+
+    def test_python_argument(self):
+        @jit
+        def f(a, n):
+            a.left = B(n)
+            for i in range(n):
+                A(B(i), i)
+            gc.gc_collect()
+            return a.left.value
+
+        self.assertEqual(f(A(B(0), 0), 100000), 100000)
+
+    def test_pause_time(self):
+        @jit
+        def f():
+            gc.gc_collect()
+
+        stats = gc.stats()
+        f()
+        # Pauses are measured in wall-clock seconds
+        pause = gc.stats()['pause_time'] - stats['pause_time']
+        self.assertGreaterEqual(pause, 0)
+        self.assertLess(pause, 60)
+
+    def test_stats(self):
+        @jit
+        def f(n):
+            a = A(B(0), 0)
+            for i in range(n):
+                a = A(B(i), i)
+            gc.gc_collect()
 
+        collections = gc.stats()['collections']
+        f(100000)
+        stats = gc.stats()
+        self.assertGreater(stats['collections'], collections)
+        self.assertGreater(stats['heap_size'], 0)
+        self.assertGreaterEqual(stats['max_pause_time'], 0)
+        self.assertGreaterEqual(stats['pause_time'], stats['max_pause_time'])
 
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
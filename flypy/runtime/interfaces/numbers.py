@@ -5,6 +5,7 @@ Number interfaces.
 """
 
 from __future__ import print_function, division, absolute_import
+import math
 from functools import wraps
 
 from flypy import abstract, jit, ijit
@@ -20,16 +21,41 @@ def ojit(signature):
     """
     Simple helper that unboxes arguments and boxes results of opaque methods.
     These methods have external implementations assigned!
+
+    The wrapper also accepts plain Python numbers, which is what the constant
+    folder passes in when evaluating with constant arguments.
     """
     def decorator(f):
         @wraps(f)
         def wrapper(self, *args):
-            args = [self.unwrap()] + [x.unwrap() for x in args]
-            return self.wrap(f(*args))
+            args = [unwrap(self)] + [unwrap(x) for x in args]
+            result = f(*args)
+            if isinstance(self, Number):
+                result = self.wrap(result)
+            return result
         return jit(signature, opaque=True, inline=True, eval_if_const=True)(wrapper)
     return decorator
 
 
+def unwrap(x):
+    if isinstance(x, Number):
+        return x.unwrap()
+    return x
+
+
+def remainder(x, y):
+    """
+    Remainder with the sign of the dividend, as computed by the native
+    implementation (srem and frem), unlike Python's % operator.
+    """
+    if isinstance(x, float) or isinstance(y, float):
+        return math.fmod(x, y)
+    result = abs(x) % abs(y)
+    if x < 0:
+        return -result
+    return result
+
+
 @abstract
 class Number(object):
     """Interface for all numbers"""
@@ -77,7 +103,7 @@ class Number(object):
 
     @ojit('a -> a -> a')
     def __mod__(self, other):
-        return self % other
+        return remainder(self, other)
 
     @ojit('a -> a')
     def __invert__(self):
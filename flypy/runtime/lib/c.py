@@ -12,14 +12,19 @@ from flypy.extern_support import extern_cffi
 # Decls
 #===------------------------------------------------------------------===
 
-libc, libc_cffi = extern_cffi(".flypy.runtime.c", None, """
+# Use the real names, so LLVM recognizes the library functions
+libc, libc_cffi = extern_cffi(None, None, """
 void *malloc(size_t size);
+void *calloc(size_t nmemb, size_t size);
 void *realloc(void *ptr, size_t size);
 void free(void *ptr);
 int memcmp(void *s1, void *s2, size_t n);
+void *memcpy(void *dest, void *src, size_t n);
+void *memset(void *s, int c, size_t n);
 int printf(char *s, ...);
 int snprintf(char *str, size_t size, const char *format, ...);
 int puts(char *s);
 size_t strlen(char *s);
 unsigned long clock();
-""")
+int clock_gettime(int clk_id, long *tp);
+""", attributes={'memcmp': ('readonly',), 'strlen': ('readonly',)})
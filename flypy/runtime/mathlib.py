@@ -95,7 +95,7 @@ def declare(name, signatures, mathname=None):
     mathname = mathname or name.title()
 
     for signature in signatures:
-        @jit(signature, opaque=True)
+        @jit(signature, opaque=True, eval_if_const=True)
         def mathfunc(*args):
             return getattr(math, name)(*args) # pure python
 
@@ -6,11 +6,12 @@ Buffer objects.
 
 from __future__ import print_function, division, absolute_import
 
-from flypy import sjit, jit
+from flypy import sjit, jit, cjit
 import flypy
 import flypy.runtime
 from .core import Type, Pointer, Slice, counting_iterator
 from .sliceobject import normalize
+from .indexing import normalize_index
 
 # NOTE: There is a problem with the GC when Buffer is @jit, causing it it
 #       segfault (e.g. when building a list literal)
@@ -43,13 +44,13 @@ class Buffer(object):
     def __eq__(self, other):
         return False
 
-    @jit('Buffer[a] -> int64 -> a')
+    @cjit('Buffer[a] -> int64 -> a')
     def __getitem__(self, item):
-        return self.p[item]
+        return self.p[normalize_index(item, self.size)]
 
-    @jit('Buffer[a] -> int64 -> a -> void')
+    @cjit('Buffer[a] -> int64 -> a -> void')
     def __setitem__(self, item, value):
-        self.p[item] = value
+        self.p[normalize_index(item, self.size)] = value
 
     @jit('Buffer[a] -> Slice[x, y, z] -> a -> void')
     def __setitem__(self, s, value):
@@ -11,13 +11,16 @@ from .intobject import Int
 from .floatobject import Float
 from .complexobject import Complex
 from .sliceobject import Slice
-from .iterators import counting_iterator, CountingIterator
+from .iterators import (counting_iterator, CountingIterator,
+                        reversed_iterator, ReversedIterator, ZipIterator,
+                        EnumerateIterator, map_iterator, filter_iterator)
 from .tupleobject import (Tuple, StaticTuple, GenericTuple, head, tail,
                           EmptyTuple, make_tuple_type, extract_tuple_eltypes)
 from .listobject import List, EmptyList
-from .rangeobject import Range
+from .rangeobject import Range, RangeIterator
 from .noneobject import NoneType, NoneValue
 from .structobject import struct_
+from .structarrayobject import structarray, structarray_class
 from .dummy import Void, Function, ForeignFunction
 from .variantobject import make_variant
 from .bufferobject import Buffer, newbuffer, fromseq, copyto
@@ -2,25 +2,97 @@
 
 """
 Generator implementation.
+
+Generators that are not fused with the loop consuming them (see
+flypy.compiler.lower.generators) are compiled to generator objects. The
+generator function is rewritten to allocate the generator object, along with
+a frame holding its arguments and variables, and its body is compiled to a
+separate resume function:
+
+    resume(generator) -> bool
+
+which runs the body from the yield it last stopped at (the `state` of the
+generator), and returns whether it yielded a value, stored in `value`.
+
+The address of the resume function and the size of its frame are only known
+once it is compiled, so the generator function reads them from the
+`GeneratorInfo` of the generator at runtime.
+
+Values sent into the generator are ignored, since yield expressions are
+not supported.
 """
 
 from __future__ import print_function, division, absolute_import
+import ctypes
 
-import flypy
-from flypy import jit, sjit, typeof
+from flypy import jit
+from flypy.types import Pointer, int8, int64
+from flypy.runtime.ffi import cast
+from flypy.runtime.gc import boehm
+from flypy.runtime.lowlevel_impls import add_impl
 from ..interfaces import Iterator
 
-@sjit('Generator[produce, consume]')
+from pykit import types as ptypes
+from pykit.ir import Const
+
+keepalive = []
+
+# States of generators. State i > 0 resumes from the i-th yield.
+START = 0
+DONE  = -1
+
+# Word offsets in the GeneratorInfo
+RESUME      = 0     # address of the resume function
+FRAME_SIZE  = 1     # size of the frame in bytes
+NINFO       = 2
+
+class GeneratorInfo(object):
+    """Resume function and frame size of a generator function"""
+
+    def __init__(self):
+        self.cells = (ctypes.c_int64 * NINFO)()
+        self.address = ctypes.addressof(self.cells)
+        keepalive.append(self)
+
+    @property
+    def resume(self):
+        return self.cells[RESUME]
+
+    @resume.setter
+    def resume(self, address):
+        self.cells[RESUME] = address
+
+    @property
+    def frame_size(self):
+        return self.cells[FRAME_SIZE]
+
+    @frame_size.setter
+    def frame_size(self, size):
+        self.cells[FRAME_SIZE] = size
+
+#===------------------------------------------------------------------===
+# Generator
+#===------------------------------------------------------------------===
+
+@jit('Generator[produce, consume]')
 class Generator(Iterator):
     """
-    Generator object with dummy methods. The `produce` parameter specifies
-    the type of values we produce, and the `consume` parameter specifies
-    the values of objects that can be sent into a generator.
+    Generator object. The `produce` parameter specifies the type of values
+    we produce, and the `consume` parameter specifies the values of objects
+    that can be sent into a generator.
     """
 
-    layout = [('dummy', 'produce')]
+    layout = [('resume', 'int64'),
+              ('frame', 'Pointer[int8]'),
+              ('state', 'int64'),
+              ('value', 'produce')]
 
-    # -- Dummy Methods -- #
+    @jit('Generator[p, c] -> int64 -> void')
+    def __init__(self, info):
+        cells = cast(info, Pointer[int64])
+        self.resume = cells[RESUME]
+        self.frame = new_frame(cells[FRAME_SIZE])
+        self.state = START
 
     @jit('a -> a')
     def __iter__(self):
@@ -28,12 +100,57 @@ class Generator(Iterator):
 
     @jit('Generator[p, c] -> p')
     def __next__(self):
-        return self.dummy # NOTE: This is only to pass type checking !
+        if not resume_generator(self.resume, self):
+            raise StopIteration
+        return self.value
 
-    @jit('Generator[p, c] -> c -> p')
+    @jit('Generator[p, c] -> a -> p')
     def send(self, value):
-        return self.dummy # NOTE: This is only to pass type checking !
+        return self.__next__()
+
+    @jit('a -> void')
+    def close(self):
+        self.state = DONE
 
     @jit('a -> Exception[] -> void')
     def throw(self, exc):
-        raise NotImplementedError
+        self.state = DONE
+        raise exc
+
+
+@jit('int64 -> Pointer[int8]')
+def new_frame(size):
+    """
+    Allocate a frame of `size` bytes. Frames are scanned conservatively for
+    references to objects.
+    """
+    if size < 8:
+        size = 8
+    p = boehm.allocate(1, size, boehm.NORMAL, 0)
+    return cast(p, Pointer[int8])
+
+@jit('int64 -> Generator[p, c] -> bool', opaque=True, raises=True)
+def resume_generator(address, generator):
+    """Run `generator` until it yields, returning whether it yielded"""
+    raise NotImplementedError("Not implemented at the python level")
+
+def implement_resume(builder, argtypes, address, generator):
+    functype = ptypes.Function(ptypes.Bool, (generator.type,), False)
+    f = builder.convert(ptypes.Pointer(functype), address)
+    builder.ret(builder.call(ptypes.Bool, f, [generator]))
+
+add_impl(resume_generator, "resume_generator", implement_resume,
+         restype=ptypes.Bool)
+
+@jit('int64 -> bool', opaque=True)
+def suspend(state):
+    """
+    Marks the yields of resume functions, which suspend the generator in
+    `state`. Calls are removed when building the frame of the generator.
+    """
+    raise NotImplementedError("Not implemented at the python level")
+
+def implement_suspend(builder, argtypes, state):
+    builder.ret(Const(True, ptypes.Bool))
+
+add_impl(suspend, "suspend", implement_suspend, restype=ptypes.Bool)
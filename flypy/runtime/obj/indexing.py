@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+"""
+Indexing policies for List, Buffer and NDArray.
+
+Whether indices are bounds-checked, and whether negative indices wrap
+around, is decided at compile time for each function:
+
+    @jit(boundscheck=True, wraparound=True)
+    def last(lst):
+        return lst[-1]
+
+Functions that don't specify a policy use the defaults in flypy.config.
+Calls to `boundscheck` and `wraparound` are replaced by the policy of the
+function they are inlined into (see flypy.compiler.optimizations.policies),
+so unused paths are removed entirely.
+
+Functions called from compiled code that are not inlined, like the indexers
+of NDArray, take the policies of the function called from Python. These are
+part of its specialization key and of its environment (see
+flypy.pipeline.environment.target_env), so changes to flypy.config apply to
+code compiled afterwards.
+"""
+
+from __future__ import print_function, division, absolute_import
+
+from flypy import jit, ijit
+from flypy.config import config
+
+#===------------------------------------------------------------------===
+# Policies
+#===------------------------------------------------------------------===
+
+@jit
+def boundscheck():
+    """Whether to check indices against the size of the container"""
+    return False
+
+@jit
+def wraparound():
+    """Whether negative indices index from the end of the container"""
+    return False
+
+policies = {
+    boundscheck: 'boundscheck',
+    wraparound: 'wraparound',
+}
+
+def function_policies(func):
+    """
+    Names of the policies enabled for FunctionWrapper `func`, given to @jit
+    or enabled in flypy.config, as a sorted tuple.
+    """
+    enabled = []
+    for name in sorted(policies.values()):
+        value = None
+        for py_func, signature, kwds in func.overloads:
+            if kwds.get(name) is not None:
+                value = kwds[name]
+                break
+        if value is None:
+            value = getattr(config, name)
+        if value:
+            enabled.append(name)
+    return tuple(enabled)
+
+#===------------------------------------------------------------------===
+# Indexing
+#===------------------------------------------------------------------===
+
+@ijit('int64 -> int64 -> int64')
+def normalize_index(index, size):
+    """
+    Normalize `index` into a container of `size` items according to the
+    indexing policy.
+    """
+    if wraparound():
+        if index < 0:
+            index += size
+    if boundscheck():
+        if index < 0 or index >= size:
+            raise IndexError
+    return index
+
+#===------------------------------------------------------------------===
+# Hoisted checks
+#===------------------------------------------------------------------===
+
+# Loops over a range that index containers with the loop index check the
+# range once, before the loop (see flypy.compiler.optimizations.boundschecks).
+# Indexing in the loop takes the unchecked path if all indices are valid,
+# and checks each index otherwise, so errors are raised by the same
+# iteration.
+
+@ijit
+def range_in_bounds(seq, r):
+    """Whether all indices of range `r` are valid, non-negative indices"""
+    if boundscheck() or wraparound():
+        n = len(r)
+        if n == 0:
+            return True
+        first = r.start
+        last = r.start + (n - 1) * r.step
+        size = len(seq)
+        return first >= 0 and first < size and last >= 0 and last < size
+    return True
+
+@jit(boundscheck=False, wraparound=False)
+def getitem_inbounds(seq, index):
+    return seq[index]
+
+@jit(boundscheck=False, wraparound=False)
+def setitem_inbounds(seq, index, value):
+    seq[index] = value
+
+@ijit
+def getitem_hoisted(seq, index, inbounds):
+    if inbounds:
+        return getitem_inbounds(seq, index)
+    return seq[index]
+
+@ijit
+def setitem_hoisted(seq, index, value, inbounds):
+    if inbounds:
+        setitem_inbounds(seq, index, value)
+    else:
+        seq[index] = value
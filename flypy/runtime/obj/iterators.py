@@ -1,13 +1,16 @@
 # -*- coding: utf-8 -*-
 
 """
-Counting iterators.
+Iterator objects. These are stack-allocated and inlined, so a loop over an
+iterator, or a chain of iterators, compiles to a single loop without
+allocations.
 """
 
 from __future__ import print_function, division, absolute_import
 
 from flypy import jit, sjit, ijit, cjit
 from ..interfaces import Sequence, Iterator
+from ..specialize import static
 
 @sjit('CountingIterator[obj]')
 class CountingIterator(Iterator):
@@ -32,4 +35,145 @@ class CountingIterator(Iterator):
 
 @cjit('a -> CountingIterator[a]') # TODO: eat a Sequence[a]
 def counting_iterator(obj):
-    return CountingIterator(obj, 0, len(obj))
\ No newline at end of file
+    return CountingIterator(obj, 0, len(obj))
+
+
+@sjit('ReversedIterator[obj]')
+class ReversedIterator(Iterator):
+
+    layout = [('obj', 'obj'), ('idx', 'int64')]
+
+    @ijit # ReversedIterator[Sequence[a]] -> a
+    def __next__(self):
+        if self.idx > 0:
+            self.idx -= 1
+            return self.obj[self.idx]
+        raise StopIteration
+
+    next = __next__
+
+    def __str__(self):
+        return "reversed_iterator(idx=%d)" % (self.idx,)
+
+    __repr__ = __str__
+
+
+@cjit('a -> ReversedIterator[a]') # TODO: eat a Sequence[a]
+def reversed_iterator(obj):
+    return ReversedIterator(obj, len(obj))
+
+# ________________________________________________________________
+# Combinators. The wrapped iterators are copied out of their field and
+# written back, since they are advanced in place.
+
+@sjit('ZipIterator[it1, it2]')
+class ZipIterator(Iterator):
+
+    layout = [('it1', 'it1'), ('it2', 'it2')]
+
+    @ijit
+    def __next__(self):
+        it1 = self.it1
+        it2 = self.it2
+        x = it1.__next__()
+        y = it2.__next__()
+        self.it1 = it1
+        self.it2 = it2
+        return x, y
+
+    next = __next__
+
+    def __str__(self):
+        return "zip_iterator(%s, %s)" % (self.it1, self.it2)
+
+    __repr__ = __str__
+
+
+@sjit('EnumerateIterator[it]')
+class EnumerateIterator(Iterator):
+
+    layout = [('it', 'it'), ('idx', 'int64')]
+
+    @ijit
+    def __next__(self):
+        it = self.it
+        x = it.__next__()
+        self.it = it
+        idx = self.idx
+        self.idx = idx + 1
+        return idx, x
+
+    next = __next__
+
+    def __str__(self):
+        return "enumerate_iterator(%s, idx=%d)" % (self.it, self.idx)
+
+    __repr__ = __str__
+
+
+# ________________________________________________________________
+# Iterator objects can't hold a function, so map and filter build an
+# iterator class for each function they apply. The function is a constant
+# in the compiled __next__.
+
+map_iterators = {}
+filter_iterators = {}
+
+@static
+def map_iterator(f):
+    """Return the class of iterators applying f"""
+    if f not in map_iterators:
+        class MapIterator(Iterator):
+
+            layout = [('it', 'it')]
+
+            @ijit
+            def __next__(self):
+                it = self.it
+                x = it.__next__()
+                self.it = it
+                return f(x)
+
+            next = __next__
+
+            def __str__(self):
+                return "map_iterator(%s, %s)" % (f, self.it)
+
+            __repr__ = __str__
+
+        map_iterators[f] = specialized_iterator(MapIterator, f)
+
+    return map_iterators[f]
+
+@static
+def filter_iterator(f):
+    """Return the class of iterators keeping the items for which f is true"""
+    if f not in filter_iterators:
+        class FilterIterator(Iterator):
+
+            layout = [('it', 'it')]
+
+            @ijit
+            def __next__(self):
+                it = self.it
+                x = it.__next__()
+                while not f(x):
+                    x = it.__next__()
+                self.it = it
+                return x
+
+            next = __next__
+
+            def __str__(self):
+                return "filter_iterator(%s, %s)" % (f, self.it)
+
+            __repr__ = __str__
+
+        filter_iterators[f] = specialized_iterator(FilterIterator, f)
+
+    return filter_iterators[f]
+
+def specialized_iterator(cls, f):
+    # Types are identified by name, give each function its own
+    cls.__name__ = "%s_%x" % (cls.__name__, id(f))
+    return sjit("%s[it]" % (cls.__name__,), scope={})(cls)
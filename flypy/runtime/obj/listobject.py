@@ -6,12 +6,13 @@ List implementation.
 
 from __future__ import print_function, division, absolute_import
 
-from flypy import jit, ijit, typeof
+from flypy import jit, ijit, cjit, typeof
 from flypy.conversion import toobject, fromobject, toctypes
 from .typeobject import Type
 from .pointerobject import Pointer
 from .bufferobject import newbuffer, Buffer
 from .iterators import counting_iterator
+from .indexing import normalize_index
 
 keepalive = []
 
@@ -44,23 +45,13 @@ class List(object):
 
     # TODO: Slicing
 
-    @jit('List[a] -> int64 -> a')
+    @cjit('List[a] -> int64 -> a')
     def __getitem__(self, key):
-        if not (0 <= key < self.size):
-            # TODO: Exceptions !
-            # raise IndexError(key)
-            pass
-
-        return self.buf[key]
+        return self.buf.p[normalize_index(key, self.size)]
 
-    @jit('List[a] -> int64 -> a -> void')
+    @cjit('List[a] -> int64 -> a -> void')
     def __setitem__(self, key, value):
-        if not (0 <= key < self.size):
-            # TODO: Exceptions !
-            # raise IndexError(key)
-            pass
-
-        self.buf[key] = value
+        self.buf.p[normalize_index(key, self.size)] = value
 
     @jit #('a -> Iterator[T]')
     def __iter__(self):
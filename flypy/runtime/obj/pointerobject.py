@@ -16,6 +16,7 @@ from .richcompare import RichComparisonMixin
 from ..lowlevel_impls import add_impl_cls
 
 from pykit import types as ptypes
+from pykit.ir import Const, Undef
 
 jit = cjit
 
@@ -44,6 +45,16 @@ class Pointer(RichComparisonMixin):
     def store(self, value):
         self.p[0] = value
 
+    @jit('Pointer[a] -> Type[Vector[a, n]] -> Vector[a, n]', opaque=True)
+    def vload(self, vector_type):
+        """Load a Vector of type `vector_type` from consecutive elements"""
+        raise NotImplementedError("Not implemented at the python level")
+
+    @jit('Pointer[a] -> Vector[a, n] -> void', opaque=True)
+    def vstore(self, vector):
+        """Store the lanes of a Vector to consecutive elements"""
+        raise NotImplementedError("Not implemented at the python level")
+
     # __________________________________________________________________
 
     @jit('Pointer[a] -> Pointer[b] -> bool')
@@ -151,6 +162,27 @@ def pointer_store(builder, argtypes, ptr, value):
     builder.ptrstore(value, ptr)
     builder.ret(None)
 
+# Vectors are loaded and stored lane by lane, since we can't tell the
+# alignment of the pointer. LLVM combines these into unaligned vector loads
+# and stores.
+
+def pointer_vload(builder, argtypes, ptr, vector_type):
+    [vector_type] = argtypes[1].parameters
+    base, count = vector_type.parameters
+    result = Undef(representation_type(vector_type))
+    for i in range(count):
+        idx = Const(i, ptypes.Int64)
+        item = builder.ptrload(builder.ptradd(ptr, idx))
+        result = builder.set(result, item, idx)
+    builder.ret(result)
+
+def pointer_vstore(builder, argtypes, ptr, vector):
+    base, count = argtypes[1].parameters
+    for i in range(count):
+        idx = Const(i, ptypes.Int64)
+        builder.ptrstore(builder.get(vector, idx), builder.ptradd(ptr, idx))
+    builder.ret(None)
+
 # Determine low-level return types
 
 def _getitem_type(argtypes):
@@ -162,6 +194,10 @@ def _getitem_type(argtypes):
 add_impl_cls(Pointer, "__add__", pointer_add)
 add_impl_cls(Pointer, "deref", pointer_load, restype_func=_getitem_type)
 add_impl_cls(Pointer, "store", pointer_store, restype=ptypes.Void)
+add_impl_cls(Pointer, "vload", pointer_vload,
+             restype_func=lambda argtypes: representation_type(
+                 argtypes[1].parameters[0]))
+add_impl_cls(Pointer, "vstore", pointer_vstore, restype=ptypes.Void)
 
 #===------------------------------------------------------------------===
 # Utils
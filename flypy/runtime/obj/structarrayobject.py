@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+
+"""
+Struct-of-arrays containers.
+
+A StructArray stores each field of the elements in a contiguous column,
+instead of storing (pointers to) whole elements:
+
+    Point = struct_([('x', float64), ('y', float64)])
+    points = structarray_class(Point)(n)
+
+    points.x            # Buffer[float64] of all x coordinates
+    points[i]           # Point(points.x[i], points.y[i])
+    points[i] = p       # scatter the fields of p to the columns
+
+Elements are constructed from their fields in layout order, as the default
+__init__ of @jit classes does. Classes are generated for each element type,
+see `structarray_class`.
+"""
+
+from __future__ import print_function, division, absolute_import
+import textwrap
+
+import numpy as np
+
+from flypy import jit, cjit
+from flypy.conversion import fromobject, toobject, ctype
+from flypy.support import numpy_support
+from .pointerobject import Pointer, address
+from .bufferobject import Buffer, newbuffer
+from .iterators import counting_iterator
+from .indexing import normalize_index
+from .structobject import struct_
+
+# Attributes of StructArray classes, which can't be used as field names
+reserved = set(['_length', '_columns', 'layout', 'type', 'fromobject', 'toobject'])
+
+#===------------------------------------------------------------------===
+# StructArray classes
+#===------------------------------------------------------------------===
+
+template = '''
+@jit
+class StructArray(object):
+    """Struct-of-arrays container of %(element)s"""
+
+    layout = [('_length', 'int64')] + columns
+
+    @jit('a -> int64 -> void')
+    def __init__(self, length):
+        self._length = length
+        %(allocate)s
+
+    @cjit('a -> int64 -> b')
+    def __getitem__(self, item):
+        i = normalize_index(item, self._length)
+        return Element(%(gather)s)
+
+    @cjit('a -> int64 -> b -> void')
+    def __setitem__(self, item, value):
+        i = normalize_index(item, self._length)
+        %(scatter)s
+
+    @jit
+    def __iter__(self):
+        return counting_iterator(self)
+
+    @jit('a -> int64')
+    def __len__(self):
+        return self._length
+
+    @staticmethod
+    def fromobject(value, type):
+        return fromcolumns(value, type, element)
+
+    @staticmethod
+    def toobject(value, type):
+        return tocolumns(value, element)
+'''
+
+_classes = {}
+
+def structarray_class(type):
+    """
+    Return the struct-of-arrays class for elements of the given flypy type.
+    """
+    if hasattr(type, 'type'):
+        type = type.type
+    if type in _classes:
+        return _classes[type]
+
+    layout = type.resolved_layout
+    names = list(layout)
+    if not names:
+        raise TypeError("Cannot build a StructArray of %s, which has no "
+                        "fields" % (type,))
+    for name in names:
+        if name in reserved or name.startswith('__'):
+            raise TypeError("Field %r of %s is reserved in StructArray" % (
+                name, type))
+
+    source = template % {
+        'element': type,
+        'allocate': "\n        ".join(
+            "self.%s = newbuffer(type_%s, length)" % (name, name)
+                for name in names),
+        'gather': ", ".join("self.%s.p[i]" % name for name in names),
+        'scatter': "\n        ".join(
+            "self.%s.p[i] = value.%s" % (name, name) for name in names),
+    }
+
+    namespace = {
+        'jit': jit, 'cjit': cjit,
+        'newbuffer': newbuffer,
+        'normalize_index': normalize_index,
+        'counting_iterator': counting_iterator,
+        'fromcolumns': fromcolumns,
+        'tocolumns': tocolumns,
+        'Element': type.impl,
+        'element': type,
+        'columns': [(name, Buffer[layout[name]]) for name in names],
+    }
+    namespace.update(('type_' + name, layout[name]) for name in names)
+
+    exec textwrap.dedent(source) in namespace, namespace
+    cls = namespace['StructArray']
+    _classes[type] = cls
+    return cls
+
+def element_type(dtype):
+    """Element type for the records of a NumPy structured dtype"""
+    if dtype.kind != 'V' or not dtype.names:
+        raise TypeError("Expected a structured dtype, got %s" % (dtype,))
+
+    # Fields are stored in separate columns, so packing doesn't matter
+    fields = [(name, numpy_support.from_dtype(dtype.fields[name][0]))
+                  for name in dtype.names]
+    return struct_(fields)
+
+def structarray(obj, type=None):
+    """
+    Build a StructArray from a NumPy structured array, or from a sequence
+    of elements of flypy type `type`.
+    """
+    if isinstance(obj, np.ndarray):
+        type = type or element_type(obj.dtype)
+    elif type is None:
+        raise TypeError("Need an element type to build a StructArray from %s"
+                        % (obj,))
+
+    cls = structarray_class(type)
+    return cls.fromobject(obj, cls.type)
+
+#===------------------------------------------------------------------===
+# Conversion
+#===------------------------------------------------------------------===
+
+def fromcolumns(obj, type, element):
+    """Build a StructArray of type `type` from a structured array or list"""
+    cls = type.impl
+    layout = element.resolved_layout
+
+    if not isinstance(obj, np.ndarray):
+        result = cls(len(obj))
+        for name in layout:
+            buf = getattr(result, name)
+            for i, item in enumerate(obj):
+                buf[i] = getattr(item, name)
+        return result
+
+    if obj.ndim != 1:
+        raise TypeError("Expected a 1D structured array, got %d dimensions"
+                        % obj.ndim)
+    missing = [name for name in layout if name not in (obj.dtype.names or ())]
+    if missing:
+        raise TypeError("Structured array has no fields %s" % (missing,))
+
+    # Use contiguous copies of the fields as our columns. The buffers don't
+    # own their data, the columns live as long as the result.
+    result = cls.__new__(cls)
+    result._length = len(obj)
+    result._columns = []
+    for name, fieldtype in layout.items():
+        column = np.ascontiguousarray(
+            obj[name], dtype=numpy_support.to_dtype(fieldtype))
+        result._columns.append(column)
+        p = fromobject(column.ctypes.data, Pointer[fieldtype])
+        setattr(result, name, Buffer(p, len(obj), False))
+
+    return result
+
+def tocolumns(value, element):
+    """Build a NumPy structured array from a StructArray"""
+    layout = element.resolved_layout
+    dtype = np.dtype([(name, numpy_support.to_dtype(fieldtype))
+                          for name, fieldtype in layout.items()])
+
+    length = value._length
+    result = np.empty(length, dtype=dtype)
+    if not length:
+        return result
+
+    for name, fieldtype in layout.items():
+        p = toobject(getattr(value, name).p, Pointer[fieldtype])
+        column = (ctype(fieldtype) * length).from_address(address(p))
+        result[name] = np.ctypeslib.as_array(column)
+
+    return result
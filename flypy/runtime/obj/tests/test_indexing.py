@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+import unittest
+
+from flypy import jit
+from flypy.config import config
+
+import numpy as np
+
+class TestIndexingPolicies(unittest.TestCase):
+
+    def test_unchecked(self):
+        @jit
+        def getitem(lst, i):
+            return lst[i]
+
+        self.assertEqual(getitem([1, 2, 3], 2), 3)
+
+    def test_boundscheck(self):
+        @jit(boundscheck=True)
+        def getitem(lst, i):
+            return lst[i]
+
+        self.assertEqual(getitem([1, 2, 3], 2), 3)
+        self.assertRaises(IndexError, getitem, [1, 2, 3], 3)
+        self.assertRaises(IndexError, getitem, [1, 2, 3], -1)
+
+    def test_boundscheck_setitem(self):
+        @jit(boundscheck=True)
+        def setitem(lst, i):
+            lst[i] = 0
+
+        self.assertRaises(IndexError, setitem, [1, 2, 3], 3)
+
+    def test_wraparound(self):
+        @jit(wraparound=True)
+        def getitem(lst, i):
+            return lst[i]
+
+        self.assertEqual(getitem([1, 2, 3], -1), 3)
+        self.assertEqual(getitem([1, 2, 3], -3), 1)
+
+    def test_wraparound_boundscheck(self):
+        @jit(boundscheck=True, wraparound=True)
+        def getitem(lst, i):
+            return lst[i]
+
+        self.assertEqual(getitem([1, 2, 3], -1), 3)
+        self.assertRaises(IndexError, getitem, [1, 2, 3], -4)
+
+    def test_catch(self):
+        @jit(boundscheck=True)
+        def getitem(lst, i):
+            try:
+                return lst[i]
+            except IndexError:
+                return -1
+
+        self.assertEqual(getitem([1, 2, 3], 1), 2)
+        self.assertEqual(getitem([1, 2, 3], 5), -1)
+
+    def test_global_policy(self):
+        config.boundscheck = True
+        try:
+            @jit
+            def getitem(lst, i):
+                return lst[i]
+
+            self.assertRaises(IndexError, getitem, [1, 2, 3], 3)
+        finally:
+            config.boundscheck = False
+
+    def test_global_policy_change(self):
+        @jit
+        def getitem(lst, i):
+            return lst[i]
+
+        self.assertEqual(getitem([1, 2, 3], 2), 3)
+        config.boundscheck = True
+        try:
+            self.assertRaises(IndexError, getitem, [1, 2, 3], 3)
+        finally:
+            config.boundscheck = False
+
+    def test_array_boundscheck(self):
+        @jit(boundscheck=True, wraparound=True)
+        def getitem(a, i, j):
+            return a[i, j]
+
+        a = np.arange(12).reshape(3, 4)
+        self.assertEqual(getitem(a, -1, 2), a[-1, 2])
+        self.assertRaises(IndexError, getitem, a, 3, 0)
+        self.assertRaises(IndexError, getitem, a, 0, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
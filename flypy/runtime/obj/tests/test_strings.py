@@ -41,12 +41,6 @@ class TestStrings(unittest.TestCase):
         self.assertEqual(f("ham"), True)
 
     def test_string_add(self):
-        raise unittest.SkipTest("""
-        This works only when run in isolation:
-              File "/Users/mark/flypy-lang/flypy/compiler/optimizations/throwing.py", line 16, in rewrite_exceptions
-    raise NotImplementedError("Exception throwing", op, func)
-NotImplementedError: ('Exception throwing', %15, Function(flypy.runtime.obj.rangeobject.__next__))
-        """)
         @jit
         def f(s1, s2):
             return s1 + s2
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+import gc
+import unittest
+import weakref
+
+from flypy import jit, sjit, structarray, structarray_class
+from flypy.types import float64, int32
+
+import numpy as np
+
+@sjit
+class Point(object):
+    layout = [('x', float64), ('y', float64)]
+
+dtype = np.dtype([('x', np.float64), ('y', np.int32)])
+
+class TestStructArray(unittest.TestCase):
+
+    def test_columns(self):
+        @jit
+        def sum_x(points):
+            result = 0.0
+            for i in range(len(points)):
+                result += points.x[i]
+            return result
+
+        arr = np.array([(1.0, 2), (3.0, 4), (5.0, 6)], dtype=dtype)
+        self.assertEqual(sum_x(structarray(arr)), 9.0)
+
+    def test_elements(self):
+        @jit
+        def norms(points):
+            result = 0.0
+            for p in points:
+                result += p.x * p.x + p.y * p.y
+            return result
+
+        points = structarray([Point(1.0, 2.0), Point(3.0, 4.0)], Point)
+        self.assertEqual(norms(points), 30.0)
+
+    def test_setitem(self):
+        @jit
+        def fill(points):
+            for i in range(len(points)):
+                points[i] = Point(i * 1.0, i * 2.0)
+            return points
+
+        cls = structarray_class(Point)
+        result = fill(cls(4))
+        self.assertEqual(list(result['x']), [0.0, 1.0, 2.0, 3.0])
+        self.assertEqual(list(result['y']), [0.0, 2.0, 4.0, 6.0])
+
+    def test_numpy_roundtrip(self):
+        @jit
+        def identity(points):
+            return points
+
+        arr = np.array([(1.0, 2), (3.0, 4)], dtype=dtype)
+        result = identity(structarray(arr))
+        self.assertEqual(result.dtype.names, ('x', 'y'))
+        self.assertTrue(np.all(result['x'] == arr['x']))
+        self.assertTrue(np.all(result['y'] == arr['y']))
+
+    def test_column_lifetime(self):
+        arr = np.array([(1.0, 2), (3.0, 4)], dtype=dtype)
+        points = structarray(arr)
+        refs = [weakref.ref(column) for column in points._columns]
+        del points
+        gc.collect()
+        self.assertEqual([ref() for ref in refs], [None, None])
+
+    def test_reserved_fields(self):
+        @sjit
+        class Bad(object):
+            layout = [('_length', int32)]
+
+        self.assertRaises(TypeError, structarray_class, Bad)
+
+
+if __name__ == '__main__':
+    unittest.main()
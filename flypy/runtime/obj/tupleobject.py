@@ -17,6 +17,16 @@ STATIC_THRESHOLD = 8
 
 jit = cjit
 
+def static_length(argtypes):
+    """
+    Compute the length of a static tuple from its type, or return None for
+    tuples with a dynamic length.
+    """
+    [argtype] = argtypes
+    if typematch(argtype, StaticTuple) or typematch(argtype, EmptyTuple):
+        return len(extract_statictuple_eltypes(argtype))
+    return None
+
 @abstract
 class Tuple(object):
 
@@ -77,7 +87,7 @@ class StaticTuple(Tuple):
     def __iter__(self):
         return counting_iterator(self)
 
-    @jit('a -> int64')
+    @jit('a -> int64', eval_from_types=static_length)
     def __len__(self):
         if self.hd is None:
             return 0
@@ -168,7 +178,7 @@ class EmptyTuple(Tuple):
     def __eq__(self, other):
         return isinstance(other, EmptyTuple)
 
-    @jit('a -> int64')
+    @jit('a -> int64', eval_from_types=static_length)
     def __len__(self):
         return 0
 
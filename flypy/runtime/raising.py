@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+"""
+Propagation of exceptions raised in compiled code.
+
+Exceptions that are not caught in the function raising them (see
+flypy.compiler.optimizations.throwing) are propagated by returning: the
+raising function records the exception as pending and returns. Callers check
+for a pending exception after calls to functions that may raise, and either
+dispatch to a matching handler, clearing the pending exception, or return
+in turn. Finally, the function wrapper raises the pending exception in
+Python (see `reraise`).
+
+Exceptions hold no state, so we record the pending exception by the id of
+its class, which indexes `exception_names`. Id 0 means that no exception is
+pending. Constant arguments of the raised exception, like its message, are
+recorded at compile time in `exception_args`, and the pending exception
+refers to them by index, so that `reraise` raises the exception with its
+arguments. Arguments computed at runtime are dropped.
+
+There is a single exception state per process. Functions that may raise
+don't release the GIL (see flypy.compiler.analysis.nogil), which protects
+the state from raising in compiled code until `reraise`. Libraries exported
+with flypy.cppgen.export share the state between threads, so calls into
+them must be serialized.
+"""
+
+from __future__ import print_function, division, absolute_import
+import ctypes
+import exceptions as pyexceptions
+
+from flypy import ijit
+from flypy.types import int64
+from flypy.extern_support import relocation
+from flypy.runtime.ffi import symbol_pointer
+from flypy.runtime.obj import exceptions
+
+# Word offsets in the exception state
+PENDING = 0
+ARGS    = 1
+NSTATE  = 2
+
+_state = (ctypes.c_int64 * NSTATE)()
+pending_address = ctypes.addressof(_state)
+pending_symbol = relocation(".flypy.runtime.raising.state", pending_address,
+                            size=ctypes.sizeof(_state))
+exception_state = symbol_pointer("exception_state", pending_symbol)
+
+# Names of exception classes, indexed by id
+exception_names = [None] + list(exceptions.__all__)
+exception_ids = dict((name, id) for id, name in enumerate(exception_names)
+                                    if id)
+
+# Sets of exceptions are masks of their ids
+assert len(exception_names) <= 64
+
+# Constant arguments of raised exceptions, indexed by id
+exception_args = [()]
+exception_args_ids = {(): 0}
+
+#===------------------------------------------------------------------===
+# Exception ids
+#===------------------------------------------------------------------===
+
+def python_class(cls):
+    """Return the Python exception class of flypy or Python class `cls`"""
+    for base in cls.__mro__:
+        if base.__name__ in exception_ids:
+            return getattr(pyexceptions, base.__name__)
+    raise TypeError("Not an exception class: %s" % (cls,))
+
+def exception_id(type):
+    """Return the id of the class of exceptions of flypy type `type`"""
+    return exception_ids[python_class(type.impl).__name__]
+
+def exception_mask(classes):
+    """
+    Return the mask of exceptions matching any of `classes`, which are flypy
+    or Python exception classes.
+    """
+    classes = tuple(python_class(cls) for cls in classes)
+    mask = 0
+    for id, name in enumerate(exception_names):
+        if id and issubclass(getattr(pyexceptions, name), classes):
+            mask |= 1 << id
+    return mask
+
+ALL = exception_mask([BaseException])
+
+def exception_args_id(args):
+    """Return the id of the tuple of constant exception arguments `args`"""
+    if args not in exception_args_ids:
+        exception_args_ids[args] = len(exception_args)
+        exception_args.append(args)
+    return exception_args_ids[args]
+
+#===------------------------------------------------------------------===
+# Compiled code
+#===------------------------------------------------------------------===
+
+@ijit
+def exception_pending():
+    return exception_state(int64)[PENDING] != 0
+
+@ijit('int64 -> bool')
+def exception_matches(mask):
+    """Whether the pending exception is one of the exceptions in `mask`"""
+    id = exception_state(int64)[PENDING]
+    return (mask >> id) & 1 != 0
+
+@ijit
+def clear_exception():
+    exception_state(int64)[PENDING] = 0
+    exception_state(int64)[ARGS] = 0
+
+#===------------------------------------------------------------------===
+# Python
+#===------------------------------------------------------------------===
+
+def reraise():
+    """Raise the exception pending after a call to compiled code in Python"""
+    id = _state[PENDING]
+    if id:
+        args = exception_args[_state[ARGS]]
+        _state[PENDING] = _state[ARGS] = 0
+        raise getattr(pyexceptions, exception_names[id])(*args)
@@ -6,25 +6,46 @@ Specialization. Annotates functions for the compiler to process.
 
 from __future__ import print_function, division, absolute_import
 import inspect
-from .. import jit, annotate #, SpecializeError
+from .. import jit, annotate
+from ..errors import SpecializeError
 
 def specialize_value(*args):
     """
     Specialize on values, which must be constant:
 
         @specialize_value('a', 'b')
+
+    Calls from compiled code that pass constants for these arguments get a
+    specialization for the values, which the compiler treats as constants.
     """
     def decorator(f):
         argspec = inspect.getargspec(f)
         for arg in args:
-            if arg not in argspec.args and arg != args.varargs:
+            if arg not in argspec.args:
                 raise SpecializeError(
                     "Arg %s listed for specialization not in argspec" % (arg,))
         annotate(f, specialize_value=args)
         return f
     return decorator
 
-@jit('Iterable[a] -> Iterable[a]', specialize_value='iterable')
+def static(f):
+    """
+    Evaluate calls of Python function `f` from compiled code at compile time.
+    The arguments must be constants, e.g. values we specialize on, and the
+    result becomes a constant:
+
+        @static
+        def iterator_class(f):
+            ...
+
+        @jit(specialize_value=('f',))
+        def iterate(f, it):
+            return iterator_class(f)(it)
+    """
+    annotate(f, static=True)
+    return f
+
+@jit('Iterable[a] -> Iterable[a]', specialize_value=('iterable',))
 def unroll(iterable):
     """
     Fully unroll a constant-sized iterable. unroll is detected by the compiler.
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+import threading
+import unittest
+
+import flypy
+from flypy import jit, errors
+from flypy.runtime import arena
+from flypy.runtime.arena import enter_arena, exit_arena
+
+@jit
+class Item(object):
+    layout = [('value', 'int64')]
+
+    @jit
+    def __init__(self, value):
+        self.value = value
+
+@jit
+class Holder(object):
+    layout = [('item', 'Item[]')]
+
+@jit
+def make(value):
+    return Item(value)
+
+@jit
+def sum_items(n):
+    total = 0
+    for i in range(n):
+        total += make(i).value
+    return total
+
+
+class TestArena(unittest.TestCase):
+
+    def setUp(self):
+        flypy.gc.arenas = True
+
+    def tearDown(self):
+        flypy.gc.arenas = False
+
+    def test_arena_function(self):
+        @jit(allocator="arena")
+        def f(n):
+            return sum_items(n)
+
+        self.assertEqual(f(100), sum(range(100)))
+        self.assertEqual(arena.depth(), 0)
+
+    def test_arena_escaping_return(self):
+        @jit(allocator="arena")
+        def f(n):
+            return make(n)
+
+        self.assertRaises(errors.CompileError, f, 1)
+
+    def test_arena_escaping_store(self):
+        @jit(allocator="arena")
+        def f(holder, n):
+            holder.item = make(n)
+
+        self.assertRaises(errors.CompileError, f, Holder(Item(0)), 1)
+
+    def test_arena_arguments(self):
+        @jit(allocator="arena")
+        def f(item, n):
+            item.value = sum_items(n)
+            return item.value
+
+        self.assertEqual(f(Item(0), 10), sum(range(10)))
+
+    def test_arena_objects(self):
+        with arena.arena():
+            offset = arena.state()[arena.OFFSET]
+            self.assertEqual(sum_items(100), sum(range(100)))
+            self.assertGreater(arena.state()[arena.OFFSET], offset)
+        self.assertEqual(arena.depth(), 0)
+
+    def test_arena_free(self):
+        with arena.arena():
+            offset = arena.state()[arena.OFFSET]
+            for i in range(10):
+                with arena.arena():
+                    sum_items(100000) # Needs more than one chunk
+                self.assertEqual(arena.state()[arena.OFFSET], offset)
+
+    def test_explicit_arena(self):
+        @jit
+        def f(n):
+            result = 0
+            for i in range(n):
+                mark = enter_arena()
+                result += sum_items(i)
+                exit_arena(mark)
+            return result
+
+        self.assertEqual(f(50), sum(sum(range(i)) for i in range(50)))
+        self.assertEqual(arena.depth(), 0)
+
+    def test_python_escaping_return(self):
+        with arena.arena():
+            self.assertRaises(TypeError, make, 1)
+            self.assertEqual(sum_items(10), sum(range(10)))
+        self.assertEqual(make(1).value, 1)
+
+    def test_python_escaping_store(self):
+        @jit
+        def store(holder, n):
+            holder.item = make(n)
+
+        holder = Holder(Item(0))
+        with arena.arena():
+            self.assertRaises(TypeError, store, holder, 1)
+        self.assertEqual(holder.item.value, 0)
+
+    def test_threads(self):
+        result = []
+
+        def run():
+            result.append(arena.depth())
+            with arena.arena():
+                result.append(sum_items(1000))
+                result.append(arena.depth())
+
+        with arena.arena():
+            offset = arena.state()[arena.OFFSET]
+            thread = threading.Thread(target=run)
+            thread.start()
+            thread.join()
+            self.assertEqual(arena.depth(), 1)
+            self.assertEqual(arena.state()[arena.OFFSET], offset)
+
+        self.assertEqual(result, [0, sum(range(1000)), 1])
+
+    def test_disabled(self):
+        flypy.gc.arenas = False
+
+        @jit(allocator="arena")
+        def f(n):
+            return n
+
+        self.assertRaises(errors.CompileError, f, 10)
+
+    def test_no_arena(self):
+        self.assertEqual(sum_items(100), sum(range(100)))
+        self.assertEqual(arena.depth(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,9 +3,20 @@ from __future__ import print_function, division, absolute_import
 
 import unittest
 
+import flypy
 from flypy import jit
 from flypy.runtime.obj.rangeobject import len_range
 
+import numpy as np
+
+@jit
+def square(x):
+    return x * x
+
+@jit
+def odd(x):
+    return x % 2 == 1
+
 class TestBuiltins(unittest.TestCase):
 
     def test_isinstance(self):
@@ -34,6 +45,75 @@ class TestBuiltins(unittest.TestCase):
                     self.assertEqual(len_range(start, stop, step),
                                      len(range(start, stop, step)))
 
+    def test_zip(self):
+        @jit
+        def f(xs, ys):
+            result = 0
+            for x, y in zip(xs, ys):
+                result += x * y
+            return result
+
+        self.assertEqual(f([1, 2, 3], [4, 5, 6, 7]), 32)
+        self.assertEqual(f(range(5), [1, 1]), 1)
+
+    def test_enumerate_zip(self):
+        @jit
+        def f(xs, ys):
+            result = 0
+            for i, (a, b) in enumerate(zip(xs, ys)):
+                result += i * a * b
+            return result
+
+        xs = np.arange(10.0)
+        ys = np.arange(10.0, 20.0)
+        self.assertEqual(f(xs, ys), np.sum(np.arange(10) * xs * ys))
+
+    def test_reversed(self):
+        @jit
+        def f(xs):
+            result = 0
+            for x in reversed(xs):
+                result = result * 10 + x
+            return result
+
+        self.assertEqual(f([1, 2, 3]), 321)
+        self.assertEqual(f(range(1, 4)), 321)
+        self.assertEqual(f(range(3, 0, -1)), 123)
+
+    def test_map_filter(self):
+        @jit
+        def f(n):
+            result = 0
+            for x in map(square, filter(odd, range(n))):
+                result += x
+            return result
+
+        self.assertEqual(f(10), sum(x * x for x in range(10) if x % 2 == 1))
+
+    def test_nested_combinators(self):
+        # map and filter are iterator objects, which need no collector
+        @jit
+        def f(n):
+            result = 0
+            for i, x in enumerate(map(square, range(n))):
+                result += i * x
+            return result
+
+        @jit
+        def g(n):
+            result = 0
+            for x, y in zip(map(square, filter(odd, range(n))), range(n)):
+                result += x - y
+            return result
+
+        flypy.gc.impl = "semispace"
+        try:
+            self.assertEqual(f(10), sum(i * i * i for i in range(10)))
+            self.assertEqual(g(10), sum(x * x - y for x, y in zip(
+                [x for x in range(10) if x % 2 == 1], range(10))))
+        finally:
+            flypy.gc.impl = "boehm"
+
 
 if __name__ == '__main__':
     #TestBuiltins('test_isinstance').debug()
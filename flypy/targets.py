@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+
+"""
+Target CPU selection. Select the CPU that code compiled afterwards is
+generated for with
+
+    flypy.target_cpu("native")
+
+or per function with
+
+    @jit(cpu="x86-64-v3")
+    def kernel(...): ...
+
+CPU names are those of LLVM (e.g. "haswell"), "native" for the host CPU,
+"generic" for the default target of pykit, or one of the x86-64
+microarchitecture levels in `levels` (e.g. "x86-64-v3" for AVX2 and FMA).
+Code generated for a CPU may use all of its features, and faults on hosts
+that lack them.
+
+Each CPU has its own compilation environment with its own caches, LLVM
+module and target machine (see flypy.pipeline.environment.target_env), so
+code for different CPUs is compiled and cached separately. Functions called
+from compiled code are compiled for the CPU of the caller.
+
+Multiversioned functions list several CPUs, best first:
+
+    @jit(cpu=["x86-64-v4", "x86-64-v3", "x86-64"])
+
+Calls from Python use the first version the host supports, and the last
+version on hosts that support none of the others (see `select`).
+"""
+
+from __future__ import print_function, division, absolute_import
+
+import llvm.ee
+
+cpu = "generic"
+
+# Features of the x86-64 microarchitecture levels, by LLVM feature name
+levels = {}
+levels['x86-64'] = []
+levels['x86-64-v2'] = levels['x86-64'] + [
+    'sse3', 'ssse3', 'sse4.1', 'sse4.2', 'popcnt', 'cx16']
+levels['x86-64-v3'] = levels['x86-64-v2'] + [
+    'avx', 'avx2', 'bmi', 'bmi2', 'fma', 'f16c', 'lzcnt', 'movbe']
+levels['x86-64-v4'] = levels['x86-64-v3'] + [
+    'avx512f', 'avx512bw', 'avx512cd', 'avx512dq', 'avx512vl']
+
+# Names of features in /proc/cpuinfo that differ from their LLVM name
+cpuinfo_names = {
+    'sse3':     'pni',
+    'sse4.1':   'sse4_1',
+    'sse4.2':   'sse4_2',
+    'bmi':      'bmi1',
+    'lzcnt':    'abm',
+}
+
+#===------------------------------------------------------------------===
+# Selection
+#===------------------------------------------------------------------===
+
+def target_cpu(name):
+    """
+    Select the CPU to generate code for in code compiled afterwards, for
+    functions that don't select one with @jit(cpu=...).
+    """
+    global cpu
+    if not isinstance(name, basestring):
+        raise TypeError("Expected a CPU name, got %r" % (name,))
+    cpu = name
+
+def cpu_option(func):
+    """The CPU or CPUs selected for FunctionWrapper `func` with @jit(cpu=...)"""
+    for py_func, signature, kwds in func.overloads:
+        if kwds.get('cpu') is not None:
+            return kwds['cpu']
+    return None
+
+def function_cpu(func):
+    """
+    CPU to generate code for when calling FunctionWrapper `func` from
+    Python: the CPU selected with @jit(cpu=...), or the default `cpu`.
+    """
+    return select(cpu_option(func) or cpu)
+
+def select(cpus):
+    """
+    Select the first CPU of the sequence `cpus` that the host supports, or
+    the last one if it supports none of them.
+    """
+    if isinstance(cpus, basestring):
+        return cpus
+    if not cpus:
+        raise ValueError("Expected at least one CPU to select from")
+
+    for name in cpus[:-1]:
+        if supported(name):
+            return name
+    return cpus[-1]
+
+#===------------------------------------------------------------------===
+# Target machines
+#===------------------------------------------------------------------===
+
+def resolve(name):
+    """Return (LLVM cpu name, LLVM feature string) for a target CPU"""
+    if name == "generic":
+        # pykit's target machine, see pykit.codegen.llvm.llvm_utils
+        return "", "-avx"
+    elif name == "native":
+        return llvm.ee.get_host_cpu_name(), ""
+    elif name in levels:
+        return "x86-64", ",".join("+" + f for f in levels[name])
+    return name, ""
+
+def target_machine(name, opt=3, **kwds):
+    """Build an LLVM target machine generating code for CPU `name`"""
+    cpu, features = resolve(name)
+    kwds.setdefault('cm', llvm.ee.CM_JITDEFAULT)
+    return llvm.ee.TargetMachine.new(cpu=cpu, features=features, opt=opt,
+                                     **kwds)
+
+#===------------------------------------------------------------------===
+# Host features
+#===------------------------------------------------------------------===
+
+_host_features = None
+
+def supported(name):
+    """Whether the host can run code generated for CPU `name`"""
+    if name in ("generic", "native"):
+        return True
+    elif name in levels:
+        return set(levels[name]) <= host_features()
+    return name == llvm.ee.get_host_cpu_name()
+
+def host_features():
+    """Set of LLVM names of the features of the host CPU"""
+    global _host_features
+    if _host_features is None:
+        _host_features = llvm_host_features() or cpuinfo_features()
+    return _host_features
+
+def llvm_host_features():
+    """Features of the host CPU according to LLVM, if LLVM can tell"""
+    from llvmpy import api
+
+    features = {}
+    get_features = getattr(api.llvm.sys, 'getHostCPUFeatures', None)
+    if get_features is None or not get_features(features):
+        return set()
+    return set(name for name, enabled in features.items() if enabled)
+
+def cpuinfo_features(path="/proc/cpuinfo"):
+    """Features of the host CPU according to the CPUID flags in `path`"""
+    try:
+        with open(path) as f:
+            lines = f.readlines()
+    except IOError:
+        return set()
+
+    flags = set()
+    for line in lines:
+        if line.startswith("flags"):
+            flags.update(line.split(":", 1)[1].split())
+            break
+
+    all_features = set(sum(levels.values(), []))
+    return set(name for name in all_features
+                   if cpuinfo_names.get(name, name) in flags)
@@ -3,6 +3,43 @@ from __future__ import print_function, division, absolute_import
 
 import unittest
 from flypy import jit
+from flypy.pipeline.environment import cpu_env
+
+@jit
+def fib(n):
+    if n < 2:
+        return n
+    return fib(n - 1) + fib(n - 2)
+
+@jit('int64 -> int64')
+def fac(n):
+    if n <= 1:
+        return 1
+    return n * fac(n - 1)
+
+@jit
+def is_even(n):
+    if n == 0:
+        return True
+    return is_odd(n - 1)
+
+@jit
+def is_odd(n):
+    if n == 0:
+        return False
+    return is_even(n - 1)
+
+@jit
+def ping(n):
+    if n <= 0:
+        return 0
+    return pong(n - 1) + 1
+
+@jit
+def pong(n):
+    if n <= 0:
+        return 0.5
+    return ping(n - 1) * 2
 
 class TestCalls(unittest.TestCase):
 
@@ -33,6 +70,22 @@ class TestCalls(unittest.TestCase):
 
         self.assertEqual(f(), 5)
 
+    def test_recursion(self):
+        self.assertEqual(fib(10), 55)
+
+    def test_recursion_annotated(self):
+        self.assertEqual(fac(10), 3628800)
+
+    def test_mutual_recursion(self):
+        self.assertTrue(is_even(10))
+        self.assertFalse(is_even(7))
+
+    def test_mutual_recursion_outer(self):
+        # pong is typed while typing ping, and its call back to ping
+        # resolves to the frame of ping, whose return type widens to float
+        self.assertEqual(ping(3), 4.0)
+        self.assertEqual(cpu_env['flypy.inference.cache'].frames, {})
+
 
 if __name__ == '__main__':
     #TestCalls("test_optional_args").debug()
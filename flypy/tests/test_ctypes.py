@@ -10,7 +10,7 @@ import ctypes.util
 import math
 import unittest
 
-from flypy import jit, typeof
+from flypy import jit, typeof, extern_support, errors
 from flypy.types import char, int32, int64, float32, float64, Function, int8, Pointer
 
 #-------------------------------------------------------------------
@@ -28,6 +28,8 @@ libm.cos.restype = ctypes.c_double
 printf = libc.printf
 cos = libm.cos
 
+extern_support.declare_attributes(cos, 'readnone')
+
 #-------------------------------------------------------------------
 # Tests
 #-------------------------------------------------------------------
@@ -50,6 +52,74 @@ class TestCtypes(unittest.TestCase):
 
         self.assertEqual(f(math.pi), -1.0)
 
+    def test_call_extern_symbol(self):
+        @jit
+        def f(value):
+            return cos(value) + cos(value)
+
+        self.assertEqual(f(math.pi), -2.0)
+
+        # cos is called directly by name, and the call is known to have
+        # no side effects
+        [lfunc] = f.llvm_funcs.values()
+        declaration = lfunc.module.get_function_named('cos')
+        self.assertTrue(declaration.is_declaration)
+        self.assertIn('readnone', str(declaration))
+        self.assertIn('nounwind', str(declaration))
+
+    def test_call_runtime_extern(self):
+        from flypy.runtime.lib.c import libc as runtime_libc
+
+        self.assertIs(typeof(runtime_libc.strlen), runtime_libc.strlen.type)
+
+        @jit
+        def f(n):
+            p = runtime_libc.malloc(n)
+            runtime_libc.memset(p, 0, n)
+            result = runtime_libc.memcmp(p, p, n)
+            runtime_libc.free(p)
+            return result
+
+        self.assertEqual(f(16), 0)
+
+    def test_call_declared_symbol(self):
+        import cffi
+        from flypy.runtime.lib.c import libc as runtime_libc
+
+        # The runtime declares memset and memcmp under their names. Other
+        # bindings of the same type share their symbol, others are rejected.
+        ffi = cffi.FFI()
+        ffi.cdef("""
+        void *memset(void *s, int c, size_t n);
+        long memcmp(void *s1, void *s2, size_t n);
+        """)
+        lib = ffi.dlopen(None)
+        memset, memcmp = lib.memset, lib.memcmp
+
+        @jit
+        def f(n):
+            p = runtime_libc.malloc(n)
+            memset(p, 0, n)
+            runtime_libc.free(p)
+
+        @jit
+        def g(n):
+            p = runtime_libc.malloc(n)
+            result = memcmp(p, p, n)
+            runtime_libc.free(p)
+            return result
+
+        f(16)
+        self.assertIs(extern_support.foreign_symbol(memset, typeof(memset)),
+                      extern_support.symbols['memset'])
+        self.assertRaises(errors.CompileError, g, 16)
+        self.assertIs(extern_support.symbols['memcmp'].type,
+                      runtime_libc.memcmp.type)
+
+    def test_symbol_name(self):
+        address = extern_support.function_address(cos)
+        self.assertEqual(extern_support.symbol_name(address, cos.__name__), ('cos', True))
+
 # ______________________________________________________________________
 
 if __name__ == "__main__":
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import unittest
+from flypy import jit
+from flypy.runtime import raising
+
+@jit
+def check(x):
+    if x < 0:
+        raise ValueError
+    return x
+
+@jit
+def check_twice(x):
+    return check(x) + check(x - 1)
+
+@jit
+def check_message(x):
+    if x < 0:
+        raise ValueError("negative value")
+    return check(x)
+
+class TestExceptions(unittest.TestCase):
+
+    def tearDown(self):
+        self.assertEqual(raising._state[raising.PENDING], 0)
+
+    def test_raise(self):
+        self.assertEqual(check(1), 1)
+        self.assertRaises(ValueError, check, -1)
+
+    def test_propagate(self):
+        self.assertEqual(check_twice(2), 3)
+        self.assertRaises(ValueError, check_twice, 0)
+
+    def test_catch(self):
+        @jit
+        def f(x):
+            try:
+                return check(x)
+            except ValueError:
+                return -1
+
+        self.assertEqual(f(2), 2)
+        self.assertEqual(f(-2), -1)
+
+    def test_catch_base_class(self):
+        @jit
+        def f(x):
+            try:
+                return check_twice(x)
+            except StandardError:
+                return -1
+
+        self.assertEqual(f(2), 3)
+        self.assertEqual(f(0), -1)
+
+    def test_no_match(self):
+        @jit
+        def f(x):
+            try:
+                return check(x)
+            except IndexError:
+                return -1
+
+        self.assertEqual(f(2), 2)
+        self.assertRaises(ValueError, f, -2)
+
+    def test_message(self):
+        @jit
+        def f(x):
+            return check_message(x)
+
+        for g in (check_message, f):
+            with self.assertRaises(ValueError) as cm:
+                g(-1)
+            self.assertEqual(cm.exception.args, ("negative value",))
+
+        # Exceptions raised without arguments don't get earlier arguments
+        with self.assertRaises(ValueError) as cm:
+            check(-1)
+        self.assertEqual(cm.exception.args, ())
+
+    def test_mask(self):
+        mask = raising.exception_mask([LookupError])
+        for exc in (IndexError, KeyError, LookupError):
+            id = raising.exception_ids[exc.__name__]
+            self.assertTrue(mask & (1 << id))
+        id = raising.exception_ids['ValueError']
+        self.assertFalse(mask & (1 << id))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -51,10 +51,6 @@ class TestGenerators(unittest.TestCase):
         self.assertEqual(result, expected)
 
     def test_return_generator(self):
-        raise unittest.SkipTest(
-            "Inline function with generator return types without yield "
-            "before fusion")
-
         def f(x):
             result = 0
             for x in g(x):
@@ -74,6 +70,96 @@ class TestGenerators(unittest.TestCase):
 
         self.assertEqual(result, expected)
 
+    def test_next(self):
+        @jit
+        def g(x):
+            yield x
+            yield x * 2
+
+        @jit
+        def f(x):
+            gen = g(x)
+            return next(gen) + next(gen) * 10
+
+        self.assertEqual(f(3), 63)
+
+    def test_consume_twice(self):
+        @jit
+        def g(n):
+            for i in range(n):
+                yield i * i
+
+        @jit
+        def consume(gen):
+            result = 0
+            for x in gen:
+                result += x
+            return result
+
+        @jit
+        def f(n):
+            gen = g(n)
+            first = next(gen)
+            return first + consume(gen) + consume(gen)
+
+        self.assertEqual(f(10), sum(i * i for i in range(10)))
+
+    def test_zip_generators(self):
+        @jit
+        def g(n, step):
+            for i in range(n):
+                yield i * step
+
+        @jit
+        def f(n):
+            result = 0
+            for x, y in zip(g(n, 1), g(n, 2)):
+                result += x * y
+            return result
+
+        self.assertEqual(f(10), sum(i * i * 2 for i in range(10)))
+
+    def test_early_termination(self):
+        @jit
+        def g():
+            i = 0
+            while True:
+                yield i
+                i += 1
+
+        @jit
+        def f(n):
+            gen = g()
+            result = 0
+            for x in gen:
+                if x >= n:
+                    break
+                result += x
+            gen.close()
+            return result
+
+        self.assertEqual(f(10), sum(range(10)))
+
+    def test_exception(self):
+        @jit
+        def g(n):
+            for i in range(n):
+                yield i
+            raise ValueError
+
+        @jit
+        def f(n):
+            result = 0
+            gen = g(n)
+            try:
+                for x in gen:
+                    result += x
+            except ValueError:
+                result = -result
+            return result
+
+        self.assertEqual(f(5), -10)
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
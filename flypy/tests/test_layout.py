@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import ctypes
+import unittest
+
+from flypy import jit, sjit, ctype, layout_report
+from flypy.types import int8, int32, float64
+
+#===------------------------------------------------------------------===
+# Test code
+#===------------------------------------------------------------------===
+
+@sjit
+class Declared(object):
+    layout = [('a', int8), ('b', float64), ('c', int8), ('d', int32)]
+
+    @jit
+    def total(self):
+        return self.a + self.b + self.c + self.d
+
+@sjit
+class Reordered(object):
+    layout = [('a', int8), ('b', float64), ('c', int8), ('d', int32)]
+    layout_options = {'reorder': True}
+
+    @jit
+    def total(self):
+        return self.a + self.b + self.c + self.d
+
+@jit
+class Aligned(object):
+    layout = [('x', int32), ('y', int32)]
+    layout_options = {'align': 64}
+
+    @jit
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+    @jit
+    def total(self):
+        return self.x + self.y
+
+def struct(cls):
+    cty = ctype(cls.type)
+    return getattr(cty, '_type_', cty)
+
+#===------------------------------------------------------------------===
+# Tests
+#===------------------------------------------------------------------===
+
+class TestLayout(unittest.TestCase):
+
+    def test_declaration_order(self):
+        names = [name for name, _ in struct(Declared)._fields_]
+        self.assertEqual(names, ['a', 'b', 'c', 'd'])
+        self.assertEqual(ctypes.sizeof(struct(Declared)), 24)
+
+    def test_reorder(self):
+        names = [name for name, _ in struct(Reordered)._fields_]
+        self.assertEqual(names, ['b', 'd', 'a', 'c'])
+        self.assertEqual(ctypes.sizeof(struct(Reordered)), 16)
+
+    def test_align(self):
+        self.assertEqual(ctypes.sizeof(struct(Aligned)), 64)
+
+    def test_layout_report(self):
+        report = layout_report(Declared)
+        self.assertIn("size 24", report)
+        self.assertIn("padding 10", report)
+        self.assertIn("<padding>", report)
+        self.assertIn("padding 2", layout_report(Reordered))
+
+    def test_compiled(self):
+        @jit
+        def f(obj):
+            return obj.total()
+
+        self.assertEqual(f(Declared(1, 2.0, 3, 4)), 10.0)
+        self.assertEqual(f(Reordered(1, 2.0, 3, 4)), 10.0)
+        self.assertEqual(f(Aligned(1, 2)), 3)
+
+    def test_roundtrip(self):
+        @jit
+        def f(obj):
+            return obj
+
+        obj = f(Reordered(1, 2.0, 3, 4))
+        self.assertEqual((obj.a, obj.b, obj.c, obj.d), (1, 2.0, 3, 4))
+
+
+if __name__ == '__main__':
+    unittest.main()
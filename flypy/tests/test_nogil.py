@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import threading
+import unittest
+
+import flypy
+from flypy import jit, errors
+from flypy.lib.pyobject import Object
+
+import numpy as np
+
+@jit(nogil=True)
+def total(a):
+    result = 0.0
+    for i in range(len(a)):
+        result += a[i]
+    return result
+
+@jit
+class Box(object):
+    layout = [('value', 'float64')]
+
+@jit
+def make_box(x):
+    return Box(x)
+
+@jit
+def check(x):
+    if x < 0:
+        raise ValueError
+    return x
+
+class TestNoGIL(unittest.TestCase):
+
+    def test_nogil(self):
+        a = np.arange(100.0)
+        self.assertEqual(total(a), np.sum(a))
+
+    def test_threads(self):
+        arrays = [np.arange(i, i + 1000.0) for i in range(8)]
+        results = [None] * len(arrays)
+
+        def work(i):
+            results[i] = total(arrays[i])
+
+        threads = [threading.Thread(target=work, args=(i,))
+                       for i in range(len(arrays))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(results, [np.sum(a) for a in arrays])
+
+    def test_pyobject(self):
+        @jit(nogil=True)
+        def f(x):
+            return Object(x)
+
+        self.assertRaises(errors.CompileError, f, 10)
+
+    def test_heap_allocation(self):
+        @jit(nogil=True)
+        def f(x):
+            return make_box(x).value
+
+        self.assertRaises(errors.CompileError, f, 1.0)
+
+    def test_buffer_allocation(self):
+        # The allocation buffers of the Boehm collector are protected by
+        # the GIL
+        @jit(nogil=True)
+        def f(x):
+            return len([x, x])
+
+        self.assertRaises(errors.CompileError, f, 1.0)
+
+    def test_raise(self):
+        @jit(nogil=True)
+        def f(x):
+            if x < 0:
+                raise ValueError
+            return x
+
+        self.assertRaises(errors.CompileError, f, 1.0)
+
+    def test_call_raising(self):
+        @jit(nogil=True)
+        def f(x):
+            return check(x)
+
+        self.assertRaises(errors.CompileError, f, 1.0)
+
+    def test_caught_exception(self):
+        @jit(nogil=True)
+        def f(x):
+            try:
+                raise ValueError
+            except ValueError:
+                return x
+
+        self.assertEqual(f(1.0), 1.0)
+
+    def test_collectors(self):
+        for impl in ("semispace", "refcount"):
+            @jit(nogil=True)
+            def f(x):
+                return x + 1.0
+
+            flypy.gc.impl = impl
+            try:
+                self.assertRaises(errors.CompileError, f, 1.0)
+            finally:
+                flypy.gc.impl = "boehm"
+
+
+if __name__ == '__main__':
+    unittest.main()
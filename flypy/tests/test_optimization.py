@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import unittest
+
+from flypy import jit, optimization
+from flypy.types import float64
+from flypy.linker import llvmlinker
+from flypy.pipeline import environment
+
+@jit
+def axpy(a, x, y):
+    return a * x + y
+
+@jit(opt=0)
+def unoptimized(a, x, y):
+    return axpy(a, x, y)
+
+@jit(opt=2, inline_threshold=50, vectorize=False, unroll=False)
+def tuned(a, x, y):
+    return axpy(a, x, y)
+
+@jit(fastmath=True)
+def fast(a, x, y):
+    return axpy(a, x, y) / 2.0
+
+@jit(fastmath=True, inline_threshold=0)
+def fast_no_inlining(a, x, y):
+    return a * x + y
+
+@jit
+def callee(x, y):
+    return x * y + x
+
+@jit
+def inlining(x, y):
+    return callee(x, y)
+
+@jit(inline_threshold=0)
+def no_inlining(x, y):
+    return callee(x, y)
+
+@jit(opt=5)
+def invalid(x):
+    return x
+
+class TestOptimization(unittest.TestCase):
+
+    def env(self, f):
+        return f.envs[(float64, float64, float64), 'cpu']
+
+    def test_opt_level(self):
+        self.assertEqual(unoptimized(2.0, 3.0, 4.0), 10.0)
+        env = self.env(unoptimized)
+        self.assertEqual(env['codegen.llvm.opt'], 0)
+        self.assertFalse(env['flypy.optimize'])
+
+    def test_options(self):
+        self.assertEqual(tuned(2.0, 3.0, 4.0), 10.0)
+        options = self.env(tuned)['flypy.optimization']
+        self.assertEqual(options['opt'], 2)
+        self.assertEqual(options['inline_threshold'], 50)
+        self.assertFalse(options['vectorize'])
+        self.assertFalse(options['unroll'])
+        self.assertFalse(options['fastmath'])
+
+    def test_separate_environments(self):
+        default = environment.target_env('cpu')
+        env = environment.target_env('cpu', options=(('opt', 1),))
+        self.assertIsNot(default['flypy.typing.cache'],
+                         env['flypy.typing.cache'])
+        self.assertIs(env, environment.target_env('cpu', 'generic',
+                                                  (('opt', 1),)))
+
+    def test_fastmath(self):
+        self.assertEqual(fast(2.0, 3.0, 4.0), 5.0)
+        code = str(self.env(fast)['codegen.llvm.module'])
+        self.assertIn("fmul fast double", code)
+
+    def test_fastmath_no_inlining(self):
+        self.assertEqual(fast_no_inlining(2.0, 3.0, 4.0), 10.0)
+        code = str(self.env(fast_no_inlining)['codegen.llvm.module'])
+        self.assertIn("fmul fast double", code)
+
+    def test_link_options(self):
+        @jit
+        def default(x, y):
+            return callee(x, y)
+
+        @jit(inline_threshold=50)
+        def threshold(x, y):
+            return callee(x, y)
+
+        # Post-link optimization only takes the options given to @jit
+        linkers = []
+        class Linker(llvmlinker.Linker):
+            def __init__(self, result, **kwds):
+                super(Linker, self).__init__(result, **kwds)
+                linkers.append(self)
+
+        def link_options(f):
+            self.assertEqual(f(2.0, 3.0), 8.0)
+            original, llvmlinker.Linker = llvmlinker.Linker, Linker
+            try:
+                module = f.link((float64, float64), 'cpu')
+            finally:
+                llvmlinker.Linker = original
+            [linker] = [l for l in linkers if l.result.module is module]
+            return linker.opt, linker.inline
+
+        self.assertEqual(link_options(default), (1, 200))
+        self.assertEqual(link_options(threshold), (1, 50))
+
+    def test_inline_threshold(self):
+        argtypes = (float64, float64)
+        for f in (inlining, no_inlining):
+            self.assertEqual(f(2.0, 3.0), 8.0)
+
+        def linked_body(f):
+            module = f.link(argtypes, 'cpu')
+            name = f.get_llvm_func(argtypes, 'cpu').name
+            return str(module.get_function_named(name))
+
+        self.assertNotIn("callee", linked_body(inlining))
+        self.assertIn("callee", linked_body(no_inlining))
+
+    def test_normalize(self):
+        self.assertEqual(optimization.normalize({'opt': 3, 'unroll': False}),
+                         (('unroll', False),))
+        self.assertRaises(ValueError, optimization.normalize, {'opt': 5})
+        self.assertRaises(ValueError, invalid, 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import unittest
+
+from flypy import jit
+from flypy.types import Pointer, int32, float64
+
+class TestPrincipal(unittest.TestCase):
+
+    def test_share_opaque_pointers(self):
+        @jit('Pointer[a] -> Pointer[a]', principal=True)
+        def f(p):
+            return p
+
+        f.translate([Pointer[int32]])
+        f.translate([Pointer[float64]])
+
+        env1 = f.envs[(Pointer[int32],), 'cpu']
+        env2 = f.envs[(Pointer[float64],), 'cpu']
+        self.assertIsNone(env1["flypy.state.principal"])
+        self.assertIsNotNone(env2["flypy.state.principal"])
+
+    def test_no_share_dereferenced_pointers(self):
+        @jit('Pointer[a] -> a', principal=True)
+        def f(p):
+            return p[0]
+
+        f.translate([Pointer[int32]])
+        f.translate([Pointer[float64]])
+
+        env = f.envs[(Pointer[float64],), 'cpu']
+        self.assertIsNone(env["flypy.state.principal"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import ctypes
+import unittest
+
+import llvm.core as lc
+
+from flypy import jit
+from flypy.extern_support import relocation, bind_symbols
+from flypy.compiler.lower import constants
+from flypy.runtime import raising
+
+@jit
+def check(x):
+    if x < 0:
+        raise ValueError
+    return x
+
+@jit
+def propagate(x):
+    return check(x) + 1
+
+@jit
+def greet():
+    return "hello"
+
+@jit
+def greet_again():
+    return "hello"
+
+class TestRelocation(unittest.TestCase):
+
+    def test_names(self):
+        a, b = ctypes.c_int64(), ctypes.c_int64()
+        s1 = relocation(".flypy.test.data", ctypes.addressof(a))
+        self.assertEqual(s1.name, ".flypy.test.data")
+        self.assertIs(relocation(".flypy.test.data", ctypes.addressof(a)), s1)
+        self.assertRaises(ValueError, relocation, ".flypy.test.data",
+                          ctypes.addressof(b))
+
+    def test_bind_symbols(self):
+        data = ctypes.c_int64()
+        relocation(".flypy.test.bound", ctypes.addressof(data))
+
+        void = lc.Type.function(lc.Type.void(), [])
+        module = lc.Module.new("test_bind_symbols")
+        module.add_function(void, ".flypy.test.bound")
+        bind_symbols(module)
+
+        module.add_function(void, ".flypy.test.unbound")
+        self.assertRaises(LookupError, bind_symbols, module)
+
+    def test_no_embedded_addresses(self):
+        self.assertEqual(propagate(1), 2)
+        self.assertRaises(ValueError, propagate, -1)
+
+        [lfunc] = propagate.llvm_funcs.values()
+        code = str(lfunc.module)
+        self.assertNotIn(str(raising.pending_address), code)
+        self.assertIn(raising.pending_symbol.name, code)
+
+    def test_constant_symbols(self):
+        self.assertEqual(greet(), "hello")
+        self.assertEqual(greet_again(), "hello")
+
+        [lfunc1] = greet.llvm_funcs.values()
+        [lfunc2] = greet_again.llvm_funcs.values()
+        code1, code2 = str(lfunc1.module), str(lfunc2.module)
+
+        names = set()
+        for address, symbol in constants.relocations.items():
+            if symbol.name in code1:
+                self.assertNotIn(str(address), code1)
+                names.add(symbol.name)
+        self.assertTrue(names)
+
+        # Equal constants share their symbol
+        for name in names:
+            self.assertIn(name, code2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division, absolute_import
+
+import unittest
+
+import flypy
+from flypy import jit, targets
+from flypy.types import float64
+from flypy.pipeline import environment
+
+@jit
+def scale(x, y):
+    return x * y + 1.0
+
+@jit(cpu="native")
+def native_scale(x, y):
+    return scale(x, y)
+
+@jit(cpu=["x86-64-v4", "x86-64-v3", "x86-64"])
+def multiversioned(x, y):
+    return scale(x, y)
+
+class TestTargetCPU(unittest.TestCase):
+
+    def tearDown(self):
+        flypy.target_cpu("generic")
+
+    def test_resolve(self):
+        self.assertEqual(targets.resolve("x86-64")[0], "x86-64")
+        cpu, features = targets.resolve("x86-64-v3")
+        self.assertIn("+avx2", features.split(","))
+        self.assertNotIn("+avx512f", features.split(","))
+
+    def test_jit_cpu(self):
+        self.assertEqual(native_scale(2.0, 3.0), 7.0)
+        env = native_scale.envs[(float64, float64), 'cpu', 'native']
+        self.assertEqual(env['flypy.target_cpu'], 'native')
+        self.assertEqual(env['codegen.llvm.machine'].cpu,
+                         targets.resolve('native')[0])
+
+    def test_separate_environments(self):
+        generic = environment.target_env('cpu')
+        native = environment.target_env('cpu', 'native')
+        self.assertIsNot(generic['flypy.typing.cache'],
+                         native['flypy.typing.cache'])
+        self.assertIsNot(generic['codegen.llvm.module'],
+                         native['codegen.llvm.module'])
+        self.assertIs(native, environment.target_env('cpu', 'native'))
+
+    def test_target_cpu(self):
+        self.assertEqual(scale(2.0, 3.0), 7.0)
+        flypy.target_cpu("native")
+        self.assertEqual(scale(2.0, 3.0), 7.0)
+        self.assertIn(((float64, float64), 'cpu'), scale.envs)
+        self.assertIn(((float64, float64), 'cpu', 'native'), scale.envs)
+
+    def test_select(self):
+        self.assertEqual(targets.select("x86-64-v3"), "x86-64-v3")
+        self.assertEqual(targets.select(["native", "x86-64"]), "native")
+        self.assertEqual(targets.select(["no-such-cpu", "x86-64"]), "x86-64")
+
+    def test_multiversioned(self):
+        self.assertEqual(multiversioned(2.0, 3.0), 7.0)
+        cpu = targets.function_cpu(multiversioned)
+        self.assertIn(((float64, float64), 'cpu', cpu), multiversioned.envs)
+        if cpu != "x86-64":
+            self.assertTrue(targets.supported(cpu))
+
+    def test_cpuinfo_features(self):
+        self.assertEqual(targets.cpuinfo_features("/no/such/file"), set())
+
+
+if __name__ == '__main__':
+    unittest.main()
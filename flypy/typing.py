@@ -2,6 +2,7 @@
 from __future__ import print_function, division, absolute_import
 import re
 import sys
+from collections import OrderedDict
 
 from pykit.utils import hashable
 
@@ -95,7 +96,7 @@ class MetaType(type):
     Attributes:
 
         layout: {str: Type}
-            Layout of the type
+            Layout of the type, in declaration order
 
         fields: {str: FunctionWrapper}
             Dict of methods
@@ -108,7 +109,7 @@ class MetaType(type):
             return
 
         type = dct['type']
-        self.layout = layout = dict(getattr(self, 'layout', {}))
+        self.layout = layout = OrderedDict(getattr(self, 'layout', {}))
 
         # Set method fields
         self.fields = fields = dict(_extract_fields(type, dct))
@@ -131,7 +132,8 @@ class MetaType(type):
 
         @property
         def resolved_layout(self):
-            return dict((n, resolve_simple(self, t)) for n, t in layout.items())
+            return OrderedDict((n, resolve_simple(self, t))
+                                   for n, t in layout.items())
 
         type_constructor.resolved_layout = resolved_layout
 
@@ -190,6 +192,7 @@ def lookup_builtin_type(name):
         'Int':      types.Int,
         'Float':    types.Float,
         'Void':     types.Void,
+        'Vector':   types.Vector,
     }
 
     return builtin_scope.get(name)